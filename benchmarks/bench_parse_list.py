@@ -0,0 +1,56 @@
+import sys
+import re
+import time
+import logging
+sys.path.append('src/crawler')
+from scraper import Scraper
+from extraction_plan import FieldRegex
+
+# run from the repository root: python benchmarks/bench_parse_list.py
+
+PROVIDERS = {
+    'fotocasa': (
+        {'list_items': re.compile(r'accuracy(.+?)userId', re.DOTALL)},
+        {'created': re.compile(r'(^.)'),
+         'link': re.compile(r'"detail":.*?:"(.*?)"'),
+         'price': re.compile(r'"rawPrice":(\d+)'),
+         'surface': re.compile(r'"key":"surface","value":(\d+)')}),
+    'idealista': (
+        {'list_items': re.compile(r'<article class="item(.+?)</article>', re.DOTALL)},
+        {'created': re.compile(r'(^.)'),
+         'link': re.compile(r'<a href="(/inmueble/\d+?/)" role="heading" aria-level="2" class="item-link " title=".+? en .+?">'),
+         'price': re.compile(r'<span class="item-price h2-simulated">(.+?)<span'),
+         'details': re.compile(r'<span class="item-detail">(.+?)</span>')}),
+}
+
+def parse_list_substrings(html, list_items_rx, fields_rx):
+    """ Parsing before the extraction plan: findall of every field over a copy of each item """
+    def findall(regex, text):
+        ret = regex.findall(text)
+        ret = ret[0] if len(ret) == 1 else ret
+        return None if len(ret) == 0 else ret
+    elements = findall(next(iter(list_items_rx.values())), html)
+    return [{field: findall(regex, element) for field, regex in fields_rx.items()} for element in elements]
+
+def items_per_sec(parse, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        items = parse()
+    return len(items) * repeat / (time.perf_counter() - start), items
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for provider, (list_items_rx, fields_rx) in PROVIDERS.items():
+        html = Scraper.CLEAN_RX.sub('', open(f'tests/{provider}_lista.html', 'r').read())
+        scraper = Scraper()
+        # the fields with one value per item only need the first match
+        planned_rx = {field: FieldRegex(regex, first=field != 'details') for field, regex in fields_rx.items()}
+
+        before, expected = items_per_sec(lambda: parse_list_substrings(html, list_items_rx, fields_rx), repeat)
+        after_spans, items = items_per_sec(lambda: scraper.parse_list(html, list_items_rx, fields_rx), repeat)
+        assert items == expected, f'{provider}: different items with offsets'
+        after_first, items = items_per_sec(lambda: scraper.parse_list(html, list_items_rx, planned_rx), repeat)
+        assert items == expected, f'{provider}: different items with FIRST'
+
+        print(f'{provider}: {len(items)} items/page, substrings {before:.0f} items/s, offsets {after_spans:.0f} items/s, offsets + FIRST {after_first:.0f} items/s')
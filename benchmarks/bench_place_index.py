@@ -0,0 +1,64 @@
+import sys
+import time
+import random
+import logging
+sys.path.append('src/report')
+from realty_report import RealtyReport
+from place_index import PlaceIndex
+
+# run from the repository root: python benchmarks/bench_place_index.py [realties]
+
+BARRIOS = ['el raval', 'el barri gotic', 'la barceloneta', 'sant pere, santa caterina i la ribera', 'el fort pienc', 'la sagrada familia', "la dreta de l'eixample",
+    "l'antiga esquerra de l'eixample", "la nova esquerra de l'eixample", 'sant antoni', 'el poble sec', 'la marina del prat vermell', 'la marina de port',
+    'la font de la guatlla', 'hostafrancs', 'la bordeta', 'sants  badal', 'sants', 'les corts', 'la maternitat i sant ramon', 'pedralbes',
+    'vallvidrera, el tibidabo i les planes', 'sarria', 'les tres torres', 'sant gervasi  la bonanova', 'sant gervasi  galvany', 'el putxet i el farro',
+    'vallcarca i els penitents', 'el coll', 'la salut', 'la vila de gracia', "el camp d'en grassot i gracia nova", 'el baix guinardo', 'can baro', 'el guinardo',
+    "la font d'en fargues", 'el carmel', 'la teixonera', 'sant genis dels agudells', 'montbau', "la vall d'hebron", 'la clota', 'horta',
+    'vilapicina i la torre llobeta', 'porta', 'el turo de la peira', 'can peguera', 'la guineueta', 'canyelles', 'les roquetes', 'verdun', 'la prosperitat',
+    'la trinitat nova', 'torre baro', 'ciutat meridiana', 'vallbona', 'la trinitat vella', 'baro de viver', 'el bon pastor', 'sant andreu', 'la sagrera',
+    'el congres i els indians', 'navas', "el camp de l'arpa del clot", 'el clot', 'el parc i la llacuna del poblenou', 'la vila olimpica del poblenou', 'el poblenou',
+    'diagonal mar i el front maritim del poblenou', 'el besos i el maresme', 'provencals del poblenou', 'sant marti de provencals', 'la verneda i la pau',
+    'ciutat vella', 'eixample', 'sants montjuic', 'sarria sant gervasi', 'gracia', 'horta guinardo', 'nou barris', 'sant marti', 'barcelona']
+DISTRITOS = ['ciutat vella', 'eixample', 'sants montjuic', 'les corts', 'sarria sant gervasi', 'gracia', 'horta guinardo', 'nou barris', 'sant andreu', 'sant marti']
+CALLES = ['calle de la marina', 'carrer de sants', 'avinguda meridiana', 'passeig de sant joan', 'carrer gran de gracia', 'calle de pere iv', 'via julia',
+    'carrer de la riera blanca', 'ronda del guinardo', "carrer d'arago"]
+
+def get_addresses(count):
+    """ Address and town of listings as the providers publish them, some with typos or without barrio """
+    random.seed(0)
+    realties = []
+    for i in range(count):
+        barrio = random.choice(BARRIOS)
+        if random.random() < 0.2:
+            barrio = barrio[:-1] if random.random() < 0.5 else barrio.replace('a', 'e', 1)
+        address = random.choice([f'{random.choice(CALLES)} {random.randint(1, 300)}', barrio, 'barcelona'])
+        town = f'{barrio}, barcelona' if random.random() < 0.7 else f'{random.choice(DISTRITOS)}, barcelona'
+        realties.append((address, town))
+    return realties
+
+def match_all(realties, places):
+    """ Best place of each listing as RealtyReport.match_place """
+    results = []
+    for address, town in realties:
+        report = RealtyReport.__new__(RealtyReport)
+        report._address, report._town, report.barrio, report.barrio_ratio = address, town, None, None
+        report.match_place(places)
+        results.append((report.barrio, report.barrio_ratio))
+    return results
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    realties = get_addresses(count)
+
+    start = time.perf_counter()
+    expected = match_all(realties, BARRIOS)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PlaceIndex(BARRIOS)
+    results = match_all(realties, index)
+    after = time.perf_counter() - start
+    assert results == expected, 'different places with the index'
+
+    print(f'{count} realties, {len(BARRIOS)} places: map_place {before:.2f}s, place index {after:.2f}s ({before / after:.0f}x), {index.stats()}')
@@ -0,0 +1,202 @@
+import re
+import queue
+import threading
+import logging
+from seleniumwire2 import webdriver
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+class BrowserPool:
+
+    BROWSERS = ('chrome', 'firefox')
+    RESOURCE_TYPES = [
+        ('image', re.compile(r'\.(png|jpe?g|gif|webp|avif|svg|ico|bmp)$', re.IGNORECASE)),
+        ('font', re.compile(r'\.(woff2?|ttf|otf|eot)$', re.IGNORECASE)),
+        ('stylesheet', re.compile(r'\.css$', re.IGNORECASE)),
+        ('script', re.compile(r'\.m?js$', re.IGNORECASE)),
+        ('media', re.compile(r'\.(mp4|webm|m3u8|mp3|ogg)$', re.IGNORECASE))]
+    ACCEPT_TYPES = [('image', 'image/'), ('stylesheet', 'text/css'), ('font', 'font/'), ('document', 'text/html'), ('json', 'application/json')]
+
+    def __init__(self, pool_size: int = 1, max_pages: int = 50, load_timeout: int = 20, geckodriver_path: str = '/snap/bin/geckodriver'):
+        '''
+        Pool of long-lived selenium browsers shared by the scrapers
+
+        The browsers are started on demand and reused between pages instead of started
+        and quit for every url. A page is loaded when the document is ready and the ready
+        regex of the provider matches, not after a fixed sleep. Browsers that fail are quit
+        and the rest are recycled after max_pages pages, as they leak memory over time.
+
+        Parameters
+        ----------
+        pool_size : int
+            maximum number of browsers of each type open at the same time
+        max_pages : int
+            number of pages loaded by a browser before it is recycled
+        load_timeout : int
+            maximum seconds to wait for a page to be ready
+        geckodriver_path : str
+            path of the geckodriver executable for firefox
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.pool_size = pool_size
+        self.max_pages = max_pages
+        self.load_timeout = load_timeout
+        self.geckodriver_path = geckodriver_path
+        self.lock = threading.Lock()
+        self.idle = {browser: queue.LifoQueue() for browser in BrowserPool.BROWSERS}
+        self.slots = {browser: threading.BoundedSemaphore(pool_size) for browser in BrowserPool.BROWSERS}
+        self.pages = dict()
+        self.local = threading.local()
+
+        self.browsers_started = 0
+        self.browsers_recycled = 0
+        self.pages_loaded = 0
+        self.load_timeouts = 0
+        self.requests_count = 0
+        self.bytes_received = 0
+
+    @staticmethod
+    def resource_type(request) -> str:
+        """ Type of the resource of a seleniumwire request, from the url extension or the Accept header """
+        path = request.path.split('?')[0] if hasattr(request, 'path') else request.url.split('?')[0]
+        for resource_type, extension_rx in BrowserPool.RESOURCE_TYPES:
+            if extension_rx.search(path): return resource_type
+        accept = request.headers.get('Accept') or ''
+        for resource_type, mime in BrowserPool.ACCEPT_TYPES:
+            if accept.startswith(mime): return resource_type
+        return 'other'
+
+    @staticmethod
+    def _page_stats(driver) -> dict:
+        """ Requests made by the browser while loading the page and bytes received, aborted requests have no body """
+        requests_count, bytes_received = 0, 0
+        for request in getattr(driver, 'requests', []):
+            requests_count += 1
+            if request.response is None: continue
+            content_length = request.response.headers.get('Content-Length')
+            bytes_received += int(content_length) if content_length and content_length.isdigit() else len(request.response.body or b'')
+        return {'requests': requests_count, 'bytes': bytes_received}
+
+    def last_page_stats(self) -> dict:
+        """ Stats of the last page loaded by the current thread """
+        return getattr(self.local, 'page_stats', None)
+
+    def _new_driver(self, browser):
+        self.logger.info(f'Starting {browser}')
+        if browser == 'chrome':
+            options = webdriver.ChromeOptions()
+            # options.add_argument("-headless")
+            return webdriver.Chrome(options=options)
+        options = webdriver.FirefoxOptions()
+        options.add_argument("--headless")
+        driver_service = webdriver.FirefoxService(executable_path=self.geckodriver_path)
+        return webdriver.Firefox(options=options, service=driver_service)
+
+    def acquire(self, browser: str = 'chrome'):
+        """ Returns an idle browser of the given type, waits if all of them are in use """
+        self.slots[browser].acquire()
+        try:
+            driver = self.idle[browser].get_nowait()
+        except queue.Empty:
+            try:
+                driver = self._new_driver(browser)
+            except Exception:
+                self.slots[browser].release()
+                raise
+            with self.lock:
+                self.pages[id(driver)] = 0
+                self.browsers_started += 1
+        return driver
+
+    def release(self, driver, browser: str = 'chrome', failed: bool = False):
+        """
+        Returns the browser to the pool, it is quit if it failed or loaded max_pages pages.
+
+        Args:
+            driver (WebDriver): The browser returned by acquire.
+            browser (str): chrome or firefox.
+            failed (bool): Whether the browser failed loading the page.
+        """
+        with self.lock:
+            self.pages[id(driver)] += 1
+            recycle = failed or self.pages[id(driver)] >= self.max_pages
+            if recycle:
+                del self.pages[id(driver)]
+                self.browsers_recycled += 1
+        try:
+            if recycle:
+                self._quit(driver)
+            else:
+                # seleniumwire keeps every captured request in memory, and the interceptor
+                # of the provider would block the requests of the next page
+                del driver.requests
+                del driver.request_interceptor
+                self.idle[browser].put(driver)
+        finally:
+            self.slots[browser].release()
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            self.logger.warning(f'Error closing browser: {e}')
+
+    def load(self, driver, url, ready_rx=None) -> str:
+        """
+        Loads the url and waits until the document is complete and ready_rx matches the page source.
+
+        Returns:
+            str: The page source, also when the page is not ready after load_timeout seconds.
+        """
+        driver.get(url)
+        try:
+            WebDriverWait(driver, self.load_timeout).until(lambda d: d.execute_script('return document.readyState') == 'complete'
+                and (ready_rx is None or ready_rx.search(d.page_source) is not None))
+        except TimeoutException:
+            self.load_timeouts += 1
+            self.logger.warning(f'Page not ready after {self.load_timeout} secs: {url}')
+        page_stats = BrowserPool._page_stats(driver)
+        self.local.page_stats = page_stats
+        with self.lock:
+            self.pages_loaded += 1
+            self.requests_count += page_stats['requests']
+            self.bytes_received += page_stats['bytes']
+        return driver.page_source
+
+    def get(self, url, browser: str = 'chrome', interceptor=None, ready_rx=None) -> str:
+        """
+        Loads the url with a browser of the pool.
+
+        Args:
+            url (str): The url to load.
+            browser (str): chrome or firefox.
+            interceptor (callable): seleniumwire request interceptor of the page.
+            ready_rx (Pattern): regex that matches the page source once the content is loaded.
+
+        Returns:
+            str: The page source.
+        """
+        driver = self.acquire(browser)
+        failed = True
+        try:
+            if interceptor is not None:
+                driver.request_interceptor = interceptor
+            page_source = self.load(driver, url, ready_rx)
+            failed = False
+            return page_source
+        finally:
+            self.release(driver, browser, failed)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'browsers_started': self.browsers_started, 'browsers_recycled': self.browsers_recycled,
+                'pages_loaded': self.pages_loaded, 'load_timeouts': self.load_timeouts,
+                'requests': self.requests_count, 'bytes': self.bytes_received}
+
+    def close(self):
+        """ Quits the idle browsers """
+        for browser in BrowserPool.BROWSERS:
+            while not self.idle[browser].empty():
+                self._quit(self.idle[browser].get_nowait())
@@ -0,0 +1,216 @@
+import os
+import time
+import socket
+import sqlite3
+import threading
+import logging
+from pathlib import Path
+
+class CrawlFrontier:
+
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, db_path: Path = Path('local/cache/frontier.db'), lease_timeout: int = 600, failed_retention: int = 7 * 24 * 3600, owner: str = None):
+        '''
+        Persistent frontier of the list and detail urls of the crawls
+
+        Each url has a state, pending, leased, done or failed, the time it was leased and
+        the process that leased it. The leases of a process that is not running anymore on
+        this host are taken back without waiting for lease_timeout, a crawl renews the lease
+        of its url before each fetch.
+        The list pages of a provider are checkpointed after every page: the page is marked
+        done and the next page is added in the same transaction, so a crawl interrupted
+        halfway resumes at the next page instead of at the base url. The urls of a crawl
+        are removed when it finishes, the next crawl starts again at the base url.
+
+        Parameters
+        ----------
+        db_path : Path
+            path of the SQLite database file
+        lease_timeout : int
+            seconds after which a leased url whose crawl did not complete it is leased again
+        failed_retention : int
+            seconds the failed urls are kept for the stats before prune removes them
+        owner : str
+            host:pid of the process that holds the leases, the current process if not provided
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.db_path = Path(db_path)
+        self.lease_timeout = lease_timeout
+        self.failed_retention = failed_retention
+        self.owner = owner if owner is not None else f'{socket.gethostname()}:{os.getpid()}'
+        self.lock = threading.Lock()
+        os.makedirs(self.db_path.parent, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, provider TEXT, kind TEXT, state TEXT, '
+                'position INTEGER, leased_at REAL, updated_at REAL, attempts INTEGER DEFAULT 0)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_state ON frontier (provider, kind, state)')
+            # the databases created before the leases had an owner
+            if 'owner' not in [row[1] for row in self.conn.execute('PRAGMA table_info(frontier)')]:
+                self.conn.execute('ALTER TABLE frontier ADD COLUMN owner TEXT')
+
+    def _expired(self) -> float:
+        return time.time() - self.lease_timeout
+
+    def _orphaned(self, owner) -> bool:
+        """ Whether the lease is of this process or of a process of this host that is not running anymore """
+        if owner == self.owner: return True
+        host, _, pid = (owner or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit(): return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # the process exists but belongs to another user
+            return False
+        return False
+
+    def start(self, provider, base_url) -> str:
+        """
+        Leases the list page where the crawl of the provider goes on, the base url when
+        the last crawl finished.
+
+        Returns:
+            str: The url of the first list page to crawl, None if another crawl holds its lease.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT url, state, leased_at, owner FROM frontier WHERE provider = ? AND kind = ? AND state IN (?, ?) ORDER BY position DESC LIMIT 1',
+                (provider, 'list', CrawlFrontier.PENDING, CrawlFrontier.LEASED)).fetchone()
+            if row is None:
+                if self.conn.execute('SELECT 1 FROM frontier WHERE provider = ? AND kind = ? LIMIT 1', (provider, 'list')).fetchone() is not None:
+                    # the last crawl was interrupted after its last page, it is finished now
+                    self.conn.execute('DELETE FROM frontier WHERE provider = ? AND kind = ?', (provider, 'list'))
+                self.conn.execute('INSERT OR REPLACE INTO frontier (url, provider, kind, state, position, leased_at, updated_at, attempts, owner) VALUES (?, ?, ?, ?, 0, ?, ?, 1, ?)',
+                    (base_url, provider, 'list', CrawlFrontier.LEASED, now, now, self.owner))
+                return base_url
+            url, state, leased_at, owner = row
+            if state == CrawlFrontier.LEASED and leased_at > self._expired() and not self._orphaned(owner):
+                self.logger.warning(f'The crawl of {provider} is leased by {owner} until {leased_at + self.lease_timeout:.0f}: {url}')
+                return None
+            self.conn.execute('UPDATE frontier SET state = ?, leased_at = ?, owner = ?, attempts = attempts + 1 WHERE url = ?', (CrawlFrontier.LEASED, now, self.owner, url))
+        self.logger.info(f'Resuming the crawl of {provider} at {url}')
+        return url
+
+    def checkpoint(self, provider, url, next_url=None) -> bool:
+        """
+        Marks the list page as done and leases the next one, in a single transaction.
+
+        Returns:
+            bool: Whether the next page has to be crawled, False if there is none or it was already done.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT position FROM frontier WHERE url = ?', (url,)).fetchone()
+            position = row[0] if row is not None else 0
+            self.conn.execute('INSERT INTO frontier (url, provider, kind, state, position, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at',
+                (url, provider, 'list', CrawlFrontier.DONE, position, now))
+            if next_url is None: return False
+            if self.conn.execute('SELECT 1 FROM frontier WHERE url = ? AND state = ?', (next_url, CrawlFrontier.DONE)).fetchone() is not None:
+                return False
+            self.conn.execute('INSERT OR REPLACE INTO frontier (url, provider, kind, state, position, leased_at, updated_at, attempts, owner) VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)',
+                (next_url, provider, 'list', CrawlFrontier.LEASED, position + 1, now, now, self.owner))
+        return True
+
+    def renew(self, url) -> bool:
+        """
+        Extends the lease of the url held by this process, called before each fetch as the
+        delay before the request can be as long as lease_timeout.
+
+        Returns:
+            bool: Whether the url is still leased by this process.
+        """
+        with self.lock, self.conn:
+            renewed = self.conn.execute('UPDATE frontier SET leased_at = ? WHERE url = ? AND state = ? AND owner = ?',
+                (time.time(), url, CrawlFrontier.LEASED, self.owner)).rowcount > 0
+        if not renewed: self.logger.warning(f'The lease of {url} is not held by {self.owner}')
+        return renewed
+
+    def finish(self, provider, kind: str = 'list'):
+        """ Removes the urls of the finished crawl of the provider """
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM frontier WHERE provider = ? AND kind = ?', (provider, kind))
+
+    def add(self, provider, urls: list, kind: str = 'item'):
+        """ Adds the urls as pending, the urls already in the frontier keep their state """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO frontier (url, provider, kind, state, position, updated_at) VALUES (?, ?, ?, ?, 0, ?)',
+                [(url, provider, kind, CrawlFrontier.PENDING, now) for url in urls])
+
+    def lease(self, provider=None, kind: str = 'item', limit: int = None) -> list:
+        """
+        Leases the pending urls and the ones whose lease expired.
+
+        Returns:
+            list: The leased urls, in the order they were added.
+        """
+        now = time.time()
+        query = 'SELECT url FROM frontier WHERE kind = ? AND (state = ? OR (state = ? AND leased_at < ?))'
+        params = [kind, CrawlFrontier.PENDING, CrawlFrontier.LEASED, self._expired()]
+        if provider is not None:
+            query += ' AND provider = ?'
+            params.append(provider)
+        query += ' ORDER BY updated_at, rowid' + (f' LIMIT {int(limit)}' if limit else '')
+        with self.lock, self.conn:
+            urls = [row[0] for row in self.conn.execute(query, params)]
+            self.conn.executemany('UPDATE frontier SET state = ?, leased_at = ?, owner = ?, attempts = attempts + 1 WHERE url = ?',
+                [(CrawlFrontier.LEASED, now, self.owner, url) for url in urls])
+        return urls
+
+    def _set_state(self, urls: list, state):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany('UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?', [(state, now, url) for url in urls])
+
+    def complete(self, urls: list):
+        self._set_state(urls, CrawlFrontier.DONE)
+
+    def fail(self, urls: list):
+        self._set_state(urls, CrawlFrontier.FAILED)
+
+    def discard(self, urls: list):
+        """ Removes the urls whose results are already stored """
+        with self.lock, self.conn:
+            self.conn.executemany('DELETE FROM frontier WHERE url = ?', [(url,) for url in urls])
+
+    def recover(self) -> int:
+        """
+        Releases the leases of crawls that died, older than lease_timeout or of processes of
+        this host that are not running, the leases of the crawls still running are kept.
+        """
+        with self.lock, self.conn:
+            recovered = self.conn.execute('UPDATE frontier SET state = ? WHERE state = ? AND leased_at < ?',
+                (CrawlFrontier.PENDING, CrawlFrontier.LEASED, self._expired())).rowcount
+            owners = [row[0] for row in self.conn.execute('SELECT DISTINCT owner FROM frontier WHERE state = ?', (CrawlFrontier.LEASED,))]
+            for owner in owners:
+                if owner != self.owner and self._orphaned(owner):
+                    recovered += self.conn.execute('UPDATE frontier SET state = ? WHERE state = ? AND owner = ?',
+                        (CrawlFrontier.PENDING, CrawlFrontier.LEASED, owner)).rowcount
+        if recovered: self.logger.info(f'{recovered} leased urls released')
+        return recovered
+
+    def prune(self) -> int:
+        """ Removes the urls that failed more than failed_retention seconds ago """
+        with self.lock, self.conn:
+            pruned = self.conn.execute('DELETE FROM frontier WHERE state = ? AND updated_at < ?',
+                (CrawlFrontier.FAILED, time.time() - self.failed_retention)).rowcount
+        if pruned: self.logger.info(f'{pruned} failed urls removed')
+        return pruned
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {f'{kind}_{state}': count for kind, state, count in self.conn.execute('SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state')}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
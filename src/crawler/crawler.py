@@ -4,59 +4,129 @@ from logging import Logger
 import pandas as pd
 import re
 import datetime
+import time
 import logging
 import logging.config
 import warnings
 warnings.filterwarnings('ignore', category=SyntaxWarning)
 import sys
+sys.path.append('src')
 sys.path.append('src/crawler')
 from scraper import Scraper
+from fetcher import AsyncFetcher
+from session_pool import SessionPool
+from realty_store import RealtyStore
+from page_cache import PageCache
+from browser_pool import BrowserPool
+from host_scheduler import HostScheduler
+from crawl_frontier import CrawlFrontier
+from spec_registry import SpecRegistry
+from json_path import JsonPath
+from extraction_plan import FieldRegex
+from parse_pool import ParsePool
+from sqlite_store import SqliteStore
+from concurrent.futures import ThreadPoolExecutor
 
 class Crawler:
 
-    def __init__(self, webs_specs_datafile_path:Path = Path('local/datasets/webs_specs.csv'), realty_datafile_path: Path = Path('local/datasets/realties.csv'), cache_dir: Path = None, cache_expires: int = 3600, delay_seconds: int = 30):
+    def __init__(self, webs_specs_datafile_path:Path = Path('local/datasets/webs_specs.csv'), realty_datafile_path: Path = Path('local/datasets/realties.csv'), cache_dir: Path = None, cache_expires: int = 3600, delay_seconds: int = 30, fetcher: AsyncFetcher = None, session_pool: SessionPool = None, max_pages: int = None, max_items: int = None, store: RealtyStore | SqliteStore = None, page_cache: PageCache = None, browser_pool: BrowserPool = None, parse_workers: int = 0, zero_copy: bool = False, scheduler: HostScheduler = None, enrich_concurrency: int = 4, frontier: CrawlFrontier = None, compact_every: int = 0):
 
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info('Init')
 
         self.webs_specs_datafile_path = webs_specs_datafile_path
         self.realty_datafile_path = realty_datafile_path
-        self.web_specs = pd.read_csv(self.webs_specs_datafile_path)
         self.cache_dir = cache_dir
         self.cache_expires = cache_expires
         self.delay_seconds = delay_seconds
+        self.fetcher = fetcher
+        self.page_cache = page_cache if page_cache is not None else (PageCache(cache_dir, cache_expires) if cache_dir else None)
+        self.session_pool = session_pool if session_pool is not None else SessionPool()
+        self.browser_pool = browser_pool if browser_pool is not None else BrowserPool()
+        # a pool passed by the caller is shared and closed by it
+        self.own_browser_pool = browser_pool is None
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self.parse_workers = parse_workers
+        self.parse_pools = dict()
+        # compiled specs of the provider each parse pool was created with
+        self.parse_pool_specs = dict()
+        self.zero_copy = zero_copy
+        self.scheduler = scheduler
+        self.enrich_concurrency = enrich_concurrency
+        self.frontier = frontier
+        self.store = store if store is not None else (RealtyStore(self.realty_datafile_path, compact_every=compact_every) if self.realty_datafile_path else None)
+        self.spec_registry = SpecRegistry(self.webs_specs_datafile_path, self.store if isinstance(self.store, SqliteStore) else None)
 
-    def get_by_name(self, df, provider, dtype, scope, name) -> str:
+    @property
+    def web_specs(self) -> pd.DataFrame:
+        return self.spec_registry.get_web_specs()
+
+    @staticmethod
+    def get_by_name(df, provider, dtype, scope, name) -> str:
         df = df[(df['provider'] == provider) & (df['type'] == dtype) & (df['scope'] == scope) & (df['name'] == name)]
         return df['value'].values[0]
 
-    def get_dict_rx(self, df, provider, scope) -> dict:
+    @staticmethod
+    def get_dict_rx(df, provider, scope) -> dict:
         result = {}
-        df = df[(df['provider'] == provider) & (df['type'] == 'regex') & (df['scope'] == scope)]
+        df_provider = df[df['provider'] == provider]
+        df = df_provider[(df_provider['type'] == 'regex') & (df_provider['scope'] == scope)]
         for index, row in df.iterrows():
             regex_str = row['value']
             options = re.DOTALL if str(row['options']).__contains__('DOTALL') else 0
-            result[row['name']] = re.compile(regex_str, options) if type(regex_str) is str else None
+            result[row['name']] = FieldRegex.from_options(re.compile(regex_str, options), row['options']) if type(regex_str) is str else None
+        # jsonpath specs read the field from the state embedded in the page, the regex of the same field is the fallback
+        df = df_provider[(df_provider['type'] == 'jsonpath') & (df_provider['scope'] == scope)]
+        if not df.empty:
+            state_rx = next(iter(Crawler.get_dict_rx(df_provider, provider, 'state').values()), None)
+            for index, row in df.iterrows():
+                result[row['name']] = JsonPath(row['value'], state_rx, result.get(row['name']))
         return result
 
-    def get_dict_lambda(self, df, provider, scope) -> dict:
+    @staticmethod
+    def get_block_rules(df, provider) -> list:
+        """ Rules of the browser requests to abort, by resource type (scope resource) or url pattern (scope url) """
+        df = df[(df['provider'] == provider) & (df['type'] == 'block')]
+        return [(row['scope'], re.compile(row['value'], re.IGNORECASE)) for index, row in df.iterrows() if type(row['value']) is str]
+
+    @staticmethod
+    def get_limit(df, provider, name) -> int:
+        """ Numeric limit of the provider, e.g. max_bytes of a page, None if not defined """
+        df = df[(df['provider'] == provider) & (df['type'] == 'limit') & (df['name'] == name)]
+        return int(df['value'].values[0]) if not df.empty else None
+
+    @staticmethod
+    def get_dict_lambda(df, provider, scope) -> dict:
         result = {}
         df = df[(df['provider'] == provider) & (df['type'] == 'lambda') & (df['scope'].isin([scope, 'global']))]
         for index, row in df.iterrows():
             result[row['name']] = eval(row['value'])
         return result
 
-    def _get_provider_specs(self, provider):
-        url = self.get_by_name(self.web_specs, provider, 'url', 'global', 'base_url')
-        list_items = self.get_dict_rx(self.web_specs, provider, 'list_items')
-        list_next = self.get_dict_rx(self.web_specs, provider, 'list_next')
-        list_fields = self.get_dict_rx(self.web_specs, provider, 'list_field')
-        detail_fields = self.get_dict_rx(self.web_specs, provider, 'detail_field')
-        list_fields_lambda = self.get_dict_lambda(self.web_specs, provider, 'list_field')
-        detail_fields_lambda = self.get_dict_lambda(self.web_specs, provider, 'detail_field')
+    @staticmethod
+    def compile_provider_specs(web_specs: pd.DataFrame, provider):
+        """ Compiles the regexes and lambdas of the provider, used by the crawler and by the parsing workers """
+        url = Crawler.get_by_name(web_specs, provider, 'url', 'global', 'base_url')
+        list_items = Crawler.get_dict_rx(web_specs, provider, 'list_items')
+        list_next = Crawler.get_dict_rx(web_specs, provider, 'list_next')
+        list_fields = Crawler.get_dict_rx(web_specs, provider, 'list_field')
+        detail_fields = Crawler.get_dict_rx(web_specs, provider, 'detail_field')
+        list_fields_lambda = Crawler.get_dict_lambda(web_specs, provider, 'list_field')
+        detail_fields_lambda = Crawler.get_dict_lambda(web_specs, provider, 'detail_field')
 
         return url, list_items, list_next, list_fields, detail_fields, list_fields_lambda, detail_fields_lambda
 
+    def _get_provider_specs(self, provider):
+        return self.spec_registry.get(provider).specs()
+
+    def _new_scraper(self, provider, url, datafile_path=None) -> Scraper:
+        """ Scraper of the provider with the shared crawl resources, its specs and extraction plans come from the registry """
+        spec = self.spec_registry.get(provider)
+        return Scraper(url, datafile_path, spec.list_items, spec.list_fields, spec.list_next, spec.detail_fields, spec.list_fields_lambda, spec.detail_fields_lambda,
+            self.cache_dir, self.cache_expires, self.delay_seconds, self.fetcher, self.session_pool, self.store, self.page_cache, self.browser_pool,
+            spec.page_ready, list(spec.block_rules), self.zero_copy, spec.abort, spec.max_bytes, self.scheduler, spec.plans)
+
     def crawl_provider(self, provider, dry_run=False):
 
         self.logger.info(f"Crawling provider: {provider}")
@@ -64,32 +134,243 @@ class Crawler:
 
         if dry_run:
             scraper = Scraper(url, Path(f'tests/{provider}_test.csv'), list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, cache_dir=None, cache_expires=0, delay_seconds=0)
-            data = scraper.parse_list(Scraper.CLEAN_RX.sub('',open(f'tests/{provider}_lista.html', 'r').read()), list_items, list_fields, list_fields_lambda)
+            data = scraper.parse_list(scraper.get_page_content(open(f'tests/{provider}_lista.html', 'r').read()), list_items, list_fields, list_fields_lambda)
             scraper.store_page_csv(data)
-            return scraper.get_scraped_items()
-        else:            
-            scraper = Scraper(url, self.realty_datafile_path, list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, self.cache_dir, self.cache_expires, self.delay_seconds)
-            scraper.scrap_list()
-            return scraper.get_scraped_items()
+            return pd.DataFrame(data) if data else None
+        else:
+            pages = list(self.iter_provider(provider))
+            return pd.concat(pages, ignore_index=True) if pages else None
+
+    def iter_provider(self, provider, max_pages: int = None, max_items: int = None):
+        """
+        Lazily crawls the list view of a provider, each page is stored as soon as it is
+        parsed and yielded as a DataFrame, the next page is not fetched until requested.
+
+        Args:
+            provider (str): The provider to crawl.
+            max_pages (int): maximum number of pages, defaults to the crawler max_pages.
+            max_items (int): maximum number of items, defaults to the crawler max_items.
+        """
+        url = self.spec_registry.get(provider).url
+        if self.frontier is not None:
+            # an interrupted crawl goes on at the page after its last checkpoint
+            url = self.frontier.start(provider, url)
+            if url is None: return
+        scraper = self._new_scraper(provider, url, self.realty_datafile_path)
+        if self.frontier is not None:
+            # the delay before a request can outlast the lease taken at the last checkpoint
+            scraper.before_fetch = self.frontier.renew
+        max_pages = max_pages if max_pages is not None else self.max_pages
+        max_items = max_items if max_items is not None else self.max_items
+        looped = False
+        for curr_page in scraper.iter_pages(max_pages, max_items):
+            if self.frontier is not None and not self.frontier.checkpoint(provider, scraper.url, scraper.next_url) and scraper.next_url is not None:
+                self.logger.info(f'Finalizado, la siguiente página ya se procesó: {scraper.next_url}')
+                looped = True
+            yield pd.DataFrame(curr_page)
+            if looped: break
+        # after a failed page the frontier is kept, the next crawl retries that page
+        if self.frontier is not None and (looped or scraper.completed):
+            self.frontier.finish(provider)
 
     def crawl_item(self, provider, url, dry_run=False):
         self.logger.info(f"Crawling item: {provider} , {url}")
         _, list_items, list_next, list_fields, detail_fields, list_fields_lambda, detail_fields_lambda = self._get_provider_specs(provider)
         if dry_run:
             scraper = Scraper(url, Path(f'tests/{provider}_test.csv'), list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, cache_dir=None, cache_expires=0, delay_seconds=0)
-            data = scraper.parse_item(Scraper.CLEAN_RX.sub('',open(f'tests/{provider}_detalle.html', 'r').read()), detail_fields, detail_fields_lambda)
+            data = scraper.parse_item(scraper.get_page_content(open(f'tests/{provider}_detalle.html', 'r').read()), detail_fields, detail_fields_lambda)
             return [data]
         else:            
-            scraper = Scraper(url, self.realty_datafile_path, list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, self.cache_dir, self.cache_expires, self.delay_seconds)
+            scraper = self._new_scraper(provider, url, self.realty_datafile_path)
             scraper.scrap_item()
             return scraper.get_scraped_items()
 
-    def run(self, dry_run=False):
-        scraped_items = None
-        for provider in self.web_specs['provider'].unique():
+    def _fetch_item(self, provider, url) -> dict:
+        """ Fetches and parses a detail page without storing it, None if the page failed """
+        scraper = self._new_scraper(provider, url)
+        response = scraper.get_response()
+        if response is None: return None
+        return scraper.parse_item(scraper.get_content(response), scraper.detail_fields, scraper.detail_fields_lambda)
+
+    def _fetch_item_body(self, provider, url) -> bytes:
+        """ Fetches a detail page without parsing it, None if the page failed """
+        response = self._new_scraper(provider, url).get_response()
+        return response.content if response is not None else None
+
+    def crawl_items(self, provider, urls: list) -> list:
+        """
+        Fetches and parses several detail pages of a provider at once. Each page goes through
+        Scraper.get_response, with the page cache, the conditional requests, the abort checks
+        and the retries. The requests are paced per host by the fetcher or the host scheduler,
+        with them at most enrich_concurrency are in flight. Without them each scraper only sleeps
+        its own delay, so the pages are fetched one at a time. The items are not stored.
+
+        Returns:
+            list: A list of dictionaries with the detail fields, None for the failed urls.
+        """
+        if not urls: return []
+        self.logger.info(f"Crawling {len(urls)} items: {provider}")
+        # the fetcher keeps its own limit of requests in flight, the threads only wait for it
+        if self.fetcher is not None:
+            concurrency = self.fetcher.max_concurrency
+        elif self.scheduler is not None:
+            concurrency = self.enrich_concurrency
+        else:
+            # all the urls are of the same host and nothing paces the threads between them
+            concurrency = 1
+        parse_pool = self.get_parse_pool(provider)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(urls))), thread_name_prefix='enrich') as executor:
+            if parse_pool is None:
+                return list(executor.map(lambda url: self._fetch_item(provider, url), urls))
+            bodies = list(executor.map(lambda url: self._fetch_item_body(provider, url), urls))
+        parsed = iter(parse_pool.parse(('item', url, body) for url, body in zip(urls, bodies) if body is not None))
+        return [next(parsed) if body is not None else None for body in bodies]
+
+    def enrich(self, links: list, force: bool = False) -> pd.DataFrame:
+        """
+        Enriches the realties of the links with the fields of their detail pages. The links are
+        deduplicated, grouped by provider and the already enriched ones are skipped, then all
+        the detail pages are crawled and the fields are written to the store in one upsert.
+
+        Args:
+            links (list): The links of the realties.
+            force (bool): Crawl again the links already enriched.
+
+        Returns:
+            DataFrame: The enriched realties in the order of the links, with an enriched_at column.
+        """
+        leased = list()
+        if self.frontier is not None:
+            # the links of an interrupted enrichment are enriched along with the new ones
+            leased = self.frontier.lease(kind='item')
+            links = list(links) + leased
+        links = list(dict.fromkeys(link for link in links if isinstance(link, str) and link))
+        if not force and links and hasattr(self.store, 'enriched_links'):
+            enriched = self.store.enriched_links(links)
+            links = [link for link in links if link not in enriched]
+
+        by_provider = dict()
+        for link in links:
+            provider = self.spec_registry.provider_of(link)
+            if provider is None:
+                self.logger.warning(f'No provider for {link}')
+                continue
+            by_provider.setdefault(provider, []).append(link)
+        if self.frontier is not None:
+            # the leased links already enriched or without provider are not crawled, they leave the frontier
+            to_crawl = set(url for urls in by_provider.values() for url in urls)
+            self.frontier.discard([url for url in leased if url not in to_crawl])
+
+        enriched_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        items = dict()
+        for provider, urls in by_provider.items():
+            self.logger.info(f'Enriching {len(urls)} realties of {provider}')
+            if self.frontier is not None:
+                self.frontier.add(provider, urls, 'item')
+            for url, item in zip(urls, self.crawl_items(provider, urls)):
+                if item is None: continue
+                # the realty keeps its link and the date it was first crawled
+                item.pop('created', None)
+                items[url] = {**item, 'link': url, 'enriched_at': enriched_at}
+
+        enriched_df = pd.DataFrame([items[link] for link in links if link in items])
+        if not enriched_df.empty and hasattr(self.store, 'upsert_realties'):
+            self.store.upsert_realties(enriched_df)
+        if self.frontier is not None:
+            # once stored the links leave the frontier, the failed ones are not retried
+            crawled = [url for urls in by_provider.values() for url in urls]
+            self.frontier.discard([url for url in crawled if url in items])
+            self.frontier.fail([url for url in crawled if url not in items])
+        self.logger.info(f'Enriched {len(enriched_df)} of {len(links)} realties')
+        return enriched_df
+
+    def get_parse_pool(self, provider) -> ParsePool:
+        """
+        Process pool that parses the pages of the provider, None when parse_workers is 0.
+        The workers compile the specs once, the pool is recreated when the specs file changes.
+        """
+        if not self.parse_workers: return None
+        spec = self.spec_registry.get(provider)
+        if self.parse_pool_specs.get(provider) is not spec:
+            if provider in self.parse_pools:
+                self.logger.info(f'Specs of {provider} reloaded, restarting its parse pool')
+                self.parse_pools.pop(provider).close()
+            self.parse_pools[provider] = ParsePool(self.web_specs, provider, self.parse_workers)
+            self.parse_pool_specs[provider] = spec
+        return self.parse_pools[provider]
+
+    def parse_cached(self, provider, urls: list, kind: str = 'list') -> pd.DataFrame:
+        """
+        Parses again the cached pages of the urls without fetching them, in the parse pool
+        when parse_workers is set.
+
+        Args:
+            provider (str): The provider of the pages.
+            urls (list): The urls of the cached pages, the ones not cached are skipped.
+            kind (str): list for list view pages, item for detail pages.
+
+        Returns:
+            DataFrame: The parsed items in the order of the urls, empty without page cache.
+        """
+        if self.page_cache is None:
+            self.logger.warning(f'No page cache to parse the pages of {provider} from')
+            return pd.DataFrame()
+        pages = ((kind, url, body) for url in urls for body in [self.page_cache.read(url)] if body is not None)
+        parse_pool = self.get_parse_pool(provider)
+        if parse_pool is not None:
+            results = parse_pool.parse(pages)
+        else:
+            url, list_items, list_next, list_fields, detail_fields, list_fields_lambda, detail_fields_lambda = self._get_provider_specs(provider)
+            scraper = Scraper(url, None, list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, cache_dir=None, cache_expires=0, delay_seconds=0)
+            def parse(kind, url, body):
+                content = scraper.get_page_content(body.decode('utf-8'))
+                if kind == 'list':
+                    return scraper.parse_list(content, list_items, list_fields, list_fields_lambda, detail_fields_lambda)
+                return scraper.parse_item(content, detail_fields, detail_fields_lambda)
+            results = (parse(*page) for page in pages)
+        items = []
+        for result in results:
+            if result is None: continue
+            items += result if kind == 'list' else [result]
+        return pd.DataFrame(items)
+
+    def close(self):
+        """ Shuts down the parse pools, and the browsers when the browser pool was created by the crawler """
+        for parse_pool in self.parse_pools.values():
+            parse_pool.close()
+        self.parse_pools = dict()
+        self.parse_pool_specs = dict()
+        if self.own_browser_pool:
+            self.browser_pool.close()
+
+    def _crawl_provider_safe(self, provider, dry_run=False):
+        """ crawl_provider that logs the errors of the provider instead of raising them, so the other providers go on """
+        start = time.perf_counter()
+        try:
             scraped_provider = self.crawl_provider(provider, dry_run=dry_run)
-            if scraped_provider is None: continue
-            scraped_items = pd.concat([scraped_items, scraped_provider], ignore_index=True)
+        except Exception as e:
+            self.logger.error(f'Error crawling provider {provider}: {e}', exc_info=True)
+            return None
+        self.logger.info(f'Provider {provider} crawled in {time.perf_counter() - start:.0f} secs')
+        return scraped_provider
+
+    def run(self, dry_run=False):
+        providers = self.spec_registry.providers()
+        if self.frontier is not None and not dry_run:
+            # the expired leases of a crawl that died are released, its providers resume at their checkpoint
+            self.frontier.recover()
+            self.frontier.prune()
+        # each provider has its own scraper and pacing, a slow or failing site does not delay the others
+        with ThreadPoolExecutor(max_workers=max(1, len(providers)), thread_name_prefix='crawler') as executor:
+            scraped_providers = list(executor.map(lambda provider: self._crawl_provider_safe(provider, dry_run), providers))
+
+        # the items were stored page by page, they are only concatenated once for the caller
+        scraped_providers = [scraped_provider for scraped_provider in scraped_providers if scraped_provider is not None and not scraped_provider.empty]
+        scraped_items = pd.concat(scraped_providers, ignore_index=True) if scraped_providers else None
+
+        # expired pages are evicted once per crawl instead of after every scrap
+        if self.page_cache is not None and not dry_run:
+            self.page_cache.evict()
         return scraped_items
 
 if __name__ == '__main__':
@@ -0,0 +1,307 @@
+import re
+import json
+from json_path import JsonPath
+
+# same as Scraper.CLEAN_RX, applied to the values extracted from raw pages
+CLEAN_RX = re.compile(r'\n|\r|\\(?!u)')
+
+class BytesRegex:
+
+    # the characters that CLEAN_RX removes from the page, allowed before every atom of the raw pattern.
+    # Possessive, as no atom of the cleaned page can match them, which also avoids backtracking into them
+    NOISE = r'(?:[\r\n]|\\(?!u))*+'
+    QUANTIFIER_RX = re.compile(r'(?:[*+?]|\{\d*(?:,\d*)?\})[?+]?')
+    GROUP_RX = re.compile(r'\(\?(?:P<\w+>|P=\w+\)|<=|<!|[:=!>]|[aiLmsux-]+[:)]|#[^)]*\))|\(')
+
+    @staticmethod
+    def _literal(char) -> str:
+        data = char.encode('utf-8')
+        if len(data) == 1: return re.escape(char) if not char.isalnum() else char
+        return '(?:' + ''.join(f'\\x{b:02x}' for b in data) + ')'
+
+    @staticmethod
+    def _escape(pattern, i):
+        """ Returns the escape at i as a bytes pattern atom and the index after it """
+        char = pattern[i + 1]
+        if char == 'u' or char == 'U':
+            length = 4 if char == 'u' else 8
+            return BytesRegex._literal(chr(int(pattern[i + 2:i + 2 + length], 16))), i + 2 + length
+        if char == 'x':
+            return BytesRegex._literal(chr(int(pattern[i + 2:i + 4], 16))), i + 4
+        if char == 'N':
+            raise ValueError('named unicode escapes are not supported')
+        if char == 'w':
+            # \w of bytes patterns is ascii only, the bytes of the utf-8 letters are accepted too
+            return '[\\w\\x80-\\xff]', i + 2
+        if char.isdigit() and char != '0':
+            end = i + 2
+            while end < len(pattern) and pattern[end].isdigit(): end += 1
+            return pattern[i:end], end
+        if not char.isascii(): return BytesRegex._literal(char), i + 2
+        return pattern[i:i + 2], i + 2
+
+    @staticmethod
+    def _class(pattern, i):
+        """ Returns the character class at i and the index after it, only ascii classes can be translated """
+        end = i + 1
+        if end < len(pattern) and pattern[end] == '^': end += 1
+        if end < len(pattern) and pattern[end] == ']': end += 1
+        while pattern[end] != ']':
+            end += 2 if pattern[end] == '\\' else 1
+        atom = pattern[i:end + 1]
+        if not atom.isascii() or '\\u' in atom or '\\U' in atom or '\\N' in atom:
+            raise ValueError(f'non ascii character class {atom}')
+        return atom, end + 1
+
+    @staticmethod
+    def translate(pattern: str) -> str:
+        """
+        Translates a pattern written for the cleaned page into a pattern for the raw page,
+        the newlines and backslashes removed by CLEAN_RX may appear before every atom.
+
+        Raises:
+            ValueError: If the pattern can not be translated.
+        """
+        out = []
+        groups = []
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == '(':
+                group = BytesRegex.GROUP_RX.match(pattern, i).group(0)
+                out.append(group)
+                if not group.endswith(')'): groups.append(group)
+                i += len(group)
+                continue
+            if char == ')':
+                groups.pop()
+                out.append(char)
+                i += 1
+                quantifier = BytesRegex.QUANTIFIER_RX.match(pattern, i)
+                if quantifier is not None:
+                    out.append(quantifier.group(0))
+                    i = quantifier.end()
+                continue
+            if char in '|^$':
+                out.append(char)
+                i += 1
+                continue
+            if char == '\\':
+                if pattern[i + 1] in 'AZbB':
+                    out.append(pattern[i:i + 2])
+                    i += 2
+                    continue
+                atom, i = BytesRegex._escape(pattern, i)
+            elif char == '[':
+                atom, i = BytesRegex._class(pattern, i)
+            elif char in '*+?' or BytesRegex.QUANTIFIER_RX.match(pattern, i):
+                raise ValueError(f'unexpected quantifier at {i}')
+            else:
+                atom, i = BytesRegex._literal(char) if char != '.' else '.', i + 1
+            quantifier = BytesRegex.QUANTIFIER_RX.match(pattern, i)
+            quantifier = quantifier.group(0) if quantifier is not None else ''
+            i += len(quantifier)
+            if any(group in ('(?<=', '(?<!') for group in groups):
+                # lookbehinds must have a fixed width
+                out.append(atom + quantifier)
+            elif quantifier:
+                out.append(f'(?:{BytesRegex.NOISE}{atom}){quantifier}')
+            else:
+                out.append(BytesRegex.NOISE + atom)
+        return ''.join(out)
+
+    @staticmethod
+    def compile(regex: re.Pattern) -> re.Pattern:
+        """ Compiles the bytes version of a regex written for the cleaned page """
+        if regex.flags & re.VERBOSE:
+            raise ValueError('verbose patterns are not supported')
+        return re.compile(BytesRegex.translate(regex.pattern).encode('ascii'), regex.flags & ~re.UNICODE)
+
+    @staticmethod
+    def decode(value):
+        """ Decodes and cleans a value extracted from the raw page """
+        if isinstance(value, tuple):
+            return tuple(BytesRegex.decode(v) for v in value)
+        if isinstance(value, str): return value
+        return CLEAN_RX.sub('', value.decode('utf-8', errors='replace'))
+
+class FieldRegex:
+
+    OPTIONS = ('FIRST', 'ANCHOR', 'WINDOW')
+
+    def __init__(self, regex: re.Pattern, first: bool = False, anchor: str = None, window: int = None):
+        '''
+        Compiled regex of a field with its extraction options
+
+        Parameters
+        ----------
+        regex : Pattern
+            compiled regex of the field
+        first : bool
+            only the first match is used, the search stops there instead of finding all of them
+        anchor : str
+            literal text where the search of the field starts, the field is None if it is missing
+        window : int
+            maximum number of characters searched from the anchor or the start of the item
+        '''
+        self.regex = regex
+        self.first = first
+        self.anchor = anchor
+        self.window = window
+
+    @staticmethod
+    def from_options(regex: re.Pattern, options) -> 're.Pattern | FieldRegex':
+        """
+        Wraps the regex when the options column of the spec has extraction options,
+        separated by ; like DOTALL;FIRST;ANCHOR=<h1;WINDOW=2000
+
+        Returns:
+            The FieldRegex, or the regex itself when there are no extraction options.
+        """
+        options = [option.strip() for option in str(options).split(';')]
+        values = dict(option.split('=', 1) if '=' in option else (option, True) for option in options)
+        if not any(option in values for option in FieldRegex.OPTIONS): return regex
+        window = values.get('WINDOW')
+        return FieldRegex(regex, 'FIRST' in values, values.get('ANCHOR'), int(window) if window else None)
+
+    def findall(self, html):
+        """ Same as the findall of the regex, used by the _sub fields """
+        return self.regex.findall(html)
+
+class ExtractionPlan:
+
+    START_RX = re.compile(r'^(\(*)\^')
+
+    def __init__(self, fields_rx: dict, binary: bool = False):
+        '''
+        Precompiled extraction of the fields of a provider
+
+        Each field is searched between the offsets of its item in the page instead of in a
+        copy of the item, the fields with the FIRST option stop at the first match and the
+        ones with an ANCHOR only search a window after it. Patterns starting with ^ are
+        matched at the start of the item, other uses of ^ are searched in a copy of the item.
+
+        Parameters
+        ----------
+        fields_rx : dict
+            compiled regex, FieldRegex or JsonPath of each field, as built by Crawler.get_dict_rx
+        binary : bool
+            the pages are the raw bytes, or a memory map of them, instead of the cleaned text.
+            The regexes are translated to bytes patterns that skip the characters removed by
+            CLEAN_RX and only the extracted values are decoded and cleaned.
+
+        Raises:
+            ValueError: If binary and a regex can not be translated to a bytes pattern.
+        '''
+        self.fields_rx = fields_rx
+        self.binary = binary
+        self.rules = dict()
+        self.start_regexes = dict()
+        self.bytes_regexes = dict()
+        for name, spec in fields_rx.items():
+            if '_elem' in name: continue
+            elem = fields_rx.get(name.replace('sub', 'elem')) if 'sub' in name else None
+            self.rules[name] = (name.replace('_sub', ''), spec, elem)
+            if binary:
+                regex = spec.fallback if isinstance(spec, JsonPath) else spec
+                regex = ExtractionPlan._unwrap(regex)[0] if regex is not None else None
+                if regex is not None: self._runtime_regex(regex)
+
+    def _runtime_regex(self, regex):
+        """ The regex used on the pages, its bytes translation in binary plans """
+        if not self.binary: return regex
+        if regex not in self.bytes_regexes:
+            self.bytes_regexes[regex] = BytesRegex.compile(regex)
+        return self.bytes_regexes[regex]
+
+    def _start_regex(self, regex):
+        """ The regex without its leading ^, None if it has other ^ or is MULTILINE """
+        if regex not in self.start_regexes:
+            stripped = ExtractionPlan.START_RX.sub(r'\1', regex.pattern, count=1)
+            usable = stripped != regex.pattern and '^' not in stripped and not regex.flags & re.MULTILINE
+            self.start_regexes[regex] = self._runtime_regex(re.compile(stripped, regex.flags)) if usable else None
+        return self.start_regexes[regex]
+
+    @staticmethod
+    def _unwrap(spec):
+        if isinstance(spec, FieldRegex):
+            return spec.regex, spec.first, spec.anchor, spec.window
+        return spec, False, None, None
+
+    def _group(self, match, groups):
+        # same values as findall: the whole match, the group or the tuple of groups
+        if groups == 0: value = match.group(0)
+        elif groups == 1: value = match.group(1) or ''
+        else: value = match.groups('')
+        return BytesRegex.decode(value) if self.binary and value != '' else value
+
+    def search(self, spec, html, pos: int = 0, endpos: int = None):
+        """
+        Searches the regex spec between pos and endpos of html.
+
+        Returns:
+            The match when only one is found or with FIRST, the list of matches or None if none found.
+        """
+        regex, first, anchor, window = ExtractionPlan._unwrap(spec)
+        endpos = len(html) if endpos is None else endpos
+        if anchor is not None:
+            pos = html.find(anchor.encode('utf-8') if self.binary else anchor, pos, endpos)
+            if pos < 0: return None
+        if window is not None:
+            endpos = min(endpos, pos + window)
+        if pos > 0 and '^' in regex.pattern:
+            start_rx = self._start_regex(regex)
+            if start_rx is not None:
+                # a pattern anchored at the start of the item matches once, at pos
+                match = start_rx.match(html, pos, endpos)
+                return None if match is None else self._group(match, start_rx.groups) or None
+            html, pos, endpos = html[pos:endpos], 0, endpos - pos
+        regex = self._runtime_regex(regex)
+
+        if first:
+            match = regex.search(html, pos, endpos)
+            ret = self._group(match, regex.groups) if match is not None else ''
+        else:
+            ret = [self._group(match, regex.groups) for match in regex.finditer(html, pos, endpos)]
+            ret = ret[0] if len(ret) == 1 else ret
+        return None if len(ret) == 0 else ret
+
+    def spans(self, spec, html) -> list:
+        """ Offsets of the items of the list view, the first group of the regex or the whole match """
+        regex = self._runtime_regex(ExtractionPlan._unwrap(spec)[0])
+        group = 1 if regex.groups > 0 else 0
+        return [match.span(group) for match in regex.finditer(html)]
+
+    def extract_field(self, name, html, pos: int = 0, endpos: int = None, state=None):
+        """
+        Extracts a field without its lambda.
+
+        Args:
+            name (str): The name of the field spec.
+            html (str): The page, or the dict of the item when the items come from the page state.
+            pos (int): Offset where the item starts.
+            endpos (int): Offset where the item ends, None for the end of the page.
+            state (dict): The state of the page for the JsonPath specs.
+        """
+        out_name, spec, elem = self.rules[name]
+        if spec is None: return None
+        ret = None
+        if isinstance(spec, JsonPath):
+            # list items parsed from the state are dicts, the page state is used otherwise
+            source = html if isinstance(html, (dict, list)) else state
+            ret = spec.find(source) if source is not None else None
+            spec = spec.fallback if ret is None else None
+        if spec is not None:
+            if isinstance(html, (dict, list)):
+                # an item of the page state, the regex runs over its JSON text
+                html, pos, endpos = json.dumps(html, ensure_ascii=False), 0, None
+                ret = self.search(spec, html.encode('utf-8') if self.binary else html, pos, endpos)
+            else:
+                ret = self.search(spec, html, pos, endpos)
+        if elem is not None and ret is not None:
+            ret = elem.findall(ret)
+        return ret
+
+    def extract(self, html, pos: int = 0, endpos: int = None, state=None) -> dict:
+        """ Extracts all the fields of an item without their lambdas, keyed by field spec name """
+        return {name: self.extract_field(name, html, pos, endpos, state) for name in self.rules}
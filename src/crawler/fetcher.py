@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import threading
+import time
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from session_pool import SessionPool
+from host_scheduler import HostScheduler
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float = 1):
+        '''
+        Token bucket used to pace the requests sent to a single host
+
+        Parameters
+        ----------
+        rate : float
+            tokens refilled per second, 0 or None disables the limit
+        capacity : float
+            maximum number of tokens, the burst allowed after an idle period
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and consumes it.
+        The lock is created lazily so that the bucket is bound to the running loop.
+        """
+        if not self.rate: return
+        if self.lock is None: self.lock = asyncio.Lock()
+
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+class AsyncFetcher:
+
+    HOST_RX = re.compile(r'https?://([^/]+)')
+
+    def __init__(self, max_concurrency: int = 4, delay_seconds: int = 30, burst: int = 1, session_pool: SessionPool = None, scheduler: HostScheduler = None):
+        '''
+        Asyncio based fetch engine that keeps several requests in flight across different hosts
+
+        Politeness is enforced per host by a token bucket refilled at one token every
+        delay_seconds, so requests to different hosts never wait for each other.
+        The engine owns an event loop running in a background thread, the blocking
+        methods get and get_many can be called from synchronous code.
+
+        Parameters
+        ----------
+        max_concurrency : int
+            maximum number of requests in flight at the same time
+        delay_seconds : int
+            minimum mean seconds between two requests to the same host
+        burst : int
+            number of requests allowed to a host without waiting after an idle period
+        session_pool : SessionPool
+            keep-alive sessions used for the requests, a private pool is created if not provided
+        scheduler : HostScheduler
+            adaptive per host delays, used instead of the token buckets when provided
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.max_concurrency = max_concurrency
+        self.delay_seconds = delay_seconds
+        self.burst = burst
+        self.buckets = dict()
+        self.session_pool = session_pool if session_pool is not None else SessionPool(pool_size=max_concurrency)
+        self.scheduler = scheduler
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='fetcher')
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fetcher-loop', daemon=True)
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(self._create_semaphore(), self.loop).result()
+
+    async def _create_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def get_host(self, url):
+        return AsyncFetcher.HOST_RX.search(url).group(1)
+
+    def get_bucket(self, host) -> TokenBucket:
+        if host not in self.buckets:
+            rate = 1 / self.delay_seconds if self.delay_seconds else 0
+            self.buckets[host] = TokenBucket(rate, self.burst)
+        return self.buckets[host]
+
+    def _request(self, url, headers=None, **kwargs):
+        self.logger.info(f'Obterniendo con AsyncFetcher: {url}')
+        response = self.session_pool.get(url, headers=headers, **kwargs)
+        self.logger.debug(f'Response status: {response.status_code}')
+        return response
+
+    async def fetch(self, url, headers=None, stream: bool = False) -> requests.Response:
+        """
+        Fetches a single url once its host is due, by its bucket or the scheduler, and a concurrency slot is free.
+        With stream only the headers are read, the caller reads the body in chunks.
+
+        Returns:
+            requests.Response: the response, or None if the request raised an exception.
+        """
+        host = self.get_host(url)
+        if self.scheduler is not None:
+            await asyncio.sleep(self.scheduler.reserve(host))
+        else:
+            await self.get_bucket(host).acquire()
+        async with self.semaphore:
+            start = time.monotonic()
+            try:
+                request = functools.partial(self._request, url, headers, stream=True) if stream else functools.partial(self._request, url, headers)
+                response = await self.loop.run_in_executor(self.executor, request)
+            except Exception as e:
+                self.logger.error(f'Error fetching {url}: {e}')
+                response = None
+            if self.scheduler is not None:
+                self.scheduler.record(host, response.status_code if response is not None else None, time.monotonic() - start, HostScheduler.retry_after(response))
+            return response
+
+    async def fetch_all(self, urls: list, headers=None) -> list:
+        return await asyncio.gather(*[self.fetch(url, headers) for url in urls])
+
+    def get(self, url, headers=None, stream: bool = False) -> requests.Response:
+        """ Blocking version of fetch, can be called concurrently from several threads """
+        return asyncio.run_coroutine_threadsafe(self.fetch(url, headers, stream), self.loop).result()
+
+    def get_many(self, urls: list, headers=None) -> list:
+        """ Blocking version of fetch_all, responses are returned in the order of urls """
+        return asyncio.run_coroutine_threadsafe(self.fetch_all(urls, headers), self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.executor.shutdown(wait=False)
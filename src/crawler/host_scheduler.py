@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import random
+import threading
+import logging
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+
+class HostScheduler:
+
+    THROTTLE_STATUSES = (429, 503)
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # the delay of a healthy host decreases by this factor after each successful request
+    DECREASE = 0.9
+    # weight of the last latency in the moving average
+    LATENCY_ALPHA = 0.3
+
+    def __init__(self, delay_seconds: float = 30, min_delay: float = 1, max_delay: float = 3600, max_retries: int = 3,
+        backoff_base: float = 2, latency_factor: float = 10, state_path: Path = None):
+        '''
+        Adaptive pacing of the requests sent to each host
+
+        Each host starts at delay_seconds between requests. The delay decreases while the
+        host answers, but never below latency_factor times its mean latency, so a slow host
+        is given more time between requests. A 429 or 503 doubles the delay and blocks the
+        host for the Retry-After seconds, other errors block it for an exponential backoff
+        with jitter. The learned delays are persisted in state_path between runs.
+
+        Parameters
+        ----------
+        delay_seconds : float
+            initial mean seconds between two requests to a host not seen before
+        min_delay : float
+            minimum mean seconds between two requests to the same host
+        max_delay : float
+            maximum seconds between two requests and of a backoff
+        max_retries : int
+            times a request is retried after a 429 or 5xx response
+        backoff_base : float
+            seconds of the first backoff, doubled after each consecutive failure
+        latency_factor : float
+            minimum delay as a multiple of the mean latency of the host
+        state_path : Path
+            json file where the delays of the hosts are loaded from and saved to
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.delay_seconds = delay_seconds
+        self.min_delay = min(min_delay, delay_seconds) if delay_seconds else 0
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.latency_factor = latency_factor
+        self.state_path = Path(state_path) if state_path else None
+        self.lock = threading.Lock()
+        self.hosts = dict()
+
+        self.requests_count = 0
+        self.throttled = 0
+        self.failures = 0
+        self.load()
+
+    def _host(self, host) -> dict:
+        if host not in self.hosts:
+            self.hosts[host] = {'delay': self.delay_seconds, 'latency': None, 'blocked_until': 0, 'next_at': 0, 'failures': 0}
+        return self.hosts[host]
+
+    def delay(self, host) -> float:
+        with self.lock:
+            return self._host(host)['delay']
+
+    def reserve(self, host) -> float:
+        """
+        Reserves the next request slot of the host, spread around its delay.
+
+        Returns:
+            float: The seconds to wait before sending the request.
+        """
+        with self.lock:
+            state = self._host(host)
+            now = time.time()
+            start = max(now, state['next_at'], state['blocked_until'])
+            state['next_at'] = start + random.uniform(0.5, 1.5) * state['delay']
+            return start - now
+
+    def wait(self, host) -> float:
+        """ Blocking version of reserve, returns the seconds waited """
+        seconds = self.reserve(host)
+        if seconds > 0:
+            self.logger.info(f'Waiting {seconds:.0f} secs delay for {host}')
+            time.sleep(seconds)
+        return seconds
+
+    def backoff(self, failures: int) -> float:
+        """ Exponential backoff with full jitter after the given number of consecutive failures """
+        return random.uniform(0, min(self.max_delay, self.backoff_base * 2 ** failures))
+
+    def record(self, host, status: int, latency: float, retry_after: float = None):
+        """
+        Adjusts the delay of the host with the result of a request.
+
+        Args:
+            host (str): The host of the request.
+            status (int): The status code, None if the request raised an exception.
+            latency (float): Seconds until the response headers were received.
+            retry_after (float): Seconds of the Retry-After header, if any.
+        """
+        with self.lock:
+            state = self._host(host)
+            now = time.time()
+            self.requests_count += 1
+            if status is not None and status < 400:
+                state['failures'] = 0
+                state['latency'] = latency if state['latency'] is None else (1 - self.LATENCY_ALPHA) * state['latency'] + self.LATENCY_ALPHA * latency
+                state['delay'] = min(self.max_delay, max(self.min_delay, self.latency_factor * state['latency'], self.DECREASE * state['delay']))
+                return
+            if status is not None and status not in self.RETRY_STATUSES: return
+            if status in self.THROTTLE_STATUSES:
+                self.throttled += 1
+                state['delay'] = min(self.max_delay, max(self.min_delay, 2 * state['delay']))
+            else:
+                self.failures += 1
+            wait = retry_after if retry_after is not None else self.backoff(state['failures'])
+            state['failures'] += 1
+            state['blocked_until'] = max(state['blocked_until'], now + min(self.max_delay, wait))
+            self.logger.warning(f'{host} respondió {status}, delay {state["delay"]:.1f} secs, bloqueado {wait:.0f} secs')
+
+    def should_retry(self, response, attempt: int) -> bool:
+        """ Whether the request of the given attempt, starting at 0, is retried """
+        if attempt >= self.max_retries: return False
+        return response is None or response.status_code in self.RETRY_STATUSES
+
+    @staticmethod
+    def retry_after(response) -> float:
+        """ Seconds of the Retry-After header of the response, in seconds or as an http date, None if missing or invalid """
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value: return None
+        value = value.strip()
+        if value.isdigit(): return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def load(self):
+        if self.state_path is None or not self.state_path.exists(): return
+        try:
+            with open(self.state_path, 'r') as f:
+                for host, state in json.load(f).items():
+                    self._host(host).update({key: state[key] for key in ('delay', 'latency', 'blocked_until') if key in state})
+            self.logger.info(f'Loaded the delays of {len(self.hosts)} hosts from {self.state_path}')
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Invalid scheduler state {self.state_path}: {e}')
+
+    def save(self):
+        """ Saves the learned delays, the pending Retry-After blocks are kept too """
+        if self.state_path is None: return
+        with self.lock:
+            state = {host: {key: value[key] for key in ('delay', 'latency', 'blocked_until')} for host, value in self.hosts.items()}
+        os.makedirs(self.state_path.parent, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'requests': self.requests_count, 'throttled': self.throttled, 'failures': self.failures,
+                'delays': {host: round(state['delay'], 1) for host, state in self.hosts.items()}}
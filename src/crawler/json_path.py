@@ -0,0 +1,69 @@
+import re
+import json
+import logging
+
+class JsonPath:
+
+    STATE_RX = re.compile(r'window\.__INITIAL_PROPS__ = JSON\.parse\(("(?:[^"\\]|\\.)*")\)')
+    # bytes versions of the state regexes, to search raw pages and memory maps
+    BYTES_RX = dict()
+
+    def __init__(self, path: str, state_rx: re.Pattern = None, fallback: re.Pattern = None):
+        '''
+        Field spec that reads a value from the state JSON embedded in the page
+
+        The state is located and parsed once per page, then every field is read by its path
+        instead of running a regex over the whole page. The path is a dot separated list of
+        keys, integer keys index lists. When the value is not found the fallback regex is used.
+
+        Parameters
+        ----------
+        path : str
+            dot separated path of the value in the state, e.g. realEstate.detail.es-ES
+        state_rx : Pattern
+            regex whose first group is the JS string literal with the state JSON
+        fallback : Pattern
+            regex of the same field, used when the page has no state or the path is missing
+        '''
+        self.path = path
+        self.keys = [int(key) if key.isdigit() else key for key in path.split('.')]
+        self.state_rx = state_rx if state_rx is not None else JsonPath.STATE_RX
+        self.fallback = fallback
+
+    @staticmethod
+    def load_state(content, state_rx: re.Pattern = None):
+        """
+        Locates and parses the state JSON of a page, the content must not be cleaned
+        as the JS string escapes are needed to decode it. The content can be the raw
+        bytes of the page or a memory map, only the state is decoded then.
+
+        Returns:
+            The parsed state, None if the page has no state.
+        """
+        state_rx = state_rx if state_rx is not None else JsonPath.STATE_RX
+        if not isinstance(content, str):
+            if state_rx not in JsonPath.BYTES_RX:
+                JsonPath.BYTES_RX[state_rx] = re.compile(state_rx.pattern.encode('utf-8'), state_rx.flags & ~re.UNICODE)
+            state_rx = JsonPath.BYTES_RX[state_rx]
+        match = state_rx.search(content)
+        if match is None: return None
+        try:
+            # the state is a JSON document inside a JS string literal
+            group = match.group(1)
+            return json.loads(json.loads(group if isinstance(group, str) else group.decode('utf-8')))
+        except ValueError as e:
+            logging.getLogger(JsonPath.__name__).warning(f'Invalid page state: {e}')
+            return None
+
+    def find(self, state):
+        """ Returns the value at the path of the state, None if any key is missing """
+        value = state
+        for key in self.keys:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    def __repr__(self):
+        return f'JsonPath({self.path})'
@@ -0,0 +1,323 @@
+import os
+import json
+import gzip
+import time
+import heapq
+import mmap
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from collections import OrderedDict
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class PageCache:
+
+    INDEX_FILE = 'page_cache_index.json'
+    PAGES_DIR = 'pages'
+
+    def __init__(self, cache_dir: Path, expires: int = 3600, max_bytes: int = None, compression: str = 'gzip', revalidate_expires: int = 7 * 24 * 3600, index_flush_seconds: float = 5):
+        '''
+        Compressed, content-addressed cache of downloaded pages
+
+        Bodies are stored compressed and named by the sha256 of their content, so identical
+        pages are stored once. A single index maps each url to its body hash, fetch time,
+        size and validators, freshness is checked against the index instead of the files.
+        The index file is written at most once every index_flush_seconds while pages are
+        stored, and on evict and flush.
+
+        Parameters
+        ----------
+        cache_dir : Path
+            directory of the cache, the bodies are stored in its pages subdirectory
+        expires : int
+            seconds a cached page is considered fresh
+        max_bytes : int
+            maximum bytes of compressed bodies on disk, the least recently used are evicted
+        compression : str
+            zstd, gzip or none, gzip is used when the zstandard package is not installed,
+            the uncompressed bodies can be memory mapped by read_buffer
+        revalidate_expires : int
+            seconds an expired page with ETag or Last-Modified is kept to be revalidated
+            with a conditional request instead of downloaded again
+        index_flush_seconds : float
+            minimum seconds between two writes of the index file by put and refresh, the pages
+            stored after the last write are lost from the index if the process dies
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.cache_dir = Path(cache_dir)
+        self.pages_dir = self.cache_dir / PageCache.PAGES_DIR
+        self.index_path = self.cache_dir / PageCache.INDEX_FILE
+        self.expires = expires
+        self.max_bytes = max_bytes
+        self.revalidate_expires = max(revalidate_expires, expires)
+        if compression == 'zstd' and zstandard is None:
+            self.logger.warning('zstandard is not installed, using gzip')
+            compression = 'gzip'
+        self.compression = compression
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.index_flush_seconds = index_flush_seconds
+        self.index_dirty = False
+        self.index_saved_at = None
+
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.index = dict()
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        self.body_sizes = dict()
+        self.body_refs = dict()
+        # urls ordered by last access and heap of (expiry time, url) so that eviction never scans the whole index
+        self.lru = OrderedDict()
+        self.expiry_heap = list()
+        self.timer = None
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]['accessed_at']):
+            self.body_sizes[entry['hash']] = entry['stored_size']
+            self.body_refs[entry['hash']] = self.body_refs.get(entry['hash'], 0) + 1
+            self.lru[url] = None
+            self.expiry_heap.append((self._expires_at(entry), url))
+        heapq.heapify(self.expiry_heap)
+        self.total = sum(self.body_sizes.values())
+
+    def _expires_at(self, entry) -> float:
+        # pages with validators are kept after expiring, a conditional request can refresh them
+        has_validators = entry.get('etag') or entry.get('last_modified')
+        return entry['fetched_at'] + (self.revalidate_expires if has_validators else self.expires)
+
+    def _body_path(self, body_hash, compression=None) -> Path:
+        return self.pages_dir / f'{body_hash}.{compression or self.compression}'
+
+    def _compress(self, body: bytes) -> bytes:
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().compress(body)
+        if self.compression == 'none':
+            return body
+        return gzip.compress(body, compresslevel=6)
+
+    def _decompress(self, data: bytes, compression) -> bytes:
+        if compression == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(data)
+        if compression == 'none':
+            return data
+        return gzip.decompress(data)
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.index_dirty = False
+        self.index_saved_at = time.monotonic()
+
+    def _index_changed(self):
+        # the whole index is written, so it is written at most once per index_flush_seconds
+        self.index_dirty = True
+        if self.index_saved_at is None or time.monotonic() - self.index_saved_at >= self.index_flush_seconds:
+            self._save_index()
+
+    def _release_body(self, body_hash, compression):
+        self.body_refs[body_hash] -= 1
+        if self.body_refs[body_hash] > 0: return
+        del self.body_refs[body_hash]
+        self.total -= self.body_sizes.pop(body_hash)
+        path = self._body_path(body_hash, compression)
+        if path.exists(): os.remove(path)
+
+    def _remove(self, url):
+        entry = self.index.pop(url)
+        self.lru.pop(url, None)
+        self._release_body(entry['hash'], entry['compression'])
+
+    def _evict_lru(self) -> int:
+        evicted = 0
+        while self.max_bytes and self.total > self.max_bytes and self.lru:
+            self._remove(next(iter(self.lru)))
+            evicted += 1
+        return evicted
+
+    def _evict_expired(self, max_entries=None) -> int:
+        now = time.time()
+        evicted = 0
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            if max_entries is not None and evicted >= max_entries: break
+            expires_at, url = heapq.heappop(self.expiry_heap)
+            entry = self.index.get(url)
+            # the heap keeps the old expiry of the urls stored again, those are skipped
+            if entry is None or self._expires_at(entry) != expires_at: continue
+            self._remove(url)
+            evicted += 1
+        return evicted
+
+    def evict(self, max_entries: int = None) -> int:
+        """
+        Removes the expired pages and then the least recently used ones above max_bytes.
+        Only the expired head of the expiry heap is visited, not the whole cache.
+
+        Args:
+            max_entries (int): maximum number of expired pages removed in this call, None for all.
+
+        Returns:
+            int: The number of removed pages.
+        """
+        with self.lock:
+            evicted = self._evict_expired(max_entries) + self._evict_lru()
+            if evicted > 0 or self.index_dirty:
+                self._save_index()
+            if evicted > 0:
+                self.logger.info(f'Evicted {evicted} pages from the cache, {self.total} bytes in use')
+            return evicted
+
+    def start_eviction_timer(self, interval: int):
+        """ Runs evict every interval seconds in a background thread until stop_eviction_timer is called """
+        def run():
+            self.evict()
+            self.start_eviction_timer(interval)
+        self.timer = threading.Timer(interval, run)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def stop_eviction_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def total_bytes(self) -> int:
+        return self.total
+
+    def get_entry(self, url) -> dict:
+        return self.index.get(url)
+
+    def is_fresh(self, entry) -> bool:
+        return entry is not None and time.time() - entry['fetched_at'] < self.expires
+
+    def validators(self, url) -> dict:
+        """ Conditional request headers for the cached page of the url, empty if it has no validators """
+        entry = self.index.get(url)
+        headers = dict()
+        if entry is None: return headers
+        if entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def refresh(self, url, etag: str = None, last_modified: str = None) -> dict:
+        """
+        Marks the cached page of the url as fetched now, after a 304 Not Modified response.
+
+        Returns:
+            dict: The index entry of the url, None if it is not cached.
+        """
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is None: return None
+            now = time.time()
+            entry['fetched_at'] = now
+            entry['accessed_at'] = now
+            if etag: entry['etag'] = etag
+            if last_modified: entry['last_modified'] = last_modified
+            self.lru.move_to_end(url)
+            heapq.heappush(self.expiry_heap, (self._expires_at(entry), url))
+            self.revalidated += 1
+            self._index_changed()
+        return entry
+
+    def _open(self, url, body_hash=None):
+        """ Opens the body of the url under the lock, once open it can be read even if a put or evict removes the file """
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is None or (body_hash is not None and entry['hash'] != body_hash): return None, None
+            try:
+                f = open(self._body_path(entry['hash'], entry['compression']), 'rb')
+            except FileNotFoundError:
+                self._remove(url)
+                return None, None
+            entry['accessed_at'] = time.time()
+            self.lru.move_to_end(url)
+            return entry, f
+
+    def read(self, url) -> bytes:
+        """ Returns the cached body of the url whatever its age, None if it is not cached """
+        entry, f = self._open(url)
+        if entry is None: return None
+        with f:
+            return self._decompress(f.read(), entry['compression'])
+
+    def read_buffer(self, url, body_hash: str = None):
+        """
+        Returns the cached body of the url without copying it when possible: a read-only
+        memory map of the file for the uncompressed entries, the decompressed bytes otherwise.
+
+        Args:
+            body_hash (str): hash of the expected body, None for the cached one whatever it is.
+
+        Returns:
+            mmap | bytes: The body, None if it is not cached or its hash is not body_hash.
+        """
+        entry, f = self._open(url, body_hash)
+        if entry is None: return None
+        with f:
+            if entry['compression'] != 'none':
+                return self._decompress(f.read(), entry['compression'])
+            if entry['size'] == 0: return b''
+            # the map stays valid after closing the file, and after the file is evicted
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, url) -> bytes:
+        """ Returns the cached body of the url if it is fresh, None otherwise """
+        if not self.is_fresh(self.index.get(url)):
+            self.misses += 1
+            return None
+        body = self.read(url)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def put(self, url, body: bytes, etag: str = None, last_modified: str = None) -> dict:
+        """
+        Stores the body of the url, a body already cached for another url is not stored again.
+
+        Returns:
+            dict: The index entry of the url, its changed key tells whether the body differs from the previous one.
+        """
+        body_hash = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self.lock:
+            previous = self.index.get(url)
+            if body_hash not in self.body_sizes:
+                data = self._compress(body)
+                with open(self._body_path(body_hash), 'wb') as f:
+                    f.write(data)
+                self.body_sizes[body_hash] = len(data)
+                self.total += len(data)
+            self.body_refs[body_hash] = self.body_refs.get(body_hash, 0) + 1
+            # the previous body is released after referencing the new one, an unchanged body is not written again
+            if previous is not None:
+                self._remove(url)
+            entry = {'hash': body_hash, 'fetched_at': now, 'accessed_at': now, 'size': len(body),
+                'stored_size': self.body_sizes[body_hash], 'etag': etag, 'last_modified': last_modified,
+                'compression': self.compression, 'changed': previous is None or previous['hash'] != body_hash}
+            self.index[url] = entry
+            self.lru[url] = None
+            heapq.heappush(self.expiry_heap, (self._expires_at(entry), url))
+            self._evict_lru()
+            self._index_changed()
+        self.logger.debug(f'Response Saved to {self._body_path(body_hash)}')
+        return entry
+
+    def flush(self):
+        """ Writes the index if pages were stored since its last write """
+        with self.lock:
+            if self.index_dirty: self._save_index()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'entries': len(self.index), 'bodies': len(self.body_sizes), 'bytes': self.total_bytes(), 'hits': self.hits, 'misses': self.misses, 'revalidated': self.revalidated}
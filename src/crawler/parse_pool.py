@@ -0,0 +1,91 @@
+import os
+import sys
+import queue
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+sys.path.append('src/crawler')
+from scraper import Scraper
+
+# scraper of each worker process, built once by the initializer with the compiled specs
+_worker_scraper = None
+
+def _init_worker(spec_rows: list, provider: str):
+    global _worker_scraper
+    from crawler import Crawler
+    url, list_items, list_next, list_fields, detail_fields, list_fields_lambda, detail_fields_lambda = Crawler.compile_provider_specs(pd.DataFrame(spec_rows), provider)
+    _worker_scraper = Scraper(url, None, list_items, list_fields, list_next, detail_fields, list_fields_lambda, detail_fields_lambda, cache_dir=None, cache_expires=0, delay_seconds=0)
+
+def _parse_page(page: tuple):
+    kind, url, body = page
+    scraper = _worker_scraper
+    if url is not None: scraper.set_url(url)
+    content = scraper.get_page_content(body.decode('utf-8') if isinstance(body, bytes) else body)
+    if kind == 'list':
+        return scraper.parse_list(content, scraper.list_items_rx, scraper.list_items_fields, scraper.list_fields_lambda, scraper.detail_fields_lambda)
+    return scraper.parse_item(content, scraper.detail_fields, scraper.detail_fields_lambda)
+
+class ParsePool:
+
+    def __init__(self, web_specs: pd.DataFrame, provider: str, max_workers: int = None):
+        '''
+        Pool of processes that parse the fetched pages of a provider
+
+        Parsing is CPU-bound, the pages are parsed by worker processes while the caller keeps
+        fetching. The spec rows of the provider are sent to each worker once and compiled by
+        its initializer, as the lambdas can not be pickled. Results are returned in page order.
+
+        Parameters
+        ----------
+        web_specs : DataFrame
+            provider specs, as read from webs_specs.csv
+        provider : str
+            provider of the pages
+        max_workers : int
+            number of worker processes, defaults to the number of cores
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.provider = provider
+        spec_rows = web_specs[web_specs['provider'] == provider].to_dict('records')
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # the crawler runs threads, forking them could deadlock the workers
+        self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(spec_rows, provider))
+        self.max_in_flight = 2 * self.max_workers
+
+    def parse(self, pages):
+        """
+        Parses the pages, at most 2 pages per worker are in flight while the next ones are consumed.
+
+        Args:
+            pages (iterable): (kind, url, body) tuples, kind is list or item and body the raw page.
+
+        Yields:
+            The items of each list page or the fields of each item page, None for the pages
+            that failed, in the same order as the pages.
+        """
+        in_flight = deque()
+        for page in pages:
+            in_flight.append(self.executor.submit(_parse_page, page))
+            if len(in_flight) >= self.max_in_flight:
+                yield self._result(in_flight.popleft())
+        while in_flight:
+            yield self._result(in_flight.popleft())
+
+    def parse_queue(self, pages_queue: queue.Queue):
+        """ Parses the pages put in the queue by the fetching thread until it puts None """
+        return self.parse(iter(pages_queue.get, None))
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            self.logger.error(f'Error parsing a page of {self.provider}: {e}')
+            return None
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,173 @@
+import os
+import hashlib
+import threading
+import logging
+from pathlib import Path
+import pandas as pd
+
+class RealtyStore:
+
+    def __init__(self, datafile_path: Path, index_path: Path = None, compact_every: int = 0):
+        '''
+        Append-only CSV store of realties with a persistent index of link hashes
+
+        New pages are appended to the datafile and duplicates are detected against the
+        in-memory set of link hashes, so storing a page costs the same whatever the size
+        of the database. The updates of stored realties are appended as new versions of
+        their rows, with only the updated values, and the readers and the compaction merge
+        the versions of each link keeping its last non empty values. The hashes, marked when
+        the realty is enriched, are appended to the index file next to the datafile, the
+        index is rebuilt from the datafile when missing or older than it.
+
+        Parameters
+        ----------
+        datafile_path : Path
+            path of the CSV file with the realties
+        index_path : Path
+            path of the link index, defaults to the datafile path with .idx suffix
+        compact_every : int
+            number of stored pages between compactions, 0 disables periodic compaction
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.datafile_path = Path(datafile_path)
+        self.index_path = Path(index_path) if index_path else self.datafile_path.with_name(self.datafile_path.name + '.idx')
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.stored_pages = 0
+        self.hashes = set()
+        # hashes of the links enriched with the fields of their detail page
+        self.enriched = set()
+        self.columns = None
+        self._load_index()
+
+    @staticmethod
+    def hash_link(link) -> str:
+        return hashlib.md5(str(link).encode()).hexdigest()
+
+    @staticmethod
+    def latest_versions(df: pd.DataFrame) -> pd.DataFrame:
+        """ One row per link with the last non empty value of each column, in the order the links were first stored """
+        return df.groupby('link', sort=False).last().reset_index()
+
+    def _load_index(self):
+        if not self.datafile_path.exists():
+            self.hashes, self.enriched = set(), set()
+            self.columns = None
+            return
+
+        self.columns = pd.read_csv(self.datafile_path, nrows=0).columns.tolist()
+        if self.index_path.exists() and os.path.getmtime(self.index_path) >= os.path.getmtime(self.datafile_path):
+            self.hashes, self.enriched = set(), set()
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    entry = line.split()
+                    if not entry: continue
+                    self.hashes.add(entry[0])
+                    if len(entry) > 1: self.enriched.add(entry[0])
+        else:
+            self.logger.info(f'Building link index of {self.datafile_path}')
+            self._write_index(pd.read_csv(self.datafile_path, usecols=[column for column in ('link', 'enriched_at') if column in self.columns]))
+        self.logger.debug(f'{len(self.hashes)} links indexed')
+
+    @staticmethod
+    def _index_entries(df: pd.DataFrame) -> list:
+        """ Index lines of the rows, the hash of the link followed by an e when the row is enriched """
+        enriched = df['enriched_at'].notna() if 'enriched_at' in df else pd.Series(False, index=df.index)
+        return [f'{RealtyStore.hash_link(link)} e' if is_enriched else RealtyStore.hash_link(link) for link, is_enriched in zip(df['link'], enriched)]
+
+    def _write_index(self, df: pd.DataFrame):
+        entries = RealtyStore._index_entries(df)
+        self.hashes = set(entry.split()[0] for entry in entries)
+        self.enriched = set(entry.split()[0] for entry in entries if entry.endswith(' e'))
+        with open(self.index_path, 'w') as f:
+            f.write('\n'.join(entries) + '\n' if entries else '')
+
+    def _append(self, df: pd.DataFrame):
+        """ Appends the rows to the datafile and their entries to the index """
+        if self.columns is not None and not set(df.columns).issubset(self.columns):
+            # the CSV header can not grow by appending, rewrite it once with the new columns
+            self._rewrite(pd.concat([pd.read_csv(self.datafile_path), df], ignore_index=True))
+            return
+        df.reindex(columns=self.columns or df.columns.tolist()).to_csv(self.datafile_path, mode='a', header=self.columns is None, index=False)
+        self.columns = self.columns or df.columns.tolist()
+        entries = RealtyStore._index_entries(df)
+        with open(self.index_path, 'a') as f:
+            f.write('\n'.join(entries) + '\n')
+        self.hashes.update(entry.split()[0] for entry in entries)
+        self.enriched.update(entry.split()[0] for entry in entries if entry.endswith(' e'))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def contains(self, link) -> bool:
+        return RealtyStore.hash_link(link) in self.hashes
+
+    def store_page(self, page_df: pd.DataFrame):
+        """
+        Appends the realties of a page that are not stored yet.
+
+        Args:
+            page_df (DataFrame): The realties of the page, with a link column.
+
+        Returns:
+            tuple: The DataFrame of added realties and whether the page had stored realties.
+        """
+        with self.lock:
+            hashes = page_df['link'].map(RealtyStore.hash_link)
+            repetidos = hashes.isin(self.hashes)
+            # a link repeated inside the same page is stored once
+            new_df = page_df[~repetidos & ~hashes.duplicated()]
+
+            if not new_df.empty:
+                self._append(new_df)
+
+            self.stored_pages += 1
+            if self.compact_every and self.stored_pages % self.compact_every == 0:
+                self._compact()
+
+        return new_df, bool(repetidos.any())
+
+    def enriched_links(self, links) -> set:
+        """ Links of the realties already enriched with the fields of their detail page """
+        with self.lock:
+            return set(link for link in links if RealtyStore.hash_link(link) in self.enriched)
+
+    def upsert_realties(self, df: pd.DataFrame):
+        """
+        Appends the realties of df as the last version of their rows, the empty values do not
+        overwrite the stored ones when the versions are merged. The datafile is only rewritten
+        when df has new columns.
+
+        Args:
+            df (DataFrame): The realties, with a link column.
+        """
+        if df.empty: return
+        with self.lock:
+            self._append(df.drop_duplicates(subset='link', keep='last'))
+
+    def _rewrite(self, df: pd.DataFrame):
+        tmp_path = self.datafile_path.with_name(self.datafile_path.name + '.tmp')
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.datafile_path)
+        self.columns = df.columns.tolist()
+        self._write_index(df)
+
+    def _compact(self):
+        if not self.datafile_path.exists(): return
+        df = pd.read_csv(self.datafile_path)
+        size = len(df)
+        df = RealtyStore.latest_versions(df)
+        self._rewrite(df)
+        self.logger.info(f'Compacted {self.datafile_path}: {size} -> {len(df)} rows')
+
+    def compact(self):
+        """ Rewrites the datafile with one row per link, merging the versions of each realty """
+        with self.lock:
+            self._compact()
+
+    def read_all(self) -> pd.DataFrame:
+        """ The realties with the versions of each link merged """
+        with self.lock:
+            return RealtyStore.latest_versions(pd.read_csv(self.datafile_path)) if self.datafile_path.exists() else None
@@ -5,27 +5,38 @@ import time
 import random
 import re
 import html
-import datetime
+import json
 import pandas as pd
-import os
 import warnings
 import logging
 import logging.config
-import hashlib
 from fake_useragent import UserAgent
-# from selenium import webdriver
-from seleniumwire2 import webdriver
 sys.path.append('src')
 from telegram_handler import TelegramHandler
+sys.path.append('src/crawler')
+from fetcher import AsyncFetcher
+from session_pool import SessionPool
+from realty_store import RealtyStore
+from page_cache import PageCache
+from browser_pool import BrowserPool
+from json_path import JsonPath
+from extraction_plan import ExtractionPlan
+from host_scheduler import HostScheduler
 
 class Scraper:
 
     CLEAN_RX = re.compile(r'\n|\r|\\(?!u)')
+    CHUNK_SIZE = 64 * 1024
+    # the abort patterns are searched in the first bytes of the page, where the block pages differ
+    ABORT_SCAN_BYTES = 256 * 1024
 
     def __init__(self, url=None, datafile_path: Path=None, list_items: dict=None,
         list_items_fields: dict=None, list_next: dict=None, detail_fields:dict=None,
         list_fields_lambda:dict=None, detail_fields_lambda:dict=None, 
-        cache_dir: Path = None, cache_expires: int = 3600, delay_seconds: int = 30):
+        cache_dir: Path = None, cache_expires: int = 3600, delay_seconds: int = 30, fetcher: AsyncFetcher = None,
+        session_pool: SessionPool = None, store: RealtyStore = None, page_cache: PageCache = None,
+        browser_pool: BrowserPool = None, page_ready: dict = None, block_rules: list = None, zero_copy: bool = False,
+        abort: dict = None, max_bytes: int = None, scheduler: HostScheduler = None, plans: dict = None):
         '''
         Class for scraping a website and obtaining a database
 
@@ -45,6 +56,31 @@ class Scraper:
             dictionary of regular expressions to obtain the fields of each item of the detail view
         list_fields_lambda : dict
             dictionary of lambda functions to obtain the fields of each item of the detail view
+        fetcher : AsyncFetcher
+            shared fetch engine with per host rate limiting, used instead of the fixed delay
+        session_pool : SessionPool
+            keep-alive sessions shared between requests, a private pool is created if not provided
+        store : RealtyStore
+            RealtyStore or SqliteStore shared between scrapers, if not provided a RealtyStore is opened on datafile_path
+        page_cache : PageCache
+            cache shared between scrapers, if not provided one is opened on cache_dir
+        browser_pool : BrowserPool
+            long-lived browsers for the chrome and firefox drivers, if not provided each page uses a new browser
+        page_ready : dict
+            regular expression that matches the page source once a browser has loaded the content
+        block_rules : list
+            (scope, regex) tuples of the browser requests to abort, scope is resource for the resource type or url
+        zero_copy : bool
+            the cached pages are parsed from a memory map of the cache file with bytes regexes
+            instead of decoded and cleaned, falls back to the decoded page if a regex can not be translated
+        abort : dict
+            regular expressions of the block or captcha pages, the download stops when one matches the first bytes
+        max_bytes : int
+            maximum bytes of a page, larger downloads are stopped and not cached
+        scheduler : HostScheduler
+            adaptive per host delays with retries, used instead of the fixed delay_seconds when provided
+        plans : dict
+            extraction plans shared by the scrapers of the same provider specs, a private cache is used if not provided
         '''
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info('Init')
@@ -58,14 +94,33 @@ class Scraper:
         self.list_fields_lambda = list_fields_lambda
         self.detail_fields_lambda = detail_fields_lambda
 
-        self.last_scaped_df = None
-        self.main_data_df = None
-        if self.datafile_path and self.datafile_path.exists():
-            self.main_data_df = pd.read_csv(self.datafile_path)
+        json_specs = [spec for specs in (list_items, list_items_fields, list_next, detail_fields) if specs for spec in specs.values() if isinstance(spec, JsonPath)]
+        self.state_rx = json_specs[0].state_rx if json_specs else None
+        self.page_state = None
+        self.plans = plans if plans is not None else dict()
+        self.zero_copy = zero_copy
+
+        self.scraped_pages = list()
+        self.store = store if store is not None else (RealtyStore(self.datafile_path) if self.datafile_path else None)
 
         self.cache_dir = cache_dir
         self.cache_expires = cache_expires
+        self.page_cache = page_cache if page_cache is not None else (PageCache(cache_dir, cache_expires) if cache_dir else None)
         self.delay_seconds = delay_seconds
+        self.fetcher = fetcher
+        self.session_pool = session_pool if session_pool is not None else SessionPool()
+        # without a shared pool the browser is quit after each page, as it was not reused
+        self.browser_pool = browser_pool if browser_pool is not None else BrowserPool(pool_size=1, max_pages=1)
+        self.page_ready_rx = next(iter(page_ready.values()), None) if page_ready else None
+        self.block_rules = block_rules or []
+        self.blocked_requests = 0
+        # the downloads are read as bytes, the abort patterns are compiled for them
+        self.abort_rx = {name: re.compile(rx.pattern.encode('utf-8'), rx.flags & ~re.UNICODE) for name, rx in abort.items() if rx is not None} if abort else dict()
+        self.max_bytes = max_bytes
+        self.aborted_downloads = 0
+        self.scheduler = scheduler
+        # called with the url right before each request, after the delay of the host
+        self.before_fetch = None
 
     def init_headers(self, url):
         self.set_url(url)
@@ -131,25 +186,30 @@ class Scraper:
             Exception: If there is an error during parsing.
         """
         try:
-            regex = fields_rx[field_name]
-            if regex is None: return None
-            ret = regex.findall(html)
-            ret = ret[0] if len(ret) == 1 else ret
-            ret = None if len(ret) == 0 else ret
-            if 'sub' in field_name and not ret is None:
-                ret = fields_rx[field_name.replace('sub', 'elem')].findall(ret)
-            if field_lambdas is not None and field_name in field_lambdas and ret is not None:
-                ret = field_lambdas[field_name](ret)
-
-
-            self.logger.debug(f'parse_field {field_name}: {ret}')
-            return ret
+            ret = self.get_plan(fields_rx, html).extract_field(field_name, html, state=self.page_state)
+            return self._apply_lambda(field_name, ret, field_lambdas)
         except Exception as e:
             self.logger.error(e, exc_info=True)
-            self.logger.error(field_name, regex)
+            self.logger.error(f'{field_name}: {fields_rx[field_name]}')
             return None
 
-    def parse_item(self, html, fields_rx, field_lambdas=None) -> dict:
+    def _apply_lambda(self, field_name, ret, field_lambdas):
+        if field_lambdas is not None and field_name in field_lambdas and ret is not None:
+            ret = field_lambdas[field_name](ret)
+        self.logger.debug('parse_field %s: %s', field_name, ret)
+        return ret
+
+    def get_plan(self, fields_rx, html=None) -> ExtractionPlan:
+        """ Extraction plan of the field specs, built once per dict of specs and type of page, str or raw bytes """
+        binary = html is not None and not isinstance(html, (str, dict, list))
+        plan = self.plans.get((id(fields_rx), binary))
+        # the plan keeps a reference to its specs, so the id is not reused while cached
+        if plan is None or plan.fields_rx is not fields_rx:
+            plan = ExtractionPlan(fields_rx, binary)
+            self.plans[(id(fields_rx), binary)] = plan
+        return plan
+
+    def parse_item(self, html, fields_rx, field_lambdas=None, pos: int = 0, endpos: int = None) -> dict:
         """
         Parses a post from the provided HTML content using regular expressions.
 
@@ -157,6 +217,8 @@ class Scraper:
             html (str): The HTML content to parse.
             fields_rx (dict): A dictionary containing regular expressions for each field.
             field_lambdas (dict): A dictionary containing lambda functions for each field.
+            pos (int): Offset of the html where the post starts.
+            endpos (int): Offset of the html where the post ends, None for the end of the html.
         Returns:
             dict: A dictionary containing the extracted fields and their values. The dictionary
 
@@ -168,13 +230,36 @@ class Scraper:
             return None
             
         dict_item = dict()
+        plan = self.get_plan(fields_rx, html)
+
+        for field, (out_name, spec, elem) in plan.rules.items():
+            try:
+                ret = plan.extract_field(field, html, pos, endpos, self.page_state)
+                dict_item[out_name] = self._apply_lambda(field, ret, field_lambdas)
+            except Exception as e:
+                self.logger.error(e, exc_info=True)
+                self.logger.error(f'{field}: {spec}')
+                dict_item[out_name] = None
+
+        self.logger.debug('parse_item: %s', dict_item)
+        return dict_item
 
-        for field, rx in fields_rx.items():
-            if '_elem' not in field:
-                dict_item[field.replace('_sub', '')] = self.parse_field(html, field, fields_rx, field_lambdas)
+    def get_list_elements(self, html, list_items_rx) -> list:
+        """
+        Locates the items of the list view.
 
-        self.logger.debug(f'parse_item: {dict_item}')
-        return dict_item
+        Returns:
+            list: The dicts of the items when read from the page state, otherwise the
+            (start, end) offsets of each item in the html. None if no item is found.
+        """
+        spec = next(iter(list_items_rx.values()))
+        if isinstance(spec, JsonPath):
+            elements = spec.find(self.page_state) if self.page_state is not None else None
+            if elements is not None: return elements
+            spec = spec.fallback
+        if spec is None: return None
+        spans = self.get_plan(list_items_rx, html).spans(spec, html)
+        return spans if spans else None
 
     def parse_list(self, html, list_items_rx, fields_rx, list_fields_lambda=None, detail_fields_lambda=None):
         """
@@ -195,58 +280,85 @@ class Scraper:
             self.logger.warning('No field specs')
             return []
 
-        elements_html = self.parse_item(html, list_items_rx, list_fields_lambda)
-        elements_html = elements_html[next(iter(list_items_rx.keys()))]
+        elements = self.get_list_elements(html, list_items_rx)
         list_columns = [f.replace('_sub', '') for f in fields_rx.keys() if 'elem' not in f]
 
         self.logger.debug(f'Campos a extraer: {list_columns}')
 
-        if elements_html is None:
+        if elements is None:
             self.logger.error(f'None elements found in {self.url}')
             return None
 
         item_list = list()
-        for elem_html in elements_html:
-            item_list += [self.parse_item(elem_html, fields_rx, detail_fields_lambda)]
+        for element in elements:
+            if isinstance(element, tuple):
+                # the fields are searched between the offsets of the item, it is not copied
+                item_list += [self.parse_item(html, fields_rx, detail_fields_lambda, *element)]
+            else:
+                item_list += [self.parse_item(element, fields_rx, detail_fields_lambda)]
 
         self.logger.info(f'Elementos extraidos de la lista: {len(item_list)} elementos')
         return item_list
 
-    def _get_cache_filepath(self):
-        hash_url = hashlib.md5(self.url.encode()).hexdigest()
-        return Path(os.path.join(self.cache_dir, f'{self.base_host}_{hash_url}.html'))
-
     def _get_cached_response(self):
 
-        if self.cache_dir is None: return None
+        if self.page_cache is None: return None
 
-        ts = int(datetime.datetime.now().timestamp())
-        cache_file = self._get_cache_filepath()
+        entry = self.page_cache.get_entry(self.url)
+        content = self.page_cache.get(self.url)
+        if content is None: return None
 
-        if  (not Path(cache_file).exists()) or (not (ts - os.path.getmtime(cache_file)) < self.cache_expires):
-            return None
-
-        with open(cache_file, 'rb') as f:
-            response = requests.Response()
-            response._content = f.read()
-            response.status_code = 304
-            self.logger.info(f'Obtendiendo desde el cache: {cache_file}')
-            return response
+        response = requests.Response()
+        response._content = content
+        response.status_code = 304
+        response.cache_hash = entry['hash'] if entry is not None else None
+        self.logger.info(f'Obtendiendo desde el cache: {self.url}')
+        return response
 
     def _set_cached_response(self, response):
-        if (self.cache_dir is None) or (response is None):
+        if (self.page_cache is None) or (response is None):
             return response
 
-        cache_file = self._get_cache_filepath()
-        if cache_file.exists(): return response
-        with open(cache_file, 'wb') as f:
-            f.write(response.content)
-        self.logger.debug(f'Response Saved to {cache_file}')
+        if response.status_code == 304:
+            # not modified, the cached body is refreshed instead of downloaded again
+            content = self.page_cache.read(self.url)
+            if content is None:
+                # evicted after the conditional request was sent, the caller downloads it again
+                return None
+            entry = self.page_cache.refresh(self.url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            response._content = content
+            response.cache_hash = entry['hash'] if entry is not None else None
+            response.unchanged = True
+            self.logger.info(f'Página no modificada: {self.url}')
+            return response
 
+        entry = self.page_cache.put(self.url, response.content, etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+        response.cache_hash = entry['hash']
+        response.unchanged = not entry['changed']
         return response
 
+    def _get_conditional_headers(self):
+        """ Request headers with the validators of the expired cached page, if any """
+        if self.page_cache is None: return self.headers
+        validators = self.page_cache.validators(self.url)
+        return {**self.headers, **validators} if validators else self.headers
+
+    def is_blocked(self, request) -> bool:
+        """ Whether a request of the browser matches a block rule of the provider by resource type or url """
+        if not self.block_rules: return False
+        resource_type = BrowserPool.resource_type(request)
+        for scope, block_rx in self.block_rules:
+            if block_rx.search(resource_type if scope == 'resource' else request.url):
+                return True
+        return False
+
     def selenium_interceptor(self, request):
 
+        if self.is_blocked(request):
+            self.blocked_requests += 1
+            request.abort()
+            return
+
         del request.headers['sec-ch-ua']
         del request.headers['sec-ch-ua-mobile']
         del request.headers['sec-ch-ua-platform']
@@ -256,54 +368,109 @@ class Scraper:
 
         self.logger.info('Slenium Headers: %s', request.headers)
 
-    def _get_selenium_chrome(self):
-        self.logger.info(f'Obterniendo con Chrome: {self.url}')
-        options = webdriver.ChromeOptions()
-        # options.add_argument("-headless")
-        driver = webdriver.Chrome(options=options)
+    def _get_selenium_response(self, browser):
+        self.blocked_requests = 0
         try:
-            driver.request_interceptor = self.selenium_interceptor
-            driver.get(self.url)
-            time.sleep(4) # Allow page to fully load
-            html_content = driver.page_source.encode('utf-8')
-            response = requests.Response()
-            response.status_code = 200
-            response._content = html_content
-            return response
+            page_source = self.browser_pool.get(self.url, browser, self.selenium_interceptor, self.page_ready_rx)
         except Exception as e:
             self.logger.error(e)
             self.logger.exception(e)
+            return None
+        page_stats = self.browser_pool.last_page_stats()
+        if page_stats is not None:
+            self.logger.info(f"Página cargada con {page_stats['requests']} peticiones ({self.blocked_requests} bloqueadas) y {page_stats['bytes']} bytes: {self.url}")
+        response = requests.Response()
+        response.status_code = 200
+        response._content = page_source.encode('utf-8')
+        return response
 
-        finally:
-            if driver is not None:
-                driver.quit()
+    def _get_selenium_chrome(self):
+        self.logger.info(f'Obterniendo con Chrome: {self.url}')
+        return self._get_selenium_response('chrome')
 
     def _get_selenium_firefox(self):
-
         self.logger.info(f'Obterniendo con Firefox: {self.url}')
-        options = webdriver.FirefoxOptions()
-        options.add_argument("--headless")
-        geckodriver_path = "/snap/bin/geckodriver"
-        driver_service = webdriver.FirefoxService(executable_path=geckodriver_path)
-        driver = webdriver.Firefox(options=options, service=driver_service)
-        driver.request_interceptor = self.selenium_interceptor
-        driver.get(self.url)
-        time.sleep(4) # Allow page to fully load
-        response = requests.Response()
-        response.status_code = 200
-        response._content = driver.page_source.encode('utf-8')
-        return response
+        return self._get_selenium_response('firefox')
 
-    def _get_request_response(self):
+    def _get_request_response(self, headers=None):
 
         self.logger.info(f'Obterniendo con Request: {self.url}')
-        session = requests.Session()
-        session.headers.update(self.headers)
-        response = session.get(self.url, headers=self.headers)
+        response = self.session_pool.get(self.url, headers=headers or self.headers, stream=True)
 
         self.logger.debug(f'Response status: {response.status_code}')
         return response
 
+    def get_abort_reason(self, body) -> str:
+        """ Reason to discard the page, the name of the abort pattern found in its first bytes or max_bytes, None if it is valid """
+        if self.max_bytes and len(body) > self.max_bytes:
+            return f'más de {self.max_bytes} bytes'
+        for name, abort_rx in self.abort_rx.items():
+            if abort_rx.search(body, 0, Scraper.ABORT_SCAN_BYTES):
+                return name
+        return None
+
+    def _read_body(self, response) -> bool:
+        """
+        Reads the body of a streamed response in chunks, the download stops as soon as the page
+        exceeds max_bytes or its first bytes match an abort pattern.
+
+        Returns:
+            bool: Whether the body was read, False if the download was aborted.
+        """
+        if response._content is not False or response.status_code == 304:
+            # already read, the response was not streamed or has no body
+            body = response.content or b''
+            reason = self.get_abort_reason(body)
+            return reason is None or self._abort(reason, len(body))
+        body = bytearray()
+        try:
+            for chunk in response.iter_content(Scraper.CHUNK_SIZE):
+                body += chunk
+                # the abort patterns are only searched until the scanned bytes are read
+                if (self.max_bytes and len(body) > self.max_bytes) or len(body) - len(chunk) < Scraper.ABORT_SCAN_BYTES:
+                    reason = self.get_abort_reason(body)
+                    if reason is not None: return self._abort(reason, len(body))
+        finally:
+            response.close()
+        response._content = bytes(body)
+        return True
+
+    def _abort(self, reason, read_bytes) -> bool:
+        self.aborted_downloads += 1
+        self.logger.warning(f'Descarga abortada tras {read_bytes} bytes ({reason}): {self.url}')
+        return False
+
+    def _fetch(self, headers, driver):
+        """ Sends the request after the delay of the host, the scheduler learns from its status and latency """
+        if driver == 'default' and self.fetcher is not None:
+            # the fetcher paces the requests per host, no global delay needed
+            if self.before_fetch is not None: self.before_fetch(self.url)
+            return self.fetcher.get(self.url, headers, stream=True)
+
+        if self.scheduler is not None:
+            self.scheduler.wait(self.base_host)
+        else:
+            seconds = random.uniform(self.delay_seconds / 2, self.delay_seconds)
+            self.logger.info(f'Waiting {seconds:.0f} secs delay')
+            time.sleep(seconds)
+        if self.before_fetch is not None: self.before_fetch(self.url)
+
+        start = time.monotonic()
+        if driver == 'chrome':
+            response = self._get_selenium_chrome()
+        elif driver == 'firefox':
+            response = self._get_selenium_firefox()
+        else:
+            try:
+                response = self._get_request_response(headers)
+            except requests.RequestException as e:
+                if self.scheduler is None: raise
+                self.logger.error(f'Error al enviar la solicitud: {e}')
+                response = None
+        if self.scheduler is not None:
+            self.scheduler.record(self.base_host, response.status_code if response is not None else None, time.monotonic() - start, HostScheduler.retry_after(response))
+        return response
+
     def get_response(self, url = None, use_cache = True, driver = 'default'):
 
         if url is not None: self.init_headers(url)
@@ -312,32 +479,134 @@ class Scraper:
             response = self._get_cached_response() 
             if response is not None: 
                 return response
-
-        seconds = random.uniform(self.delay_seconds / 2, self.delay_seconds)
-        self.logger.info(f'Waiting {seconds:.0f} secs delay')
-        time.sleep(seconds)
-
-        if driver == 'chrome':
-            response = self._get_selenium_chrome()
-        elif driver == 'firefox': 
-            response = self._get_selenium_firefox()
-        else: 
-            response = self._get_request_response()
-
+        # the browsers can not send conditional requests, the full page is always downloaded
+        headers = self._get_conditional_headers() if use_cache and driver not in ('chrome', 'firefox') else self.headers
+
+        response = self._download(headers, driver)
+        if response is None or not use_cache: return response
+        cached_response = self._set_cached_response(response)
+        if cached_response is None and headers is not self.headers:
+            self.logger.warning(f'Página no modificada pero ya no está en el cache, se descarga de nuevo: {self.url}')
+            response = self._download(self.headers, driver)
+            cached_response = self._set_cached_response(response) if response is not None else None
+        return cached_response
+
+    def _download(self, headers, driver):
+        """ Fetches the page with the retries of the scheduler and reads its body, None if it failed or was aborted """
+        attempt = 0
+        response = self._fetch(headers, driver)
+        while self.scheduler is not None and self.scheduler.should_retry(response, attempt):
+            attempt += 1
+            self.logger.warning(f'Reintento {attempt} de {self.scheduler.max_retries}: {self.url}')
+            if response is not None and response._content is False: response.close()
+            response = self._fetch(headers, driver)
+
+        if response is None: return None
         if response.status_code >= 400:
             self.logger.error(f"Error al enviar la solicitud: {response.status_code}: {response.reason}")
+            # the body of a streamed error page is not downloaded
+            if response._content is False: response.close()
             return None
+        # aborted pages are neither parsed nor cached
+        if not self._read_body(response): return None
+        return response
 
-        return self._set_cached_response(response) if use_cache else response
+    @staticmethod
+    def is_unchanged(response) -> bool:
+        """ Whether the response was revalidated with a 304 or has the same content hash as the cached page """
+        return getattr(response, 'unchanged', False)
 
     def get_content(self, response):
-        content = response.content.decode('utf-8')
+        """
+        Content of the page to parse, the cleaned text or, with zero_copy, the memory map of
+        the cached page when the response body is the one cached for the current url.
+        """
+        cache_hash = getattr(response, 'cache_hash', None)
+        if self.zero_copy and self.page_cache is not None and cache_hash is not None and self._zero_copy_plans():
+            buffer = self.page_cache.read_buffer(self.url, cache_hash)
+            if buffer is not None:
+                self.page_state = JsonPath.load_state(buffer, self.state_rx) if self.state_rx is not None else None
+                return buffer
+        return self.get_page_content(response.content.decode('utf-8'))
+
+    def _zero_copy_plans(self) -> bool:
+        """ Builds the bytes plans of the specs, zero_copy is disabled if a regex can not be translated """
+        try:
+            for fields_rx in (self.list_items_rx, self.list_items_fields, self.list_next_rx, self.detail_fields):
+                if fields_rx: self.get_plan(fields_rx, b'')
+        except (ValueError, re.error) as e:
+            self.logger.warning(f'No se puede usar zero_copy con {self.url}, se decodifica la página: {e}')
+            self.zero_copy = False
+        return self.zero_copy
+
+    def get_page_content(self, content: str) -> str:
+        """ Parses the embedded state of the page for the jsonpath specs and returns the cleaned content """
+        # the state must be decoded before the cleaning removes its escapes
+        self.page_state = JsonPath.load_state(content, self.state_rx) if self.state_rx is not None else None
         content = Scraper.CLEAN_RX.sub('', content)
 
         self.logger.debug(f'Contenido de la página: {content}')
         return content
 
-    def scrap_list(self):
+    def iter_pages(self, max_pages: int = None, max_items: int = None):
+        """
+            Iterates over the pages of the list view starting at the current URL.
+
+            Each page is fetched, parsed, stored in the datafile and yielded before the
+            next one is requested, only the current page is kept in memory. The iteration
+            stops at the last page, when a page contains already stored items or when
+            the max_pages or max_items budget is exhausted. While a page is yielded its
+            next url is in next_url, completed is set when the iteration did not stop on
+            a failed download.
+
+            Args:
+                max_pages (int): maximum number of pages to fetch, None for no limit.
+                max_items (int): maximum number of items to yield, None for no limit.
+
+            Yields:
+                list: The items parsed from each page. """
+        pages, items = 0, 0
+        self.next_url, self.completed = None, False
+        while self.url is not None:
+            if max_pages is not None and pages >= max_pages:
+                self.logger.info(f'Finalizado, alcanzado el máximo de {max_pages} páginas')
+                break
+            start = time.perf_counter()
+            response = self.get_response()
+            if response is None: return
+            if Scraper.is_unchanged(response):
+                # same content as the last download, its items are already stored
+                self.logger.info(f'Finalizado, la página no ha cambiado desde la última descarga: {self.url}')
+                break
+            content = self.get_content(response)
+            del response
+            curr_page = self.parse_list(content, self.list_items_rx, self.list_items_fields, self.list_fields_lambda, self.detail_fields_lambda)
+            next_href = self.get_next_url(content)
+            # the decoded page is not needed anymore, release it before yielding
+            del content
+            if curr_page is None: break
+
+            if max_items is not None and items + len(curr_page) > max_items:
+                curr_page = curr_page[:max_items - items]
+            hay_repetidos = self.store_page_csv(curr_page)
+            pages, items = pages + 1, items + len(curr_page)
+            self.logger.info(f'Tiempo transcurrido: {time.perf_counter() - start}')
+            self.next_url = next_href
+            yield curr_page
+
+            if next_href is None:
+                self.logger.info('Finalizado, se ha procesado la última página')
+                break
+            elif hay_repetidos:
+                self.logger.info('Finalizado, se han procesado los nuevos elementos')
+                break
+            elif max_items is not None and items >= max_items:
+                self.logger.info(f'Finalizado, alcanzado el máximo de {max_items} elementos')
+                break
+            self.set_url(next_href)
+        self.completed = True
+
+    def scrap_list(self, max_pages: int = None, max_items: int = None):
         """
             Runs the web crawling and scraping process for the specified URL.
 
@@ -350,16 +619,8 @@ class Scraper:
 
             Returns:
                 None """
-        start = time.perf_counter()
-        response = self.get_response()
-        if response is not None:
-            content = self.get_content(response)
-            curr_page = self.parse_list(content, self.list_items_rx, self.list_items_fields, self.list_fields_lambda, self.detail_fields_lambda)
-            hay_repetidos = self.store_page_csv(curr_page)
-            self.logger.info(f'Tiempo transcurrido: {time.perf_counter() - start}')
-            self.paginate(content, hay_repetidos)
-
-        self.clean_cache_dir()
+        for curr_page in self.iter_pages(max_pages, max_items):
+            self.scraped_pages.append(pd.DataFrame(curr_page))
 
     def scrap_item(self):
         start = time.perf_counter()
@@ -367,55 +628,30 @@ class Scraper:
         if response is not None:
             content = self.get_content(response)
             data = self.parse_item(content, self.detail_fields, self.list_fields_lambda)
+            self.scraped_pages.append(pd.DataFrame([data]))
             hay_repetidos = self.store_page_csv([data])
             self.logger.info(f'Tiempo transcurrido: {time.perf_counter() - start}')
 
-        self.clean_cache_dir()
-
     def store_page_csv(self, curr_page):
 
-        if self.datafile_path is None: return
+        if self.store is None: return
         if curr_page is None or len(curr_page) == 0: return
 
-        hay_repetidos = False
-        curr_page_df = pd.DataFrame(curr_page)
-        self.last_scaped_df= pd.concat([self.last_scaped_df, curr_page_df], ignore_index=True)
-        if (self.main_data_df is not None):
-            repetidos = curr_page_df['link'].isin(self.main_data_df['link'])
-            hay_repetidos = repetidos.any()
-            curr_page_df = curr_page_df[~repetidos]
-        # print('main_data_df',self.main_data_df)
-        if not curr_page_df.empty:
-            self.main_data_df = pd.concat([self.main_data_df, curr_page_df], ignore_index=True)
-            self.main_data_df.to_csv(self.datafile_path, index=False)
+        curr_page_df, hay_repetidos = self.store.store_page(pd.DataFrame(curr_page))
         self.logger.info(f"Elementos añadidos a la bbdd: {len(curr_page_df)}")
         return hay_repetidos
 
-    def paginate(self, content, hay_repetidos):
-
+    def get_next_url(self, content):
         next_href = self.parse_item(content, self.list_next_rx, self.list_fields_lambda)
-        next_href = next_href[next(iter(self.list_next_rx.keys()))] if next_href else None
-        if next_href is None:
-            self.logger.info('Finalizado, se ha procesado la última página')
-        elif hay_repetidos:
-            self.logger.info('Finalizado, se han procesado los nuevos elementos')
-        else:
-            self.set_url(next_href)
-            self.scrap_list()
+        return next_href[next(iter(self.list_next_rx.keys()))] if next_href else None
 
     def get_scraped_items(self):
-        return self.last_scaped_df
+        return pd.concat(self.scraped_pages, ignore_index=True) if self.scraped_pages else None
 
     def clean_cache_dir(self):
-        deleted_files = 0
-        for file in os.listdir(self.cache_dir):
-            file_path = os.path.join(self.cache_dir, file)
-            if os.path.isfile(file_path) and file.endswith('.html'):
-                if time.time() - os.path.getmtime(file_path) > self.cache_expires:
-                    os.remove(file_path)
-                    deleted_files += 1
-        if deleted_files > 0:
-            self.logger.info(f"Deleted {deleted_files} html files from the cache directory.")
+        """ Evicts the expired pages from the page cache, the cache directory is not scanned """
+        if self.page_cache is None: return 0
+        return self.page_cache.evict()
             
     @staticmethod
     def scrap_ollama():
@@ -0,0 +1,102 @@
+import re
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+class SessionPool:
+
+    HOST_RX = re.compile(r'https?://([^/]+)')
+
+    def __init__(self, pool_size: int = 10, idle_timeout: int = 60):
+        '''
+        Pool of keep-alive http sessions, one per host, shared by the scrapers of a crawl
+
+        Parameters
+        ----------
+        pool_size : int
+            maximum number of connections kept open to the same host
+        idle_timeout : int
+            seconds after which an unused session is closed and a new one is created,
+            servers usually drop idle keep-alive connections
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.sessions = dict()
+        self.last_used = dict()
+        self.lock = threading.Lock()
+
+        self.requests_count = 0
+        self.sessions_created = 0
+        self.sessions_expired = 0
+        self.closed_connections = 0
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self.sessions_created += 1
+        return session
+
+    @staticmethod
+    def _count_connections(session) -> int:
+        """ Number of tcp connections opened by the urllib3 pools of the session """
+        count = 0
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                count += getattr(pool, 'num_connections', 0) if pool is not None else 0
+        return count
+
+    def _close_session(self, host):
+        session = self.sessions.pop(host)
+        self.last_used.pop(host, None)
+        self.closed_connections += SessionPool._count_connections(session)
+        session.close()
+
+    def get_session(self, host) -> requests.Session:
+        with self.lock:
+            now = time.monotonic()
+            if host in self.sessions and now - self.last_used[host] > self.idle_timeout:
+                self.logger.debug(f'Session to {host} idle for more than {self.idle_timeout} secs, renewing')
+                self._close_session(host)
+                self.sessions_expired += 1
+            if host not in self.sessions:
+                self.sessions[host] = self._new_session()
+            self.last_used[host] = now
+            self.requests_count += 1
+            return self.sessions[host]
+
+    def get(self, url, headers=None, **kwargs) -> requests.Response:
+        """
+        Sends a GET request reusing the session of the url host.
+
+        Args:
+            url (str): The url to get.
+            headers (dict): The headers of the request.
+        """
+        session = self.get_session(SessionPool.HOST_RX.search(url).group(1))
+        return session.get(url, headers=headers, **kwargs)
+
+    def stats(self) -> dict:
+        """ Connection reuse counters, the reused connections are the saved handshakes """
+        with self.lock:
+            opened = self.closed_connections + sum(SessionPool._count_connections(s) for s in self.sessions.values())
+            return {
+                'requests': self.requests_count,
+                'sessions_created': self.sessions_created,
+                'sessions_expired': self.sessions_expired,
+                'connections_opened': opened,
+                'connections_reused': max(0, self.requests_count - opened),
+            }
+
+    def close(self):
+        with self.lock:
+            for host in list(self.sessions.keys()):
+                self._close_session(host)
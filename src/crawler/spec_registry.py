@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+import logging
+from pathlib import Path
+from types import MappingProxyType
+from dataclasses import dataclass, field
+import pandas as pd
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    # compiled specs of a provider, the dicts are read-only views shared by all its scrapers
+    provider: str
+    url: str
+    list_items: MappingProxyType
+    list_next: MappingProxyType
+    list_fields: MappingProxyType
+    detail_fields: MappingProxyType
+    list_fields_lambda: MappingProxyType
+    detail_fields_lambda: MappingProxyType
+    page_ready: MappingProxyType
+    abort: MappingProxyType
+    block_rules: tuple
+    max_bytes: int = None
+    # extraction plans of the field specs, built by the scrapers on first use
+    plans: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @staticmethod
+    def compile(web_specs: pd.DataFrame, provider: str) -> 'ProviderSpec':
+        from crawler import Crawler
+        url, list_items, list_next, list_fields, detail_fields, list_fields_lambda, detail_fields_lambda = Crawler.compile_provider_specs(web_specs, provider)
+        return ProviderSpec(provider, url, MappingProxyType(list_items), MappingProxyType(list_next), MappingProxyType(list_fields),
+            MappingProxyType(detail_fields), MappingProxyType(list_fields_lambda), MappingProxyType(detail_fields_lambda),
+            MappingProxyType(Crawler.get_dict_rx(web_specs, provider, 'page_ready')), MappingProxyType(Crawler.get_dict_rx(web_specs, provider, 'abort')),
+            tuple(Crawler.get_block_rules(web_specs, provider)), Crawler.get_limit(web_specs, provider, 'max_bytes'))
+
+    def specs(self) -> tuple:
+        """ Same tuple as Crawler.compile_provider_specs """
+        return self.url, self.list_items, self.list_next, self.list_fields, self.detail_fields, self.list_fields_lambda, self.detail_fields_lambda
+
+class SpecRegistry:
+
+    HOST_RX = re.compile(r'https?://([^/]+)')
+
+    def __init__(self, webs_specs_datafile_path: Path = None, store=None):
+        '''
+        Compiled provider specs, cached until the specs file changes
+
+        The regexes and lambdas of a provider are compiled once into a ProviderSpec on first
+        use. The modification time of the specs file is checked on every access, when it
+        changes the file is read again and the providers are compiled again on demand.
+
+        Parameters
+        ----------
+        webs_specs_datafile_path : Path
+            path of webs_specs.csv
+        store : SqliteStore
+            store whose web_specs table is used instead of the csv when it is not empty,
+            the table is read once as its changes can not be detected by the file time
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.webs_specs_datafile_path = Path(webs_specs_datafile_path) if webs_specs_datafile_path else None
+        self.lock = threading.RLock()
+        self.specs = dict()
+        self.hosts = None
+        self.mtime = None
+        self.reloads = 0
+        self.web_specs = store.read_web_specs() if store is not None else None
+        self.from_store = self.web_specs is not None and not self.web_specs.empty
+        if not self.from_store:
+            self._reload()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.webs_specs_datafile_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self):
+        self.mtime = self._file_mtime()
+        self.web_specs = pd.read_csv(self.webs_specs_datafile_path)
+        self.specs = dict()
+        self.hosts = None
+        self.reloads += 1
+        self.logger.info(f'Specs loaded from {self.webs_specs_datafile_path}: {len(self.web_specs)} rows')
+
+    def get_web_specs(self) -> pd.DataFrame:
+        """ The spec rows, read again if the file changed """
+        with self.lock:
+            if not self.from_store and self._file_mtime() != self.mtime:
+                self._reload()
+            return self.web_specs
+
+    def get(self, provider) -> ProviderSpec:
+        """ The compiled specs of the provider, compiled on first use after each reload """
+        with self.lock:
+            web_specs = self.get_web_specs()
+            spec = self.specs.get(provider)
+            if spec is None:
+                spec = ProviderSpec.compile(web_specs, provider)
+                self.specs[provider] = spec
+            return spec
+
+    def provider_of(self, url) -> str:
+        """ Provider whose base url has the host of the url, None if no provider matches """
+        match = SpecRegistry.HOST_RX.search(str(url))
+        if match is None: return None
+        with self.lock:
+            web_specs = self.get_web_specs()
+            if self.hosts is None:
+                rows = web_specs[(web_specs['type'] == 'url') & (web_specs['name'] == 'base_url')]
+                self.hosts = {SpecRegistry.HOST_RX.search(row['value']).group(1): row['provider'] for index, row in rows.iterrows()}
+            return self.hosts.get(match.group(1))
+
+    def providers(self) -> list:
+        return list(self.get_web_specs()['provider'].unique())
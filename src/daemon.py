@@ -21,10 +21,17 @@ sys.path.append('src')
 sys.path.append('src/crawler')
 sys.path.append('src/report')
 from crawler import Crawler
+from fetcher import AsyncFetcher
+from session_pool import SessionPool
+from page_cache import PageCache
+from browser_pool import BrowserPool
+from host_scheduler import HostScheduler
+from crawl_frontier import CrawlFrontier
 from reporter import Reporter
 from realty import Realty
 from realty_report import RealtyReport
 from telegram_handler import TelegramHandler
+from sqlite_store import SqliteStore
 
 class Daemon:
 
@@ -39,8 +46,19 @@ class Daemon:
 
         self.default_report_path = Path.joinpath(self.reporter_cache_dir,'realadvisor_report.pdf')
 
-        self.crawler = Crawler(self.webs_specs_datafile_path, self.realty_datafile_path, self.crawler_cache_dir, self.cache_expires, self.delay_seconds)
-        self.reporter = Reporter(self.template_path, self.output_dir, self.precios_path, self.indicadores_path, self.reports_path, self.reporter_cache_dir)
+        self.store = SqliteStore(self.sqlite_path) if self.storage_backend == 'sqlite' else None
+        self.page_cache = PageCache(self.crawler_cache_dir, self.cache_expires, self.cache_max_bytes, self.cache_compression, self.cache_revalidate_expires)
+        if self.cache_eviction_interval:
+            self.page_cache.start_eviction_timer(self.cache_eviction_interval)
+        self.session_pool = SessionPool(self.session_pool_size, self.session_idle_timeout)
+        self.browser_pool = BrowserPool(self.browser_pool_size, self.browser_max_pages, self.browser_load_timeout)
+        # the learned delays of the hosts are kept with the page cache between runs
+        self.host_scheduler = HostScheduler(self.delay_seconds, self.min_delay_seconds, self.max_delay_seconds, self.max_retries,
+            state_path=Path.joinpath(self.crawler_cache_dir, 'host_scheduler.json')) if self.adaptive_delay else None
+        self.frontier = CrawlFrontier(Path.joinpath(self.crawler_cache_dir, 'frontier.db'), self.crawl_lease_timeout) if self.resume_crawls else None
+        self.fetcher = AsyncFetcher(self.max_concurrency, self.delay_seconds, session_pool=self.session_pool, scheduler=self.host_scheduler) if self.max_concurrency else None
+        self.crawler = Crawler(self.webs_specs_datafile_path, self.realty_datafile_path, self.crawler_cache_dir, self.cache_expires, self.delay_seconds, self.fetcher, self.session_pool, self.max_pages, self.max_items, self.store, self.page_cache, self.browser_pool, self.parse_workers, self.zero_copy_parsing, self.host_scheduler, self.enrich_concurrency, self.frontier, self.compact_every)
+        self.reporter = Reporter(self.template_path, self.output_dir, self.precios_path, self.indicadores_path, self.reports_path, self.reporter_cache_dir, self.store)
 
         # self.telegram_handler = logging.getHandlerByName('telegram_handler')
         # self.telegram_handler.setLevel(logging.INFO)
@@ -61,8 +79,30 @@ class Daemon:
             self.realty_datafile_path = Path(self.conf['crawler']['realty_datafile_path'])
             self.crawler_cache_dir = Path(self.conf['crawler']['cache_dir'])
             self.cache_expires = self.conf['crawler']['cache_expires']
+            self.cache_max_bytes = self.conf['crawler'].get('cache_max_bytes')
+            self.cache_compression = self.conf['crawler'].get('cache_compression', 'gzip')
+            self.cache_eviction_interval = self.conf['crawler'].get('cache_eviction_interval', 0)
+            self.cache_revalidate_expires = self.conf['crawler'].get('cache_revalidate_expires', 7 * 24 * 3600)
             self.orig_delay_seconds = self.conf['crawler']['delay_seconds']
             self.delay_seconds = self.conf['crawler']['delay_seconds']
+            self.max_concurrency = self.conf['crawler'].get('max_concurrency', 0)
+            self.adaptive_delay = self.conf['crawler'].get('adaptive_delay', False)
+            self.min_delay_seconds = self.conf['crawler'].get('min_delay_seconds', 5)
+            self.max_delay_seconds = self.conf['crawler'].get('max_delay_seconds', 3600)
+            self.max_retries = self.conf['crawler'].get('max_retries', 3)
+            self.session_pool_size = self.conf['crawler'].get('session_pool_size', 10)
+            self.session_idle_timeout = self.conf['crawler'].get('session_idle_timeout', 60)
+            self.max_pages = self.conf['crawler'].get('max_pages')
+            self.max_items = self.conf['crawler'].get('max_items')
+            self.browser_pool_size = self.conf['crawler'].get('browser_pool_size', 1)
+            self.browser_max_pages = self.conf['crawler'].get('browser_max_pages', 50)
+            self.browser_load_timeout = self.conf['crawler'].get('browser_load_timeout', 20)
+            self.parse_workers = self.conf['crawler'].get('parse_workers', 0)
+            self.enrich_concurrency = self.conf['crawler'].get('enrich_concurrency', 4)
+            self.zero_copy_parsing = self.conf['crawler'].get('zero_copy_parsing', False)
+            self.resume_crawls = self.conf['crawler'].get('resume_crawls', True)
+            self.crawl_lease_timeout = self.conf['crawler'].get('crawl_lease_timeout', 600)
+            self.compact_every = self.conf['crawler'].get('compact_every', 0)
 
             self.template_path = Path(self.conf['reporter']['template_path'])
             self.output_dir = Path(self.conf['reporter']['output_dir'])
@@ -71,6 +111,10 @@ class Daemon:
             self.reports_path = Path(self.conf['reporter']['reports_path'])
             self.reporter_cache_dir = Path(self.conf['reporter']['cache_dir'])
 
+            storage = self.conf.get('storage', {})
+            self.storage_backend = storage.get('backend', 'csv')
+            self.sqlite_path = Path(storage.get('sqlite_path', 'local/datasets/realadvisor.db'))
+
             if self.dry_run:
                 self.logger.warning('dry run mode enabled')
                 self.delay_seconds = 0
@@ -86,10 +130,19 @@ class Daemon:
             self.delay_seconds = self.orig_delay_seconds
 
     def scrap_new_realies(self):
-        return self.crawler.run(self.dry_run)
+        scraped_items = self.crawler.run(self.dry_run)
+        self.logger.info(f'Session pool stats: {self.session_pool.stats()}')
+        self.logger.info(f'Page cache stats: {self.page_cache.stats()}')
+        self.logger.info(f'Browser pool stats: {self.browser_pool.stats()}')
+        if self.host_scheduler is not None:
+            self.host_scheduler.save()
+            self.logger.info(f'Host scheduler stats: {self.host_scheduler.stats()}')
+        if self.frontier is not None:
+            self.logger.info(f'Crawl frontier stats: {self.frontier.stats()}')
+        return scraped_items
 
     def generate_new_reports(self):
-        realties = self.reporter.get_pending_realies(self.realty_datafile_path)
+        realties = self.reporter.get_pending_listings(self.realty_datafile_path)
         self.logger.info(f"{len(realties)} new realties found")
         if len(realties) < 1: return
 
@@ -110,13 +163,24 @@ class Daemon:
         for report in reports:
             self.reporter.generate_report_file(report)
 
+    def crawl_realties(self, links: list) -> list:
+        """ Enriches the realties of the links with their detail pages in one batch, the already enriched ones are skipped """
+        enriched_df = self.crawler.enrich(links)
+        return [Realty(**realty) for realty in enriched_df.to_dict('records')]
+
     def crawl_realty(self, link, dry_run=False) -> Realty:
-        provider = re.findall(r'://(.+)\.\w+/', link)
-        provider = provider[0].split('.')[-1]
-        crawled_realties = self.crawler.crawl_item(provider, link, dry_run=self.dry_run)
-        realty = crawled_realties.iloc[0].to_dict()
-        realty = Realty(**realty)
-        return realty
+        if self.dry_run:
+            provider = re.findall(r'://(.+)\.\w+/', link)
+            provider = provider[0].split('.')[-1]
+            crawled_realties = self.crawler.crawl_item(provider, link, dry_run=self.dry_run)
+            return Realty(**crawled_realties[0])
+        enriched_df = self.crawler.enrich([link], force=True)
+        return Realty(**enriched_df.iloc[0].to_dict()) if not enriched_df.empty else None
+
+    def migrate_to_sqlite(self):
+        store = self.store if self.store is not None else SqliteStore(self.sqlite_path)
+        store.migrate_from_csv(self.realty_datafile_path, self.reports_path, self.webs_specs_datafile_path)
+        self.logger.info(f'CSV files migrated to {self.sqlite_path}')
 
     def merge_reports(self) -> Path:
         pdfs = glob.glob(f'{self.output_dir}/*.pdf')
@@ -225,6 +289,15 @@ class Daemon:
     def sync_run(self):
         asyncio.run(daemon.run())
 
+    def close(self):
+        """ Stops the fetch engine, the browsers and the parse pools of the crawler, and writes the page cache index """
+        self.crawler.close()
+        if self.fetcher is not None:
+            self.fetcher.close()
+        self.browser_pool.close()
+        self.page_cache.stop_eviction_timer()
+        self.page_cache.flush()
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Real Advisor Daemon')
@@ -236,26 +309,32 @@ if __name__ == '__main__':
     parser.add_argument("--start", help="Start the daemon scheduler", action="store_true", default=False)
     parser.add_argument("--send", help="Send email with the report", action="store_true", default=False)
     parser.add_argument("--run", help="Run full circle of scrap, report and send", action="store_true", default=False)
+    parser.add_argument("--migrate", help="Import the CSV datasets into the SQLite database and exit", action="store_true", default=False)
 
     args = parser.parse_args()
 
     logging.config.fileConfig(args.log_config, disable_existing_loggers=False)
     # if Path('realadvisor.log').exists(): os.remove('realadvisor.log')
 
-    if not (args.scrap or args.report or args.send or args.start or args.run):
+    if not (args.scrap or args.report or args.send or args.start or args.run or args.migrate):
         parser.print_usage()
         sys.exit(1)
 
     daemon = Daemon(config_file_path=args.config, dry_run=args.dry_run)
 
-    if args.scrap:
-        daemon.scrap_new_realies()
-    if args.report:
-        daemon.generate_new_reports()
-    if args.send:
-        asyncio.run(daemon.send_report())
-    if args.start:
-        asyncio.run(daemon.start())
-    if args.run:
-        daemon.sync_run()
+    try:
+        if args.migrate:
+            daemon.migrate_to_sqlite()
+        if args.scrap:
+            daemon.scrap_new_realies()
+        if args.report:
+            daemon.generate_new_reports()
+        if args.send:
+            asyncio.run(daemon.send_report())
+        if args.start:
+            asyncio.run(daemon.start())
+        if args.run:
+            daemon.sync_run()
+    finally:
+        daemon.close()
 
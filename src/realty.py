@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
 from typing import Optional
 import ast
+import numpy as np
+import pandas as pd
 
 @dataclass
 class Realty:
@@ -233,6 +235,100 @@ class Realty:
         else:
             return None
 
+    @staticmethod
+    def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Same normalization of the fields as the setters, over whole columns: a row of the result
+        equals Realty(**row).to_dict() of the same row without building the objects.
+
+        Args:
+            df (DataFrame): The listings as read from the realties file.
+
+        Returns:
+            DataFrame: The listings with a column per to_dict key, the missing values as None.
+        """
+        listings = pd.DataFrame(index=df.index, dtype=object)
+        column = lambda name: df[name] if name in df else pd.Series([None] * len(df.index), index=df.index, dtype=object)
+        for name in ('link', 'type_v', 'address', 'town'):
+            listings[name] = Realty.text_column(column(name))
+        listings['price'] = Realty.int_column(Realty.parse_price_column(column('price')))
+        listings['rooms'] = Realty.int_column(Realty.number_column(column('rooms')))
+        listings['surface'] = Realty.int_column(Realty.number_column(column('surface')))
+        # info, description and created are kept as they are
+        listings['info'] = column('info')
+        listings['description'] = column('description')
+        listings['price_old'] = Realty.int_column(Realty.parse_price_column(column('price_old')))
+        listings['tags'] = Realty.tags_column(column('tags'))
+        listings['agent'] = Realty.text_column(column('agent'))
+        listings['created'] = column('created')
+        listings['images'] = Realty.images_column(column('images'))
+
+        # the town is appended to the address as in __init__
+        address, town = listings['address'], listings['town']
+        combine = address.notna() & town.notna() & (address != town) & (address.str.len() > 0) & (town.str.len() > 0)
+        listings.loc[combine, 'address'] = (address[combine] + ', ' + town[combine]).str.replace(', nan', '', regex=False)
+        return listings
+
+    @staticmethod
+    def is_text(values: pd.Series) -> pd.Series:
+        return values.map(lambda x: isinstance(x, str)).astype(bool)
+
+    @staticmethod
+    def text_column(values: pd.Series) -> pd.Series:
+        """ The strings of the column, None for any other value """
+        return values.astype(object).where(Realty.is_text(values), None)
+
+    @staticmethod
+    def parse_price_column(values: pd.Series) -> pd.Series:
+        """ parse_price over a column, NaN where it returns None """
+        # the missing values are not parsed, as str(None) and str(nan)
+        text = values.astype(object).where(values.notna(), '').astype(str).str.strip().str.replace('€', '', regex=False).str.replace(' ', '', regex=False)
+        dots, commas = text.str.count(r'\.'), text.str.count(',')
+        parts = text.str.replace('.', ',', regex=False)
+        partitions = parts.str.rpartition(',')
+        head, last = partitions[0], partitions[2]
+        # the separators of the head are thousands separators, the last one is the decimal point
+        decimal = head.str.replace(',', '', regex=False) + '.' + last
+        joined = parts.str.replace(',', '', regex=False)
+        one_separator = (commas == 1) | (dots == 1)
+        is_decimal = (last.str.len() != 3) | (head.str.rpartition(',')[2].str.len() > 3)
+        parsed = np.select(
+            [(commas == 0) & (dots == 0) & text.str.isdigit(), (dots > 0) & (commas > 0), one_separator & is_decimal, one_separator, (commas > 1) | (dots > 1)],
+            [joined, decimal, decimal, joined, joined], None)
+        return pd.to_numeric(pd.Series(parsed, index=values.index), errors='coerce')
+
+    @staticmethod
+    def number_column(values: pd.Series) -> pd.Series:
+        """ The numbers of the column for safe_int, the strings only when they are integers """
+        if pd.api.types.is_numeric_dtype(values): return values.astype(float)
+        is_text = Realty.is_text(values)
+        integer = values.where(is_text, '').astype(str).str.fullmatch(r'\s*[+-]?\d+\s*')
+        return pd.to_numeric(values.where(~is_text | integer), errors='coerce').astype(float)
+
+    @staticmethod
+    def int_column(values: pd.Series) -> pd.Series:
+        """ safe_int over a column of numbers, truncated toward zero, None where it fails """
+        values = np.trunc(values.where(np.isfinite(values))).astype('Int64')
+        return values.astype(object).where(values.notna(), None)
+
+    @staticmethod
+    def tags_column(values: pd.Series) -> pd.Series:
+        """ The tags setter over a column: the lists and comma separated strings without duplicates """
+        is_text = Realty.is_text(values)
+        tags = values.astype(object).where(values.map(lambda x: isinstance(x, list)).astype(bool), None)
+        tags[is_text] = values[is_text].str.strip().str.split(r'\s*,\s*', regex=True)
+        return tags.map(lambda x: list(dict.fromkeys(x)) if isinstance(x, list) else None)
+
+    @staticmethod
+    def images_column(values: pd.Series) -> pd.Series:
+        """ The images setter over a column, only the lists written as strings are evaluated """
+        is_text = Realty.is_text(values)
+        is_list = is_text & values.where(is_text, '').astype(str).str.startswith('[')
+        images = values.astype(object).where(values.map(lambda x: isinstance(x, list)).astype(bool), None)
+        images[is_text & ~is_list] = values[is_text & ~is_list].map(lambda x: [x])
+        images[is_list] = values[is_list].map(ast.literal_eval)
+        return images
+
     @staticmethod
     def get_sample():
         return Realty(**Realty.get_sample_data())
@@ -0,0 +1,120 @@
+import logging
+from difflib import SequenceMatcher
+import numpy as np
+
+class PlaceIndex:
+
+    # length of the character n-grams of the inverted index
+    NGRAM = 3
+    # candidates sharing the most n-grams that are scored first, their ratio prunes the rest
+    SEEDS = 3
+
+    def __init__(self, places: list, threshold: float = .5):
+        '''
+        Fuzzy matching of address parts to the place names of the indicators
+
+        Gives the same result as RealtyReport.map_place, the place with the best
+        SequenceMatcher ratio above the threshold, the first one on ties, without scoring
+        every place. The places sharing the most character n-grams with the address part
+        are scored first, then the places are visited by their upper bound of the ratio,
+        the matching characters of both strings, and the search stops when the bound can
+        not beat the best ratio found. The results are memoized by address part.
+
+        Parameters
+        ----------
+        places : list
+            place names, already standardized as the address parts they are matched to
+        threshold : float
+            minimum ratio of a match, exclusive
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.places = list(places)
+        self.threshold = threshold
+        self.memo = dict()
+        self.hits = 0
+        self.misses = 0
+        self.scored = 0
+
+        # only the names are matched, the missing values of the column never match
+        self.names = [place if isinstance(place, str) else None for place in self.places]
+        self.valid = np.array([name is not None for name in self.names])
+        self.lengths = np.array([len(name) if name is not None else 0 for name in self.names], dtype=np.int64)
+        self.alphabet = {char: col for col, char in enumerate(sorted({char for name in self.names if name is not None for char in name}))}
+        self.counts = np.zeros((len(self.names), len(self.alphabet)), dtype=np.int64)
+        self.ngrams = dict()
+        for i, name in enumerate(self.names):
+            if name is None: continue
+            for char in name:
+                self.counts[i, self.alphabet[char]] += 1
+            for ngram in PlaceIndex.get_ngrams(name):
+                self.ngrams.setdefault(ngram, []).append(i)
+
+    @staticmethod
+    def get_ngrams(x: str) -> set:
+        x = f' {x} '
+        return {x[i:i + PlaceIndex.NGRAM] for i in range(len(x) - PlaceIndex.NGRAM + 1)}
+
+    def bounds(self, x: str) -> np.ndarray:
+        """ Upper bound of the ratio of x to each place, computed as SequenceMatcher.quick_ratio """
+        query = np.zeros(len(self.alphabet), dtype=np.int64)
+        for char in x:
+            col = self.alphabet.get(char)
+            if col is not None: query[col] += 1
+        matches = np.minimum(self.counts, query).sum(axis=1)
+        length = len(x) + self.lengths
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bounds = np.where(length > 0, 2.0 * matches / length, 1.0)
+        return np.where(self.valid, bounds, -1.0)
+
+    def match(self, x: str):
+        """
+        Best place for the address part, as RealtyReport.map_place.
+
+        Returns:
+            tuple: The place, its ratio and its index in places, None if no ratio is above the threshold.
+        """
+        if x is None: return None
+        if x in self.memo:
+            self.hits += 1
+            return self.memo[x]
+        self.misses += 1
+        result = self._match(x)
+        self.memo[x] = result
+        return result
+
+    def _match(self, x: str):
+        best, best_idx = self.threshold, None
+        ratios = dict()
+
+        def score(i):
+            if i not in ratios:
+                ratios[i] = SequenceMatcher(None, x, self.names[i]).ratio()
+                self.scored += 1
+            return ratios[i]
+
+        shared = dict()
+        for ngram in PlaceIndex.get_ngrams(x):
+            for i in self.ngrams.get(ngram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        for i in sorted(shared, key=lambda i: (-shared[i], i))[:PlaceIndex.SEEDS]:
+            ratio = score(i)
+            if ratio > best or (ratio == best and best_idx is not None and i < best_idx):
+                best, best_idx = ratio, i
+
+        bounds = self.bounds(x)
+        for i in np.lexsort((np.arange(len(bounds)), -bounds)):
+            bound = bounds[i]
+            if bound < best: break
+            # a ratio equal to the best only wins from a lower index
+            if bound == best and (best_idx is None or i > best_idx): continue
+            ratio = score(i)
+            if ratio > best or (ratio == best and best_idx is not None and i < best_idx):
+                best, best_idx = ratio, int(i)
+
+        if best_idx is None: return None
+        return (self.names[best_idx], best, best_idx)
+
+    def stats(self) -> dict:
+        return {'places': len(self.places), 'memo': len(self.memo), 'hits': self.hits, 'misses': self.misses, 'scored': self.scored}
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Optional
 from difflib import SequenceMatcher
 import html
@@ -7,8 +7,11 @@ import unicodedata
 import codecs
 import sys
 from datetime import datetime
+import numpy as np
+import pandas as pd
 sys.path.append('src')
 from realty import Realty
+from place_index import PlaceIndex
 
 @dataclass
 class RealtyReport(Realty):
@@ -109,6 +112,9 @@ class RealtyReport(Realty):
         'grow_acu_venta_10y_stars': 0.1     # Crecimiento histórico de ventas
     }
 
+    # columns computed by set_indicadores, the rest of the report columns come from the listing and its indicators
+    SCORE_COLUMNS = ['precio_m2', 'precio_desv_media', 'precio_venta_stars', 'precio_alquiler_estimado', 'precio_venta_estimado', 'global_score_stars']
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         
@@ -293,19 +299,27 @@ class RealtyReport(Realty):
         tags = list(dict.fromkeys(tags))
         return tags
 
-    def match_place(self, places):
+    def match_place(self, places: list | PlaceIndex):
+        """ Matches the parts of the address and town to the places, a list of names or its PlaceIndex """
+        match = RealtyReport.find_place(self.address, self.town, places)
+        if match is not None:
+            self.barrio , self.barrio_ratio = match[0], match[1]
 
+    @staticmethod
+    def find_place(address, town, places: list | PlaceIndex):
+        map_place = places.match if isinstance(places, PlaceIndex) else lambda a: RealtyReport.map_place(a, places)
         matches = []
-        for a in (x.strip() for x in (self.address or '').split(',') + (self.town or '').split(',')):
-            match = RealtyReport.map_place(a, places)
+        # the missing parts are NaN once the cleaned values are in a DataFrame column
+        address = address if isinstance(address, str) else ''
+        town = town if isinstance(town, str) else ''
+        for a in (x.strip() for x in address.split(',') + town.split(',')):
+            match = map_place(a)
             if match is not None:
                 matches.append(match)
         # sort matches by 3 element
         matches = sorted(matches, key=lambda x: x[2])
         # get first non none match
-        match = next((x for x in matches if x is not None), None)
-        if match is not None:
-            self.barrio , self.barrio_ratio = match[0], match[1]
+        return next((x for x in matches if x is not None), None)
     
     @staticmethod
     def map_place(x, places):
@@ -380,6 +394,84 @@ class RealtyReport(Realty):
 
         return score - 1 if disponibilidad == 'ocupada' else score
 
+    @staticmethod
+    def columns() -> list:
+        """ Columns of the reports, in the order of to_dict """
+        realty_columns = list(Realty().to_dict())
+        return realty_columns + [f.name for f in fields(RealtyReport) if f.name.lstrip('_') not in realty_columns]
+
+    @staticmethod
+    def normalize_frame(listings: pd.DataFrame) -> pd.DataFrame:
+        """ Same cleaning of the listings as __init__, column by column without building the reports """
+        df = listings.copy()
+        for column in ('town', 'type_v', 'address'):
+            df[column] = [RealtyReport.estandarizar(x) for x in df[column]]
+        # the cleaned values are used as they are, the column turns the missing descriptions into NaN
+        descriptions = [RealtyReport.clean_description(x) for x in df['description']]
+        df['description'] = descriptions
+        df['disponibilidad'] = [RealtyReport.get_occupation(x) for x in descriptions]
+        df['tags'] = [RealtyReport.extract_tags(x) for x in descriptions]
+        df['reported'] = datetime.now()
+        return df
+
+    @staticmethod
+    def score_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the columns of set_indicadores for all the listings at once, with the same rules as
+        the scalar methods: the values are truncated to int, the price deviation is rounded to 2
+        decimals and the occupied realties lose one star of global score. The missing values, and the
+        operations that fail such as a division by a zero surface, give a missing result, except the
+        price stars of a missing deviation caused by a missing precio_venta_1y, which are 1 as
+        get_price_stars gives for NaN. The listings without barrio keep all the columns missing, as
+        set_indicadores is not called for the listings that match no place.
+
+        Args:
+            df (DataFrame): Listings with price, surface and disponibilidad joined with their indicators,
+                and the barrio they matched, all the listings are scored without a barrio column.
+
+        Returns:
+            DataFrame: A copy of the listings with the SCORE_COLUMNS.
+        """
+        df = df.copy()
+        def number(column):
+            return pd.to_numeric(df[column], errors='coerce').astype(float) if column in df else pd.Series(np.nan, index=df.index)
+        def truncate(values):
+            return np.trunc(values.where(np.isfinite(values))).astype('Int64')
+
+        price, surface = number('price'), number('surface')
+        precio_venta_1y, precio_alquiler_1y = number('precio_venta_1y'), number('precio_alquiler_1y')
+
+        df['precio_m2'] = truncate(price / surface)
+        # get_price_desv_media gives None without precio_m2 or with a zero precio_venta_1y, NaN for a missing one
+        has_desv = df['precio_m2'].notna() & (precio_venta_1y != 0)
+        precio_desv_media = (df['precio_m2'].astype(float) / precio_venta_1y).where(has_desv).round(2)
+        df['precio_desv_media'] = precio_desv_media
+        stars = np.select([precio_desv_media < 0.25, precio_desv_media < 0.40, precio_desv_media < 0.75, precio_desv_media < 1.00], [5, 4, 3, 2], 1)
+        df['precio_venta_stars'] = pd.Series(stars, index=df.index).where(has_desv).astype('Int64')
+        df['precio_alquiler_estimado'] = truncate(precio_alquiler_1y * surface)
+        df['precio_venta_estimado'] = truncate(precio_venta_1y * surface)
+
+        weights = RealtyReport.GLOBAL_SCORE_WEIGHTS
+        score = (df['precio_venta_stars'].astype(float) * weights['precio_venta_stars'] +
+                 number('rentabilidad_10y_stars') * weights['rentabilidad_10y_stars'] +
+                 number('grow_acu_venta_10y_stars') * weights['grow_acu_venta_10y_stars'] +
+                 number('grow_acu_alquiler_10y_stars') * weights['grow_acu_alquiler_10y_stars']).round(1)
+        df['global_score_stars'] = score - (df['disponibilidad'] == 'ocupada').astype(float)
+        if 'barrio' in df:
+            for column in RealtyReport.SCORE_COLUMNS:
+                df[column] = df[column].where(df['barrio'].notna())
+        return df
+
+    @staticmethod
+    def from_frame(listing: dict, row: dict) -> 'RealtyReport':
+        """ The report of a listing with the place, indicators and scores of its row of the report frame """
+        report = RealtyReport(**listing)
+        listing_columns = list(Realty().to_dict()) + ['reported', 'disponibilidad']
+        for column in RealtyReport.columns():
+            if column not in listing_columns and column in row:
+                setattr(report, column, row[column])
+        return report
+
     @staticmethod
     def get_example():
         data = {
@@ -0,0 +1,118 @@
+import os
+import threading
+import logging
+from pathlib import Path
+import pandas as pd
+from place_index import PlaceIndex
+
+class ReferenceDataCache:
+
+    # caches shared by all the reporters of the process, by their files
+    _shared = dict()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, indicadores_path: Path = Path('local/datasets/gen_indicadores.csv'), precios_path: Path = Path('local/datasets/gen_precios.csv')):
+        '''
+        Indicators and prices datasets loaded once and shared by the reports
+
+        The datasets and the data derived from them, the place index and the merged
+        indicators of each place, are kept until the modification time of their file
+        changes. The prices are grouped by place id with the mes column already parsed.
+
+        Parameters
+        ----------
+        indicadores_path : Path
+            path of gen_indicadores.csv
+        precios_path : Path
+            path of gen_precios.csv
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.indicadores_path = Path(indicadores_path)
+        self.precios_path = Path(precios_path)
+        self.lock = threading.RLock()
+        # name: (mtime of the source file, value)
+        self.entries = dict()
+        self.precios_empty = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls, indicadores_path: Path, precios_path: Path) -> 'ReferenceDataCache':
+        """ The cache of the process for the files, created on first use """
+        key = (Path(indicadores_path).resolve(), Path(precios_path).resolve())
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(indicadores_path, precios_path)
+            return cls._shared[key]
+
+    @staticmethod
+    def _mtime(path: Path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _get(self, name, path: Path, load):
+        with self.lock:
+            mtime = ReferenceDataCache._mtime(path)
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == mtime:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            value = load()
+            self.entries[name] = (mtime, value)
+            if entry is not None: self.logger.info(f'{name} reloaded, {path} changed')
+            return value
+
+    def indicadores(self) -> pd.DataFrame:
+        return self._get('indicadores', self.indicadores_path, lambda: pd.read_csv(self.indicadores_path))
+
+    def place_index(self) -> PlaceIndex:
+        return self._get('place_index', self.indicadores_path, lambda: PlaceIndex(self.indicadores()['nombre'].unique().tolist()))
+
+    def indicadores_lookup(self) -> dict:
+        return self._get('indicadores_lookup', self.indicadores_path, lambda: ReferenceDataCache.get_indicadores_lookup(self.indicadores()))
+
+    def indicadores_frame(self) -> pd.DataFrame:
+        """ The merged indicators of indicadores_lookup as a DataFrame indexed by place name """
+        return self._get('indicadores_frame', self.indicadores_path, lambda: pd.DataFrame.from_dict(self.indicadores_lookup(), orient='index'))
+
+    def precios(self) -> dict:
+        """ The prices of each place id, sorted by month as in the file """
+        return self._get('precios', self.precios_path, self._load_precios)
+
+    def precios_of(self, place_id) -> pd.DataFrame:
+        """ The prices of the place, empty when the place has none """
+        precios = self.precios()
+        df = precios.get(place_id)
+        return df if df is not None else self.precios_empty
+
+    def _load_precios(self) -> dict:
+        precios = pd.read_csv(self.precios_path)
+        precios['mes'] = pd.to_datetime(precios['mes'])
+        self.precios_empty = precios.iloc[0:0]
+        return {place_id: df for place_id, df in precios.groupby('id', sort=False)}
+
+    @staticmethod
+    def get_indicadores_lookup(indicadores: pd.DataFrame) -> dict:
+        """
+        Indicators of each place, merged as set_indicadores would merge its rows in tipo order:
+        each column keeps the value of the first row where it is not None.
+
+        Returns:
+            dict: The merged indicators by place name.
+        """
+        lookup = dict()
+        for row in indicadores.sort_values(by='tipo', ascending=True, kind='stable').to_dict('records'):
+            merged = lookup.setdefault(row['nombre'], dict())
+            for key, value in row.items():
+                if merged.get(key) is None:
+                    merged[key] = value
+        return lookup
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'loaded': list(self.entries)}
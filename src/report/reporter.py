@@ -19,7 +19,9 @@ from jinja2 import Environment, FileSystemLoader
 sys.path.append('src')
 sys.path.append('src/report')
 from realty_report import RealtyReport
+from reference_data import ReferenceDataCache
 from realty import Realty
+from sqlite_store import SqliteStore
 import base64
 from io import BytesIO
 import io
@@ -29,7 +31,7 @@ class Reporter:
 
     def __init__(self, template_path: Path = Path('src/report/report_template3.html'), output_dir: Path = Path('local/reports/'),
                  precios_path: Path = Path('local/datasets/gen_precios.csv'), indicadores_path: Path = Path('local/datasets/gen_indicadores.csv'),
-                 reports_path: Path = Path('local/datasets/gen_informe.csv'), cache_dir: Path = Path('local/cache/')):
+                 reports_path: Path = Path('local/datasets/gen_informe.csv'), cache_dir: Path = Path('local/cache/'), store: SqliteStore = None):
 
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info('Init')
@@ -41,6 +43,8 @@ class Reporter:
         self.precios_path = precios_path
         self.indicadores_path = indicadores_path
         self.reports_path = reports_path
+        # when a SqliteStore is given the realties and reports are read and written there instead of the CSV files
+        self.store = store
         self.output_dir = output_dir 
         # Create output directory if it doesn't exist
         # os.makedirs(output_dir, exist_ok=True)
@@ -53,37 +57,72 @@ class Reporter:
         self.cache_dir = cache_dir
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir, exist_ok=True)
+        # the indicators and prices are loaded once per process and reloaded when their files change
+        self.reference_data = ReferenceDataCache.shared(self.indicadores_path, self.precios_path)
 
     def get_pending_realies(self, realty_datafile_path: Path = Path('local/datasets/realties.csv')) -> [Realty] :
-        realties = pd.read_csv(realty_datafile_path)
+        pending = self.get_pending_frame(realty_datafile_path)
+        return [Realty(**e.to_dict()) for i, e in pending.iterrows()]
+
+    def get_pending_listings(self, realty_datafile_path: Path = Path('local/datasets/realties.csv')) -> pd.DataFrame:
+        """ The pending realties normalized column-wise by Realty.normalize_frame, ready for compute_top_reports """
+        return Realty.normalize_frame(self.get_pending_frame(realty_datafile_path))
+
+    def get_pending_frame(self, realty_datafile_path: Path = Path('local/datasets/realties.csv')) -> pd.DataFrame:
+        if self.store is not None:
+            return self.store.pending_realties()
+
+        # the updates of a realty are appended to the csv as new versions of its row
+        realties = pd.read_csv(realty_datafile_path).groupby('link', sort=False).last().reset_index()
         reports = pd.read_csv(self.reports_path)
         realties = realties.set_index('link')
         reports = reports.set_index('link')
         # obtiene las realties cuya columna link no está en la columna link de los reportes
         pending = realties[~realties.index.isin(reports.index)]
-        pending = [Realty(**e.to_dict()) for i, e in pending.reset_index().iterrows()]
-        return pending
+        return pending.reset_index()
 
-    def compute_reports(self, realties: list[Realty] | Realty):
+    def compute_reports(self, realties: list[Realty] | Realty | pd.DataFrame):
 
+        listings = Reporter.get_listings(realties)
+        return Reporter.build_reports(listings, self.compute_report_frame(listings))
+
+    @staticmethod
+    def get_listings(realties: list[Realty] | Realty | pd.DataFrame) -> pd.DataFrame:
+        """ The fields of the realties as a DataFrame with a column per Realty field, the listings of normalize_frame as they are """
+        if isinstance(realties, pd.DataFrame): return realties
         realties = realties if isinstance(realties, list) else [realties]
-        indicadores = pd.read_csv(self.indicadores_path)
-        places = indicadores['nombre'].unique().tolist()
-        reports = list()
-        for realty in realties:
-            # try:
-                realty_report = RealtyReport(**realty.to_dict())
-                realty_report.match_place(places)
-                realty_indicadores = indicadores[indicadores['nombre'] == realty_report.barrio].sort_values(by='tipo', ascending=True)
-                for index, row in realty_indicadores.iterrows():
-                    realty_report.set_indicadores(**row.to_dict())
-
-                reports.append(realty_report)
-
-            # except Exception as e:
-            #     self.logger.error(e, realty, exc_info=True)
-        
-        return reports
+        return pd.DataFrame([realty.to_dict() for realty in realties], columns=list(Realty().to_dict()))
+
+    def compute_report_frame(self, listings: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scores all the listings at once: the listings are cleaned as RealtyReport does, matched to a
+        place with the place index, joined with the merged indicators of their place and scored
+        column-wise by RealtyReport.score_frame.
+
+        Args:
+            listings (DataFrame): The listings, with a column per Realty field.
+
+        Returns:
+            DataFrame: The reports, a row per listing and a column per RealtyReport.to_dict key.
+        """
+        df = RealtyReport.normalize_frame(listings)
+        places = self.reference_data.place_index()
+        matches = [RealtyReport.find_place(address, town, places) for address, town in zip(df['address'], df['town'])]
+        df['barrio'] = [match[0] if match is not None else None for match in matches]
+        df['barrio_ratio'] = [match[1] if match is not None else None for match in matches]
+        indicadores = self.reference_data.indicadores_frame()
+        df = df.join(indicadores[[column for column in indicadores.columns if column not in df.columns]], on='barrio')
+        df = RealtyReport.score_frame(df)
+        self.logger.info(f'Place index stats: {places.stats()}, reference data stats: {self.reference_data.stats()}')
+        return df.reindex(columns=RealtyReport.columns())
+
+    @staticmethod
+    def build_reports(listings: pd.DataFrame, reports_df: pd.DataFrame) -> list[RealtyReport]:
+        """ The RealtyReport objects of the rows of the report frame, in its order """
+        listings = listings.loc[reports_df.index]
+        listings = listings.astype(object).where(listings.notna(), None).to_dict('records')
+        rows = reports_df.astype(object).where(reports_df.notna(), None).to_dict('records')
+        return [RealtyReport.from_frame(listing, row) for listing, row in zip(listings, rows)]
 
     def stars_to_emoji(self, stars):
         if isinstance(stars, (int, float)):
@@ -302,13 +341,11 @@ class Reporter:
     def render_report_content(self, realty_report: RealtyReport):
 
         logo_base64 = Reporter.get_base64_file('public/images/logo.png')
-        bcn_precios = pd.read_csv(self.precios_path)
-        bcn_precios['mes'] = pd.to_datetime(bcn_precios['mes'])
-        df = bcn_precios[bcn_precios['id'] == realty_report.id]
+        df = self.reference_data.precios_of(realty_report.id)
         histograma_barrio = self.plot_dual_axis(df, 'mes', 'precio_alquiler', 'precio_venta', f"{df['tipo'].iloc[0]} de {df['nombre'].iloc[0]}")
-        df = bcn_precios[bcn_precios['id'] == realty_report.sup_id]
+        df = self.reference_data.precios_of(realty_report.sup_id)
         histograma_distrito = self.plot_dual_axis(df, 'mes', 'precio_alquiler', 'precio_venta', f"{df['tipo'].iloc[0]} de {df['nombre'].iloc[0]}")
-        df = bcn_precios[bcn_precios['id'] == 80000]
+        df = self.reference_data.precios_of(80000)
         histograma_municipio = self.plot_dual_axis(df, 'mes', 'precio_alquiler', 'precio_venta', f"{df['tipo'].iloc[0]} de {df['nombre'].iloc[0]}")
         retabilidad_5a = self.plot_cuadro_rentabilidad(
             inversion_precio=realty_report.price, 
@@ -413,18 +450,25 @@ class Reporter:
         finally:
             driver.quit()
 
-    def store_reports(self, new_reports: list[RealtyReport]):
+    def store_reports(self, new_reports: list[RealtyReport] | pd.DataFrame):
 
         if new_reports is None or len(new_reports) == 0:
             self.logger.warning(f"No new reports to store")
             return
-        # Convert the list of RealtyReport objects to a DataFrame
-        new_reports_dicts = [report.to_dict() for report in new_reports]
-        new_reports_df = pd.DataFrame(new_reports_dicts)
+        # Convert the list of RealtyReport objects to a DataFrame, the report frame is stored as is
+        if isinstance(new_reports, pd.DataFrame):
+            new_reports_df = new_reports
+        else:
+            new_reports_dicts = [report.to_dict() for report in new_reports]
+            new_reports_df = pd.DataFrame(new_reports_dicts)
         
         new_reports_df = new_reports_df.set_index('link')
         # Ensure there are no duplicate 'link' values before setting the index
         new_reports_df = new_reports_df[~new_reports_df.index.duplicated(keep='last')]
+
+        if self.store is not None:
+            self.store.upsert_reports(new_reports_df.reset_index())
+            return
         
         # Load existing reports or initialize an empty DataFrame
         if os.path.exists(self.reports_path):
@@ -445,19 +489,17 @@ class Reporter:
         combined_df.to_csv(self.reports_path, index=False)
         self.logger.info(f"{combined_df.shape[0]} Reports saved to {self.reports_path}")
 
-    def compute_top_reports(self, realties: list[Realty] | Realty, top_n: int = 10, top_field: str = 'global_score_stars', dry_run=False) -> list[RealtyReport]:
-        realties = realties if isinstance(realties, list) else [realties]
-        reports = self.compute_reports(realties)
-        self.logger.info(f"{len(reports)} Reports computed")
-        if not dry_run: self.store_reports(reports)
-        reports = [report for report in reports if getattr(report, top_field) is not None]
-        reports.sort(key=lambda report: getattr(report, top_field), reverse=True)
-        reports = reports[:top_n]
-        return reports
-
-    def run_on(self, realties: list[Realty] | Realty, top_n: int = 10, top_field: str = 'global_score_stars'):
+    def compute_top_reports(self, realties: list[Realty] | Realty | pd.DataFrame, top_n: int = 10, top_field: str = 'global_score_stars', dry_run=False) -> list[RealtyReport]:
+        listings = Reporter.get_listings(realties)
+        reports_df = self.compute_report_frame(listings)
+        self.logger.info(f"{len(reports_df)} Reports computed")
+        if not dry_run: self.store_reports(reports_df)
+        # only the reports to render are built, the ties keep the order of the realties
+        top_df = reports_df[reports_df[top_field].notna()].sort_values(by=top_field, ascending=False, kind='stable').head(top_n)
+        return Reporter.build_reports(listings, top_df)
+
+    def run_on(self, realties: list[Realty] | Realty | pd.DataFrame, top_n: int = 10, top_field: str = 'global_score_stars'):
         try:
-            realties = realties if isinstance(realties, list) else [realties]
             reports = self.compute_top_reports(realties, top_n=top_n, top_field=top_field)
             for realtie_report in reports:     
                 self.generate_report_file(realtie_report)
@@ -467,9 +509,8 @@ class Reporter:
     def run(self, realty_datafile_path: Path = Path('local/datasets/realties.csv'), top_n: int = 10, top_field: str = 'global_score_stars'):
         try:
             self.logger.info(f"Generating reports for {realty_datafile_path}")
-            realties = pd.read_csv(realty_datafile_path)
-            realties = [Realty(**e.to_dict()) for i, e in realties.iterrows()]
-            self.run_on(realties, top_n=top_n, top_field=top_field)
+            listings = Realty.normalize_frame(pd.read_csv(realty_datafile_path).groupby('link', sort=False).last().reset_index())
+            self.run_on(listings, top_n=top_n, top_field=top_field)
         except Exception as e:
             self.logger.error(e, exc_info=True)
 
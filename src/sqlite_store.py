@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import logging
+from pathlib import Path
+import pandas as pd
+
+class SqliteStore:
+
+    TABLE_KEYS = {'realties': 'link', 'reports': 'link'}
+
+    def __init__(self, db_path: Path = Path('local/datasets/realadvisor.db')):
+        '''
+        SQLite storage backend for realties, reports and provider specs
+
+        Realties and reports are keyed by an indexed link column and upserted in a single
+        transaction, the columns are added on demand as new fields are scraped or computed.
+        Pending realties are obtained with a query instead of loading both tables.
+
+        Parameters
+        ----------
+        db_path : Path
+            path of the SQLite database file
+        '''
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Init')
+
+        self.db_path = Path(db_path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.columns = dict()
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS realties (link TEXT PRIMARY KEY)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS reports (link TEXT PRIMARY KEY)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS web_specs (provider TEXT, type TEXT, scope TEXT, name TEXT, value TEXT, options TEXT)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS web_specs_provider ON web_specs (provider)')
+
+    def _get_columns(self, table) -> list:
+        if table not in self.columns:
+            self.columns[table] = [row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')]
+        return self.columns[table]
+
+    def _ensure_columns(self, table, columns):
+        for column in columns:
+            if column not in self._get_columns(table):
+                self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}"')
+                self.columns[table].append(column)
+
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> list:
+        """ Converts the rows to tuples of sqlite types, lists and timestamps are stored as text like in the CSV files """
+        def to_sql_value(value):
+            if isinstance(value, (list, tuple, dict)):
+                return str(value)
+            if pd.isna(value):
+                return None
+            if hasattr(value, 'isoformat'):
+                return str(value)
+            return value.item() if hasattr(value, 'item') else value
+        return [tuple(to_sql_value(v) for v in row) for row in df.itertuples(index=False, name=None)]
+
+    def _upsert(self, table, df: pd.DataFrame, update=True):
+        key = SqliteStore.TABLE_KEYS[table]
+        df = df.drop_duplicates(subset=key, keep='last')
+        self._ensure_columns(table, df.columns)
+        columns = ', '.join(f'"{c}"' for c in df.columns)
+        values = ', '.join('?' for c in df.columns)
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in df.columns if c != key)
+        conflict = f'DO UPDATE SET {updates}' if update and updates else 'DO NOTHING'
+        self.conn.executemany(f'INSERT INTO "{table}" ({columns}) VALUES ({values}) ON CONFLICT("{key}") {conflict}',
+            SqliteStore._to_records(df))
+
+    def _existing_links(self, table, links, where: str = '') -> set:
+        links = list(links)
+        existing = set()
+        # sqlite limits the number of parameters of a query
+        for i in range(0, len(links), 500):
+            chunk = links[i:i + 500]
+            query = f'SELECT link FROM "{table}" WHERE link IN ({", ".join("?" for l in chunk)}){where}'
+            existing.update(row[0] for row in self.conn.execute(query, chunk))
+        return existing
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM realties').fetchone()[0]
+
+    def contains(self, link) -> bool:
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM realties WHERE link = ?', (link,)).fetchone() is not None
+
+    def store_page(self, page_df: pd.DataFrame):
+        """
+        Inserts the realties of a page that are not stored yet, same contract as RealtyStore.store_page.
+
+        Returns:
+            tuple: The DataFrame of added realties and whether the page had stored realties.
+        """
+        with self.lock, self.conn:
+            existing = self._existing_links('realties', page_df['link'])
+            repetidos = page_df['link'].isin(existing)
+            new_df = page_df[~repetidos].drop_duplicates(subset='link')
+            if not new_df.empty:
+                self._upsert('realties', new_df, update=False)
+        return new_df, bool(repetidos.any())
+
+    def upsert_realties(self, df: pd.DataFrame):
+        with self.lock, self.conn:
+            self._upsert('realties', df)
+
+    def enriched_links(self, links) -> set:
+        """ Links of the realties already enriched with the fields of their detail page """
+        with self.lock:
+            if 'enriched_at' not in self._get_columns('realties'): return set()
+            return self._existing_links('realties', links, ' AND enriched_at IS NOT NULL')
+
+    def upsert_reports(self, df: pd.DataFrame):
+        with self.lock, self.conn:
+            self._upsert('reports', df)
+        self.logger.info(f"{len(df)} Reports saved to {self.db_path}")
+
+    def compact(self):
+        """ Upserts never duplicate rows, compacting only reclaims the free pages of the file """
+        with self.lock:
+            self.conn.execute('VACUUM')
+
+    def read_all(self) -> pd.DataFrame:
+        with self.lock:
+            return pd.read_sql_query('SELECT * FROM realties', self.conn)
+
+    def read_reports(self) -> pd.DataFrame:
+        with self.lock:
+            return pd.read_sql_query('SELECT * FROM reports', self.conn)
+
+    def pending_realties(self) -> pd.DataFrame:
+        """ Realties without a report """
+        with self.lock:
+            return pd.read_sql_query('SELECT r.* FROM realties r WHERE NOT EXISTS (SELECT 1 FROM reports p WHERE p.link = r.link)', self.conn)
+
+    def read_web_specs(self) -> pd.DataFrame:
+        with self.lock:
+            return pd.read_sql_query('SELECT provider, type, scope, name, value, options FROM web_specs', self.conn)
+
+    def replace_web_specs(self, df: pd.DataFrame):
+        columns = ['provider', 'type', 'scope', 'name', 'value', 'options']
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM web_specs')
+            self.conn.executemany('INSERT INTO web_specs VALUES (?, ?, ?, ?, ?, ?)', SqliteStore._to_records(df.reindex(columns=columns)))
+
+    def migrate_from_csv(self, realty_datafile_path: Path = None, reports_path: Path = None, webs_specs_datafile_path: Path = None):
+        """
+        One-shot import of the CSV files, existing rows with the same link are updated.
+        """
+        if realty_datafile_path and Path(realty_datafile_path).exists():
+            # the versions of each realty appended by RealtyStore are merged, keeping the last non empty values
+            realties = pd.read_csv(realty_datafile_path).groupby('link', sort=False).last().reset_index()
+            self.upsert_realties(realties)
+            self.logger.info(f'{len(realties)} realties migrated from {realty_datafile_path}')
+        if reports_path and Path(reports_path).exists():
+            reports = pd.read_csv(reports_path)
+            self.upsert_reports(reports)
+            self.logger.info(f'{len(reports)} reports migrated from {reports_path}')
+        if webs_specs_datafile_path and Path(webs_specs_datafile_path).exists():
+            web_specs = pd.read_csv(webs_specs_datafile_path)
+            self.replace_web_specs(web_specs)
+            self.logger.info(f'{len(web_specs)} web specs migrated from {webs_specs_datafile_path}')
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,126 @@
+import unittest
+import sys
+import re
+sys.path.append('src/crawler')
+from browser_pool import BrowserPool
+from scraper import Scraper
+
+class FakeHeaders(dict):
+    ''' seleniumwire headers ignore the deletion of missing keys '''
+
+    def __delitem__(self, key):
+        self.pop(key, None)
+
+class FakeRequest:
+    ''' seleniumwire request with the attributes used by the block rules '''
+
+    def __init__(self, url, accept='*/*'):
+        self.url = url
+        self.path = url.split('://')[-1].split('/', 1)[-1]
+        self.headers = FakeHeaders({'Accept': accept})
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+class FakeDriver:
+    ''' WebDriver that loads a fixed page source '''
+
+    def __init__(self, page_source, fail=False):
+        self.page_source = page_source
+        self.fail = fail
+        self.loaded = []
+        self.quitted = False
+        self.request_interceptor = None
+
+    @property
+    def requests(self):
+        return []
+
+    @requests.deleter
+    def requests(self):
+        pass
+
+    def __delattr__(self, name):
+        # seleniumwire removes the interceptor by setting it to None
+        if name == 'request_interceptor': self.request_interceptor = None
+        else: super().__delattr__(name)
+
+    def get(self, url):
+        if self.fail: raise RuntimeError('browser crashed')
+        self.loaded.append(url)
+
+    def execute_script(self, script):
+        return 'complete'
+
+    def quit(self):
+        self.quitted = True
+
+class FakeBrowserPool(BrowserPool):
+
+    def __init__(self, page_source, **kwargs):
+        super().__init__(**kwargs)
+        self.page_source = page_source
+        self.drivers = []
+        self.fail_next = False
+
+    def _new_driver(self, browser):
+        driver = FakeDriver(self.page_source, self.fail_next)
+        self.drivers.append(driver)
+        return driver
+
+class TestBrowserPool(unittest.TestCase):
+
+    def test_reuse_and_recycle(self):
+        pool = FakeBrowserPool('<html>ok</html>', pool_size=1, max_pages=2)
+        self.assertEqual(pool.get('https://example.com/1'), '<html>ok</html>')
+        pool.get('https://example.com/2')
+        self.assertEqual(len(pool.drivers), 1)
+        self.assertEqual(pool.drivers[0].loaded, ['https://example.com/1', 'https://example.com/2'])
+        # recycled after max_pages
+        self.assertTrue(pool.drivers[0].quitted)
+        pool.get('https://example.com/3')
+        self.assertEqual(pool.stats()['browsers_started'], 2)
+        pool.close()
+        self.assertTrue(pool.drivers[1].quitted)
+
+    def test_failed_browser_is_quit(self):
+        pool = FakeBrowserPool('<html>ok</html>', pool_size=1, max_pages=10)
+        pool.fail_next = True
+        with self.assertRaises(RuntimeError):
+            pool.get('https://example.com/1')
+        self.assertTrue(pool.drivers[0].quitted)
+        pool.fail_next = False
+        self.assertEqual(pool.get('https://example.com/1'), '<html>ok</html>')
+
+    def test_interceptor_reset(self):
+        pool = FakeBrowserPool('<html>ok</html>', pool_size=1, max_pages=10)
+        interceptor = lambda request: request.abort()
+        pool.get('https://example.com/1', interceptor=interceptor)
+        self.assertIsNone(pool.drivers[0].request_interceptor)
+        pool.get('https://example.com/2')
+        self.assertEqual(len(pool.drivers), 1)
+        self.assertIsNone(pool.drivers[0].request_interceptor)
+
+    def test_ready_regex_timeout(self):
+        pool = FakeBrowserPool('<html>loading</html>', load_timeout=0.1)
+        pool.get('https://example.com/1', ready_rx=re.compile('__INITIAL_PROPS__'))
+        self.assertEqual(pool.stats()['load_timeouts'], 1)
+        pool.get('https://example.com/1', ready_rx=re.compile('loading'))
+        self.assertEqual(pool.stats()['load_timeouts'], 1)
+
+    def test_block_rules(self):
+        self.assertEqual(BrowserPool.resource_type(FakeRequest('https://static.fotocasa.es/img/1.jpg?w=300')), 'image')
+        self.assertEqual(BrowserPool.resource_type(FakeRequest('https://www.fotocasa.es/fonts/a.woff2')), 'font')
+        self.assertEqual(BrowserPool.resource_type(FakeRequest('https://www.fotocasa.es/es/comprar', 'text/html,*/*')), 'document')
+
+        scraper = Scraper(url='https://www.fotocasa.es/es/comprar', block_rules=[('resource', re.compile('image|font')), ('url', re.compile('googletagmanager'))])
+        requests = [FakeRequest('https://static.fotocasa.es/img/1.jpg'), FakeRequest('https://www.googletagmanager.com/gtm.js'),
+            FakeRequest('https://www.fotocasa.es/es/comprar', 'text/html')]
+        for request in requests:
+            scraper.selenium_interceptor(request)
+        self.assertEqual([r.aborted for r in requests], [True, True, False])
+        self.assertEqual(scraper.blocked_requests, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import os
+import sys
+import time
+import socket
+import subprocess
+import tempfile
+from pathlib import Path
+sys.path.append('src/crawler')
+from crawl_frontier import CrawlFrontier
+
+class TestCrawlFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / 'frontier.db'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume_after_crash(self):
+        frontier = CrawlFrontier(self.db_path, lease_timeout=0.05)
+        self.assertEqual(frontier.start('fotocasa', 'https://a.local/1'), 'https://a.local/1')
+        self.assertTrue(frontier.checkpoint('fotocasa', 'https://a.local/1', 'https://a.local/2'))
+        self.assertTrue(frontier.checkpoint('fotocasa', 'https://a.local/2', 'https://a.local/3'))
+        frontier.close()
+
+        # the process died while crawling the third page, another host keeps its lease until it expires
+        frontier = CrawlFrontier(self.db_path, lease_timeout=0.05, owner='other-host:1')
+        self.assertIsNone(frontier.start('fotocasa', 'https://a.local/1'))
+        self.assertEqual(frontier.recover(), 0)
+        time.sleep(0.1)
+        self.assertEqual(frontier.recover(), 1)
+        self.assertEqual(frontier.start('fotocasa', 'https://a.local/1'), 'https://a.local/3')
+        self.assertFalse(frontier.checkpoint('fotocasa', 'https://a.local/3', None))
+        frontier.finish('fotocasa')
+        self.assertEqual(frontier.start('fotocasa', 'https://a.local/1'), 'https://a.local/1')
+
+    def test_restart_takes_back_lease(self):
+        # a process of this host that is not running anymore
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        frontier = CrawlFrontier(self.db_path, owner=f'{socket.gethostname()}:{process.pid}')
+        frontier.start('fotocasa', 'https://a.local/1')
+        frontier.checkpoint('fotocasa', 'https://a.local/1', 'https://a.local/2')
+        frontier.add('fotocasa', ['https://a.local/d1'])
+        frontier.lease()
+        frontier.close()
+
+        # the restarted crawl goes on at once instead of waiting for lease_timeout
+        frontier = CrawlFrontier(self.db_path)
+        self.assertEqual(frontier.start('fotocasa', 'https://a.local/1'), 'https://a.local/2')
+        self.assertEqual(frontier.recover(), 1)
+        self.assertEqual(frontier.lease(), ['https://a.local/d1'])
+        # the same process takes back its own lease
+        self.assertEqual(frontier.start('fotocasa', 'https://a.local/1'), 'https://a.local/2')
+        self.assertIsNone(CrawlFrontier(self.db_path, owner=f'{socket.gethostname()}:{os.getppid()}').start('fotocasa', 'https://a.local/1'))
+
+    def test_renew(self):
+        frontier = CrawlFrontier(self.db_path, lease_timeout=0.05)
+        frontier.start('fotocasa', 'https://a.local/1')
+        time.sleep(0.1)
+        self.assertTrue(frontier.renew('https://a.local/1'))
+        self.assertEqual(frontier.recover(), 0)
+        other = CrawlFrontier(self.db_path, lease_timeout=0.05, owner='other-host:1')
+        self.assertIsNone(other.start('fotocasa', 'https://a.local/1'))
+        self.assertFalse(other.renew('https://a.local/1'))
+
+    def test_next_page_already_done(self):
+        frontier = CrawlFrontier(self.db_path)
+        frontier.start('fotocasa', 'https://a.local/1')
+        frontier.checkpoint('fotocasa', 'https://a.local/1', 'https://a.local/2')
+        self.assertFalse(frontier.checkpoint('fotocasa', 'https://a.local/2', 'https://a.local/1'))
+
+    def test_items_lease(self):
+        frontier = CrawlFrontier(self.db_path, lease_timeout=0.05)
+        frontier.add('fotocasa', ['https://a.local/d1', 'https://a.local/d2'])
+        self.assertEqual(frontier.lease(), ['https://a.local/d1', 'https://a.local/d2'])
+        self.assertEqual(frontier.lease(), [])
+        time.sleep(0.1)
+        # the lease of a crawl that did not complete the urls expired
+        self.assertEqual(frontier.lease(limit=1), ['https://a.local/d1'])
+        frontier.discard(['https://a.local/d1'])
+        frontier.fail(['https://a.local/d2'])
+        self.assertEqual(frontier.stats(), {'item_failed': 1})
+
+    def test_prune_failed(self):
+        frontier = CrawlFrontier(self.db_path, failed_retention=0.05)
+        frontier.add('fotocasa', ['https://a.local/d1'])
+        frontier.fail(frontier.lease())
+        self.assertEqual(frontier.prune(), 0)
+        time.sleep(0.1)
+        self.assertEqual(frontier.prune(), 1)
+        self.assertEqual(frontier.stats(), {})
+
+if __name__ == '__main__':
+    unittest.main()
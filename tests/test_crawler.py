@@ -1,9 +1,34 @@
 import unittest
 import sys
+import os
+import time
+import shutil
+import threading
+import tempfile
+import requests
+import pandas as pd
 sys.path.append('src/crawler')
 from crawler import Crawler
+from realty_store import RealtyStore
+from crawl_frontier import CrawlFrontier
+from fetcher import AsyncFetcher
+from page_cache import PageCache
 from pathlib import Path
 
+class PagesPool:
+    ''' Session pool that serves the body of each url and records the requested urls '''
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requested_urls = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requested_urls.append(url)
+        response = requests.Response()
+        response.status_code = 200 if url in self.bodies else 404
+        response._content = self.bodies.get(url, b'')
+        return response
+
 class TestCrawler(unittest.TestCase):
 
     def setUp(self):
@@ -16,6 +41,229 @@ class TestCrawler(unittest.TestCase):
         anitem = anitem[0]        
         self.assertEqual(anitem['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d')
 
+    def test_block_rules(self):
+
+        crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None)
+        block_rules = crawler.get_block_rules(crawler.web_specs, 'fotocasa')
+        self.assertEqual([scope for scope, rx in block_rules], ['resource', 'url'])
+        self.assertEqual(crawler.get_block_rules(crawler.web_specs, 'idealista'), [])
+
+    def test_abort_specs(self):
+
+        crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None)
+        self.assertEqual(crawler.get_limit(crawler.web_specs, 'fotocasa', 'max_bytes'), 5000000)
+        self.assertIsNone(crawler.get_limit(crawler.web_specs, 'idealista', 'max_bytes'))
+        abort = crawler.get_dict_rx(crawler.web_specs, 'fotocasa', 'abort')
+        self.assertIsNotNone(abort['captcha'].search('<script src="https://ct.captcha-delivery.com/c.js">'))
+
+    def test_run_isolates_providers(self):
+
+        class SlowCrawler(Crawler):
+            def crawl_provider(self, provider, dry_run=False):
+                time.sleep(0.2)
+                if provider == 'idealista': raise ValueError('site down')
+                return pd.DataFrame([{'link': f'https://{provider}/1'}])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            specs_path = Path(tmp_dir) / 'webs_specs.csv'
+            shutil.copy('tests/webs_specs.example.csv', specs_path)
+            with open(specs_path, 'a') as f:
+                f.write('idealista,url,global,base_url,https://www.idealista.com/,\n')
+            crawler = SlowCrawler(webs_specs_datafile_path = specs_path, realty_datafile_path = None, cache_dir = None, cache_expires=None)
+            start = time.perf_counter()
+            scraped_items = crawler.run()
+            # the providers are crawled at the same time and the failing one is skipped
+            self.assertLess(time.perf_counter() - start, 0.35)
+            self.assertEqual(scraped_items['link'].tolist(), ['https://fotocasa/1'])
+
+    def test_enrich(self):
+
+        class FakeCrawler(Crawler):
+            def crawl_items(self, provider, urls):
+                self.crawled += urls
+                return [{'link': None, 'created': '2025-01-01', 'description': f'Piso {url[-2]}'} if '9' not in url else None for url in urls]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = RealtyStore(Path(tmp_dir) / 'realties.csv')
+            store.store_page(pd.DataFrame([{'link': f'https://www.fotocasa.es/es/{i}/', 'created': '2024-01-01'} for i in (1, 2)]))
+            crawler = FakeCrawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None, store=store)
+            crawler.crawled = []
+            links = ['https://www.fotocasa.es/es/2/', 'https://www.fotocasa.es/es/1/', 'https://www.fotocasa.es/es/2/', 'https://www.fotocasa.es/es/9/', 'https://www.unknown.es/es/3/']
+            enriched = crawler.enrich(links)
+            # duplicated and unknown provider links are skipped, the failed ones are not stored
+            self.assertEqual(crawler.crawled, ['https://www.fotocasa.es/es/2/', 'https://www.fotocasa.es/es/1/', 'https://www.fotocasa.es/es/9/'])
+            self.assertEqual(enriched['link'].tolist(), ['https://www.fotocasa.es/es/2/', 'https://www.fotocasa.es/es/1/'])
+            df = store.read_all()
+            self.assertEqual(df['description'].tolist(), ['Piso 1', 'Piso 2'])
+            self.assertEqual(df['created'].tolist(), ['2024-01-01', '2024-01-01'])
+
+            # the enriched links are not crawled again
+            crawler.crawled = []
+            crawler.enrich(links)
+            self.assertEqual(crawler.crawled, ['https://www.fotocasa.es/es/9/'])
+
+            # the links left in the frontier by an interrupted enrichment are discarded when they are not crawled
+            frontier = CrawlFrontier(Path(tmp_dir) / 'frontier.db')
+            frontier.add('fotocasa', ['https://www.fotocasa.es/es/1/', 'https://www.unknown.es/es/3/'])
+            crawler.frontier = frontier
+            crawler.crawled = []
+            crawler.enrich([])
+            self.assertEqual(crawler.crawled, [])
+            self.assertEqual(frontier.stats(), {})
+
+    def test_crawl_items_with_fetcher(self):
+
+        with open('tests/fotocasa_detalle.html', 'rb') as f:
+            body = f.read()
+        urls = ['https://www.fotocasa.es/es/1/d', 'https://www.fotocasa.es/es/2/d']
+        pool = PagesPool({urls[0]: body})
+        fetcher = AsyncFetcher(max_concurrency=2, delay_seconds=0, session_pool=pool)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = tmp_dir, cache_expires=60,
+                fetcher=fetcher, session_pool=pool)
+            self.assertEqual(crawler.crawl_items('fotocasa', []), [])
+            items = crawler.crawl_items('fotocasa', urls)
+            self.assertEqual(items[0]['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d')
+            self.assertIsNone(items[1])
+
+            # the fetched pages are cached, only the failed one is requested again
+            pool.requested_urls = []
+            self.assertEqual(crawler.crawl_items('fotocasa', urls), items)
+            self.assertEqual(pool.requested_urls, [urls[1]])
+        fetcher.close()
+
+    def test_crawl_items_politeness(self):
+
+        class CountingCrawler(Crawler):
+            # records the most requests in flight at the same time
+            def _fetch_item(self, provider, url):
+                with self.lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                time.sleep(0.05)
+                with self.lock:
+                    self.in_flight -= 1
+                return {'link': url}
+
+        crawler = CountingCrawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None, enrich_concurrency=4)
+        crawler.lock, crawler.in_flight, crawler.max_in_flight = threading.Lock(), 0, 0
+        urls = [f'https://www.fotocasa.es/es/{i}/d' for i in range(4)]
+        # without fetcher nor host scheduler the host is not hit by several threads at once
+        self.assertEqual([item['link'] for item in crawler.crawl_items('fotocasa', urls)], urls)
+        self.assertEqual(crawler.max_in_flight, 1)
+
+    def test_crawl_items_zero_copy(self):
+
+        with open('tests/fotocasa_detalle.html', 'rb') as f:
+            body = f.read()
+        urls = ['https://www.fotocasa.es/es/1/d', 'https://www.fotocasa.es/es/2/d']
+        pool = PagesPool({urls[0]: body, urls[1]: body.replace(b'185497469', b'185000002')})
+        fetcher = AsyncFetcher(max_concurrency=2, delay_seconds=0, session_pool=pool)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None,
+                fetcher=fetcher, session_pool=pool, page_cache=PageCache(tmp_dir, 60, compression='none'), zero_copy=True)
+            # each page is parsed from its own body, fetched or cached
+            for i in range(2):
+                items = crawler.crawl_items('fotocasa', urls)
+                self.assertEqual([item['link'] for item in items], ['https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d',
+                    'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185000002/d'])
+            self.assertEqual(len(pool.requested_urls), 2)
+        fetcher.close()
+
+    def test_compact_every(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            datafile_path = Path(tmp_dir) / 'realties.csv'
+            pd.DataFrame([{'link': 'https://www.fotocasa.es/es/1/d', 'price': price} for price in (1000, 900)]).to_csv(datafile_path, index=False)
+            crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = datafile_path, cache_dir = None, cache_expires=None, compact_every=2)
+            crawler.store.store_page(pd.DataFrame([{'link': 'https://www.fotocasa.es/es/2/d', 'price': 2000}]))
+            self.assertEqual(len(pd.read_csv(datafile_path)), 3)
+            # the second page compacts the datafile, the last version of the realty is kept
+            crawler.store.store_page(pd.DataFrame([{'link': 'https://www.fotocasa.es/es/3/d', 'price': 3000}]))
+            df = pd.read_csv(datafile_path)
+            self.assertEqual(df['link'].tolist(), ['https://www.fotocasa.es/es/1/d', 'https://www.fotocasa.es/es/2/d', 'https://www.fotocasa.es/es/3/d'])
+            self.assertEqual(df['price'].tolist(), [900, 2000, 3000])
+
+    def test_parse_pool_reload(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            specs_path = Path(tmp_dir) / 'webs_specs.csv'
+            shutil.copy('tests/webs_specs.example.csv', specs_path)
+            crawler = Crawler(webs_specs_datafile_path = specs_path, realty_datafile_path = None, cache_dir = None, cache_expires=None, parse_workers=1)
+            parse_pool = crawler.get_parse_pool('fotocasa')
+            self.assertIs(crawler.get_parse_pool('fotocasa'), parse_pool)
+
+            # the workers compiled the old specs, the pool is replaced and the old one shut down
+            with open(specs_path, 'a') as f:
+                f.write('fotocasa,regex,detail_field,title,<h1>(.+?)</h1>,\n')
+            stat = os.stat(specs_path)
+            os.utime(specs_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+            reloaded = crawler.get_parse_pool('fotocasa')
+            self.assertIsNot(reloaded, parse_pool)
+            self.assertRaises(RuntimeError, parse_pool.executor.submit, print)
+            crawler.close()
+            self.assertEqual(crawler.parse_pools, {})
+            self.assertRaises(RuntimeError, reloaded.executor.submit, print)
+
+    def test_parse_cached_without_cache(self):
+
+        crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None)
+        self.assertIsNone(crawler.page_cache)
+        self.assertTrue(crawler.parse_cached('fotocasa', ['https://www.fotocasa.es/es/comprar/viviendas/l/1']).empty)
+
+    def test_close_browser_pool(self):
+
+        class ClosingPool:
+            closed = False
+            def close(self):
+                self.closed = True
+
+        # the browser pool of the caller is shared, only the one created by the crawler is closed
+        browser_pool = ClosingPool()
+        crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None, browser_pool=browser_pool)
+        crawler.close()
+        self.assertFalse(browser_pool.closed)
+        crawler = Crawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None)
+        crawler.browser_pool = ClosingPool()
+        crawler.close()
+        self.assertTrue(crawler.browser_pool.closed)
+
+    def test_iter_provider_resumes(self):
+
+        class PagesScraper:
+            # four list pages, the crawl dies on the page fail_at
+            fail_at = 3
+            def __init__(self, url):
+                self.url = url
+            def iter_pages(self, max_pages=None, max_items=None):
+                self.completed = False
+                while self.url is not None:
+                    page = int(self.url.split('page=')[1]) if 'page=' in self.url else 1
+                    if page == PagesScraper.fail_at: raise ConnectionError('crash')
+                    self.next_url = f'https://www.fotocasa.es/es/lista?page={page + 1}' if page < 4 else None
+                    yield [{'link': f'https://www.fotocasa.es/es/{page}/d'}]
+                    self.url = self.next_url
+                self.completed = True
+
+        class PagesCrawler(Crawler):
+            def _new_scraper(self, provider, url, datafile_path=None):
+                return PagesScraper(url)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # the lease of the crawl that died is expired as soon as it is taken
+            frontier = CrawlFrontier(Path(tmp_dir) / 'frontier.db', lease_timeout=0)
+            crawler = PagesCrawler(webs_specs_datafile_path = 'tests/webs_specs.example.csv', realty_datafile_path = None, cache_dir = None, cache_expires=None, frontier=frontier)
+            pages = []
+            with self.assertRaises(ConnectionError):
+                for page in crawler.iter_provider('fotocasa'): pages.append(page)
+            self.assertEqual(len(pages), 2)
+
+            # the next run resumes at the page that failed and the one after starts again at the base url
+            PagesScraper.fail_at = None
+            frontier.recover()
+            pages = list(crawler.iter_provider('fotocasa'))
+            self.assertEqual([page['link'][0] for page in pages], ['https://www.fotocasa.es/es/3/d', 'https://www.fotocasa.es/es/4/d'])
+            self.assertEqual(len(list(crawler.iter_provider('fotocasa'))), 4)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import sys
+import re
+sys.path.append('src/crawler')
+from extraction_plan import ExtractionPlan, FieldRegex
+
+class TestExtractionPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.html = '<li>uno <b>1</b><b>2</b></li><li>dos <h1>Piso</h1><b>3</b></li>'
+        self.items_rx = re.compile(r'<li>(.+?)</li>')
+
+    def test_spans_same_as_substrings(self):
+        fields_rx = {'created': re.compile(r'(^.)'), 'numbers': re.compile(r'<b>(\d)</b>'), 'title': re.compile(r'<h1>(.+?)</h1>')}
+        plan = ExtractionPlan(fields_rx)
+        items = [plan.extract(self.html, start, end) for start, end in plan.spans(self.items_rx, self.html)]
+        self.assertEqual(items, [{'created': 'u', 'numbers': ['1', '2'], 'title': None}, {'created': 'd', 'numbers': '3', 'title': 'Piso'}])
+
+    def test_first_and_anchor(self):
+        fields_rx = {'number': FieldRegex(re.compile(r'<b>(\d)</b>'), first=True),
+            'after_title': FieldRegex(re.compile(r'<b>(\d)</b>'), anchor='<h1>', window=30)}
+        plan = ExtractionPlan(fields_rx)
+        items = [plan.extract(self.html, start, end) for start, end in plan.spans(self.items_rx, self.html)]
+        self.assertEqual(items, [{'number': '1', 'after_title': None}, {'number': '3', 'after_title': '3'}])
+
+    def test_binary_skips_cleaned_characters(self):
+        fields_rx = {'created': re.compile(r'(^.)'), 'numbers': re.compile(r'<b>(\d)</b>'), 'title': re.compile(r'<h1>(.+?)</h1>')}
+        raw = '<li>uno <b>1</b><\\b>2</b></li>\n<li>dos <h1>Pi\nso ñ</h1><b>3</b></li>'.encode('utf-8')
+        plan = ExtractionPlan(fields_rx, binary=True)
+        items = [plan.extract(raw, start, end) for start, end in plan.spans(self.items_rx, raw)]
+        self.assertEqual(items, [{'created': 'u', 'numbers': ['1', '2'], 'title': None}, {'created': 'd', 'numbers': '3', 'title': 'Piso ñ'}])
+        self.assertRaises(ValueError, ExtractionPlan, {'title': re.compile(r'[ñ]')}, True)
+
+    def test_from_options(self):
+        regex = re.compile(r'<b>(\d)</b>')
+        self.assertIs(FieldRegex.from_options(regex, 'DOTALL'), regex)
+        field_rx = FieldRegex.from_options(regex, 'DOTALL;FIRST;ANCHOR=<h1>;WINDOW=200')
+        self.assertEqual((field_rx.first, field_rx.anchor, field_rx.window), (True, '<h1>', 200))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import sys
+import time
+import asyncio
+sys.path.append('src/crawler')
+from fetcher import AsyncFetcher, TokenBucket
+
+class FakeFetcher(AsyncFetcher):
+
+    def _request(self, url, headers=None):
+        time.sleep(0.05)
+        return url
+
+class TestFetcher(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        async def take(n):
+            for i in range(n): await bucket.acquire()
+        start = time.perf_counter()
+        asyncio.run(take(3))
+        # first token is free, the other two wait 1/20 secs each
+        self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+
+    def test_get_many_keeps_order(self):
+        fetcher = FakeFetcher(max_concurrency=4, delay_seconds=0)
+        urls = [f'https://host{i}.local/page' for i in range(4)]
+        start = time.perf_counter()
+        self.assertEqual(fetcher.get_many(urls), urls)
+        # the four hosts are fetched at the same time
+        self.assertLess(time.perf_counter() - start, 0.15)
+        fetcher.close()
+
+    def test_per_host_pacing(self):
+        fetcher = FakeFetcher(max_concurrency=4, delay_seconds=0.1)
+        start = time.perf_counter()
+        fetcher.get_many(['https://a.local/1', 'https://a.local/2', 'https://b.local/1'])
+        elapsed = time.perf_counter() - start
+        # the second request to a.local waits for its bucket, b.local does not
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertLess(elapsed, 0.3)
+        fetcher.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import time
+import tempfile
+import requests
+from pathlib import Path
+from email.utils import formatdate
+sys.path.append('src/crawler')
+from host_scheduler import HostScheduler
+from scraper import Scraper
+
+class StatusPool:
+    ''' Session pool that answers the given statuses in order '''
+
+    def __init__(self, statuses, headers=None):
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.requests = 0
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests += 1
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.headers.update(self.headers)
+        response._content = b'<html>page</html>'
+        return response
+
+class TestHostScheduler(unittest.TestCase):
+
+    def test_adapts_to_latency(self):
+        scheduler = HostScheduler(delay_seconds=60, min_delay=1, latency_factor=10)
+        for i in range(100):
+            scheduler.record('a.local', 200, 0.5)
+        # the delay decreases until 10 times the latency of the host
+        self.assertAlmostEqual(scheduler.delay('a.local'), 5, places=3)
+        self.assertEqual(scheduler.delay('b.local'), 60)
+
+    def test_throttled_retry_after(self):
+        scheduler = HostScheduler(delay_seconds=10, min_delay=1)
+        scheduler.record('a.local', 429, 0.1, retry_after=120)
+        self.assertEqual(scheduler.delay('a.local'), 20)
+        self.assertGreater(scheduler.reserve('a.local'), 119)
+        self.assertEqual(scheduler.reserve('b.local'), 0)
+        self.assertEqual(scheduler.stats()['throttled'], 1)
+
+    def test_retry_after_header(self):
+        response = requests.Response()
+        response.headers['Retry-After'] = '30'
+        self.assertEqual(HostScheduler.retry_after(response), 30)
+        response.headers['Retry-After'] = formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(HostScheduler.retry_after(response), 60, delta=2)
+        response.headers['Retry-After'] = 'soon'
+        self.assertIsNone(HostScheduler.retry_after(response))
+        self.assertIsNone(HostScheduler.retry_after(None))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = Path(tmp_dir) / 'host_scheduler.json'
+            scheduler = HostScheduler(delay_seconds=60, state_path=state_path)
+            scheduler.record('a.local', 503, 0.1)
+            scheduler.save()
+            self.assertEqual(HostScheduler(delay_seconds=60, state_path=state_path).delay('a.local'), 120)
+
+    def test_scraper_retries(self):
+        scheduler = HostScheduler(delay_seconds=0, max_retries=2, backoff_base=0.01)
+        pool = StatusPool([503, 503, 200], {'Retry-After': '0'})
+        scraper = Scraper(url='https://a.local/1', delay_seconds=0, session_pool=pool, scheduler=scheduler)
+        self.assertEqual(scraper.get_response(use_cache=False).content, b'<html>page</html>')
+        self.assertEqual(pool.requests, 3)
+
+        # the last attempt is returned as a failure
+        pool.statuses = [500, 500, 500]
+        self.assertIsNone(scraper.get_response(use_cache=False))
+        self.assertEqual(pool.requests, 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import time
+import mmap
+import tempfile
+sys.path.append('src/crawler')
+from page_cache import PageCache
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open('tests/idealista_detalle.html', 'rb') as f:
+            self.body = f.read()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_get(self):
+        cache = PageCache(self.tmp_dir.name, expires=60)
+        self.assertIsNone(cache.get('https://example.com/1'))
+        entry = cache.put('https://example.com/1', self.body, etag='"abc"')
+        self.assertEqual(cache.get('https://example.com/1'), self.body)
+        self.assertLess(entry['stored_size'], entry['size'])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+        # the index is persistent
+        cache = PageCache(self.tmp_dir.name, expires=60)
+        self.assertEqual(cache.get_entry('https://example.com/1')['etag'], '"abc"')
+        self.assertEqual(cache.get('https://example.com/1'), self.body)
+
+    def test_read_buffer(self):
+        cache = PageCache(self.tmp_dir.name, expires=60, compression='none')
+        cache.put('https://example.com/1', self.body)
+        buffer = cache.read_buffer('https://example.com/1')
+        self.assertIsInstance(buffer, mmap.mmap)
+        self.assertEqual(buffer[:], self.body)
+        self.assertIsNone(cache.read_buffer('https://example.com/2'))
+
+        # compressed pages are decompressed
+        cache = PageCache(self.tmp_dir.name, expires=60)
+        cache.put('https://example.com/3', b'<html>page</html>')
+        self.assertEqual(cache.read_buffer('https://example.com/3'), b'<html>page</html>')
+
+    def test_expired(self):
+        cache = PageCache(self.tmp_dir.name, expires=0.01)
+        cache.put('https://example.com/1', self.body)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('https://example.com/1'))
+        self.assertEqual(cache.read('https://example.com/1'), self.body)
+
+    def test_dedupe_and_lru(self):
+        cache = PageCache(self.tmp_dir.name, expires=60)
+        cache.put('https://example.com/1', self.body)
+        cache.put('https://example.com/2', self.body)
+        self.assertEqual(cache.stats()['bodies'], 1)
+
+        cache.put('https://example.com/3', b'<html>other page</html>')
+        cache.get('https://example.com/1')
+        cache.get('https://example.com/2')
+        # the least recently used page is evicted when the cache grows above max_bytes
+        cache.max_bytes = cache.total_bytes() + 20
+        cache.put('https://example.com/4', b'<html>another page</html>')
+        self.assertIsNone(cache.get_entry('https://example.com/3'))
+        self.assertEqual(cache.get('https://example.com/1'), self.body)
+        self.assertLessEqual(cache.total_bytes(), cache.max_bytes)
+
+    def test_evict_expired(self):
+        cache = PageCache(self.tmp_dir.name, expires=0.05)
+        cache.put('https://example.com/1', self.body)
+        cache.put('https://example.com/2', b'<html>other page</html>')
+        time.sleep(0.06)
+        # a page stored again is not evicted by its old expiry
+        cache.put('https://example.com/2', b'<html>other page</html>')
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get_entry('https://example.com/1'))
+        self.assertIsNotNone(cache.get_entry('https://example.com/2'))
+        self.assertEqual(cache.stats()['bodies'], 1)
+
+        # the eviction state is rebuilt from the persistent index
+        time.sleep(0.06)
+        self.assertEqual(PageCache(self.tmp_dir.name, expires=0.05).evict(max_entries=1), 1)
+
+    def test_index_flush(self):
+        cache = PageCache(self.tmp_dir.name, expires=60, index_flush_seconds=60)
+        cache.put('https://example.com/1', self.body)
+        cache.put('https://example.com/2', b'<html>other page</html>')
+        # the first page writes the index, the next ones wait for the flush
+        self.assertEqual(list(PageCache(self.tmp_dir.name).index), ['https://example.com/1'])
+        cache.flush()
+        self.assertEqual(list(PageCache(self.tmp_dir.name).index), ['https://example.com/1', 'https://example.com/2'])
+
+    def test_body_removed(self):
+        cache = PageCache(self.tmp_dir.name, expires=60)
+        cache.put('https://example.com/1', self.body)
+        # the body was removed by another cache on the same directory
+        for path in cache.pages_dir.iterdir(): path.unlink()
+        self.assertIsNone(cache.get('https://example.com/1'))
+        self.assertIsNone(cache.read_buffer('https://example.com/1'))
+        self.assertIsNone(cache.get_entry('https://example.com/1'))
+
+if __name__ == '__main__':
+    unittest.main()
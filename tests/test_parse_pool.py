@@ -0,0 +1,38 @@
+import unittest
+import sys
+import queue
+import pandas as pd
+sys.path.append('src/crawler')
+from parse_pool import ParsePool
+
+class TestParsePool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ParsePool(pd.read_csv('tests/webs_specs.example.csv'), 'fotocasa', max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_parse_in_page_order(self):
+        with open('tests/fotocasa_lista.html', 'rb') as f:
+            lista = f.read()
+        with open('tests/fotocasa_detalle.html', 'rb') as f:
+            detalle = f.read()
+        pages = [('item', None, detalle), ('list', None, lista), ('item', None, b'<html></html>'), ('list', None, lista)]
+        results = list(self.pool.parse(pages))
+        self.assertEqual(results[0]['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d')
+        self.assertEqual(len(results[1]), 30)
+        self.assertIsNone(results[2]['link'])
+        self.assertEqual([item['link'] for item in results[3]], [item['link'] for item in results[1]])
+
+    def test_parse_queue(self):
+        pages_queue = queue.Queue()
+        with open('tests/fotocasa_detalle.html', 'rb') as f:
+            pages_queue.put(('item', None, f.read()))
+        pages_queue.put(None)
+        self.assertEqual(len(list(self.pool.parse_queue(pages_queue))), 1)
+
+if __name__ == '__main__':
+    unittest.main()
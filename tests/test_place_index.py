@@ -0,0 +1,34 @@
+import unittest
+import sys
+sys.path.append('src/report')
+from place_index import PlaceIndex
+from realty_report import RealtyReport
+
+class TestPlaceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.places = ['el raval', 'les corts', 'sants', 'sants  badal', 'sant andreu', 'les roquetes', 'la sagrera', 'nou barris', 'sant marti', 'barcelona', None]
+
+    def test_same_as_map_place(self):
+        index = PlaceIndex(self.places)
+        for x in ['barcelona', 'sant andreu', 'testd', 'les roquete', 'sant', 'calle de la sagrera 12', '', 'les', 'santsbadal', 'nou barris, barcelona']:
+            self.assertEqual(index.match(x), RealtyReport.map_place(x, self.places[:-1]), x)
+
+    def test_ties_keep_first_place(self):
+        # both places have the same ratio, the first one wins as in map_place
+        places = ['abcd', 'abce', 'abcf']
+        self.assertEqual(RealtyReport.map_place('abcx', places), ('abcd', 0.75, 0))
+        self.assertEqual(PlaceIndex(places).match('abcx'), ('abcd', 0.75, 0))
+
+    def test_memo(self):
+        index = PlaceIndex(self.places)
+        realty = RealtyReport(address='Les Roquetes', town='Nou Barris, Barcelona')
+        realty.match_place(index)
+        self.assertEqual((realty.barrio, realty.barrio_ratio), ('les roquetes', 1.0))
+        misses = index.stats()['misses']
+        # the address parts already matched are not matched again
+        realty.match_place(index)
+        self.assertEqual(index.stats()['misses'], misses)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import sys
+import pandas as pd
 sys.path.append('src')
 from realty import Realty
 
@@ -107,6 +108,18 @@ class TestRealty(unittest.TestCase):
         realty.price_old = 123.45
         self.assertEqual(realty._price_old, 123)
 
+    def test_normalize_frame(self):
+        rows = [Realty.get_sample_data(),
+            {'link': 'l2', 'address': 'Les Roquetes', 'town': 'Nou Barris, Barcelona', 'price': '123.456.789,01', 'price_old': '1,234', 'rooms': '3', 'surface': 80.7, 'tags': ['Terraza', 'Terraza'], 'images': "['a.jpg', 'b.jpg']"},
+            {'link': 'l3', 'address': 'Sants', 'town': 'Sants', 'price': '95.000 €', 'price_old': 'abc', 'rooms': '3.5', 'surface': None, 'tags': ' Terraza ,Ascensor ', 'agent': 1.0},
+            {'link': None, 'address': None, 'town': 'Gracia', 'price': None, 'price_old': '1234.567', 'rooms': None, 'surface': 0, 'tags': None, 'images': None}]
+        df = pd.DataFrame(rows)
+        listings = Realty.normalize_frame(df)
+        for row, listing in zip(df.to_dict('records'), listings.to_dict('records')):
+            expected = Realty(**row).to_dict()
+            for key in ('link', 'type_v', 'address', 'town', 'price', 'rooms', 'surface', 'price_old', 'tags', 'agent', 'images'):
+                self.assertEqual(listing[key], expected[key], key)
+
 
 
 if __name__ == '__main__':
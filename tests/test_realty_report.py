@@ -1,5 +1,6 @@
 import unittest
 import sys
+import pandas as pd
 sys.path.append('src/report')
 from realty_report import RealtyReport # type: ignore
 # python -m unittest tests.test_realty_report.TestRealtyReport.test_map_place
@@ -162,6 +163,30 @@ class TestRealtyReport(unittest.TestCase):
         result = RealtyReport.get_global_score_stars(precio_venta_stars, rentabilidad_10y_stars, grow_acu_venta_10y_stars, grow_acu_alquiler_10y_stars, disponibilidad)
         self.assertEqual(result, 3.6)
 
+    def test_score_frame(self):
+        df = pd.DataFrame([
+            {'price': 250000, 'surface': 80, 'disponibilidad': 'disponible', 'precio_venta_1y': 2619.8571, 'precio_alquiler_1y': 14.53, 'rentabilidad_10y_stars': 3, 'grow_acu_venta_10y_stars': 3, 'grow_acu_alquiler_10y_stars': 3},
+            {'price': 90000, 'surface': 45, 'disponibilidad': 'ocupada', 'precio_venta_1y': 4100.0, 'precio_alquiler_1y': 18.2, 'rentabilidad_10y_stars': 5, 'grow_acu_venta_10y_stars': 2, 'grow_acu_alquiler_10y_stars': 4},
+            {'price': 90000, 'surface': 0, 'disponibilidad': 'disponible', 'precio_venta_1y': 4100.0, 'precio_alquiler_1y': 18.2, 'rentabilidad_10y_stars': 5, 'grow_acu_venta_10y_stars': 2, 'grow_acu_alquiler_10y_stars': 4},
+            {'price': None, 'surface': 60, 'disponibilidad': 'alquilada', 'precio_venta_1y': 0.0, 'precio_alquiler_1y': None, 'rentabilidad_10y_stars': None, 'grow_acu_venta_10y_stars': None, 'grow_acu_alquiler_10y_stars': None},
+            {'price': 120000, 'surface': 60, 'disponibilidad': 'disponible', 'precio_venta_1y': None, 'precio_alquiler_1y': None, 'rentabilidad_10y_stars': 3, 'grow_acu_venta_10y_stars': None, 'grow_acu_alquiler_10y_stars': 3},
+        ])
+        scored = RealtyReport.score_frame(df)
+        self.assertEqual(scored['precio_venta_stars'].tolist()[4], 1)
+        for row, score in zip(df.to_dict('records'), scored.to_dict('records')):
+            # the indicators come from the csv, their missing values are NaN
+            report = RealtyReport(price=None if pd.isna(row['price']) else row['price'], surface=row['surface'])
+            report.set_indicadores(**{key: value for key, value in row.items() if key not in ('price', 'surface')})
+            for column in RealtyReport.SCORE_COLUMNS:
+                value = getattr(report, column)
+                self.assertEqual(None if pd.isna(score[column]) else score[column], None if pd.isna(value) else value, column)
+
+        # set_indicadores is not called for the listings without place
+        df['barrio'] = ['la teixonera', None, 'la teixonera', 'la teixonera', None]
+        scored = RealtyReport.score_frame(df)
+        self.assertTrue(scored.loc[[1, 4], RealtyReport.SCORE_COLUMNS].isna().all().all())
+        self.assertEqual(scored['precio_m2'].tolist()[0], 3125)
+
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
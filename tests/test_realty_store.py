@@ -0,0 +1,82 @@
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+import pandas as pd
+sys.path.append('src/crawler')
+from realty_store import RealtyStore
+
+class TestRealtyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.datafile_path = Path(self.tmp_dir.name) / 'realties.csv'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def page(self, *ids):
+        return pd.DataFrame([{'link': f'https://example.com/inmueble/{i}/', 'price': i * 1000} for i in ids])
+
+    def test_store_page_appends_new_links(self):
+        store = RealtyStore(self.datafile_path)
+        added, hay_repetidos = store.store_page(self.page(1, 2, 3))
+        self.assertEqual(len(added), 3)
+        self.assertFalse(hay_repetidos)
+
+        added, hay_repetidos = store.store_page(self.page(3, 4, 4))
+        self.assertEqual(added['link'].tolist(), ['https://example.com/inmueble/4/'])
+        self.assertTrue(hay_repetidos)
+        self.assertEqual(len(pd.read_csv(self.datafile_path)), 4)
+        self.assertTrue(store.contains('https://example.com/inmueble/2/'))
+
+    def test_upsert_realties(self):
+        store = RealtyStore(self.datafile_path)
+        store.store_page(self.page(1, 2))
+        self.assertEqual(store.enriched_links(['https://example.com/inmueble/1/']), set())
+        store.upsert_realties(pd.DataFrame([{'link': 'https://example.com/inmueble/2/', 'price': None, 'description': 'Piso', 'enriched_at': '2025-01-01'},
+            {'link': 'https://example.com/inmueble/3/', 'price': 3000, 'description': 'Ático', 'enriched_at': '2025-01-01'}]))
+        store.upsert_realties(pd.DataFrame([{'link': 'https://example.com/inmueble/1/', 'price': 900, 'description': None, 'enriched_at': '2025-01-02'}]))
+        # the updated rows are appended as new versions of the realties
+        self.assertEqual(len(pd.read_csv(self.datafile_path)), 5)
+        df = store.read_all()
+        # the empty values do not overwrite the stored ones
+        self.assertEqual(df['link'].tolist(), [f'https://example.com/inmueble/{i}/' for i in (1, 2, 3)])
+        self.assertEqual(df['price'].tolist(), [900, 2000, 3000])
+        self.assertEqual(df['description'].tolist()[1:], ['Piso', 'Ático'])
+        links = [f'https://example.com/inmueble/{i}/' for i in (1, 2, 3)]
+        self.assertEqual(store.enriched_links(links), set(links))
+        self.assertTrue(store.contains('https://example.com/inmueble/3/'))
+
+        # the enriched links are kept in the index, the compaction keeps the last version of each realty
+        self.assertEqual(RealtyStore(self.datafile_path).enriched_links(links), set(links))
+        store.compact()
+        self.assertTrue(pd.read_csv(self.datafile_path).equals(df))
+        store.index_path.unlink()
+        self.assertEqual(RealtyStore(self.datafile_path).enriched_links(links), set(links))
+
+    def test_index_is_persistent(self):
+        RealtyStore(self.datafile_path).store_page(self.page(1, 2))
+        store = RealtyStore(self.datafile_path)
+        self.assertEqual(len(store), 2)
+        self.assertTrue(store.contains('https://example.com/inmueble/1/'))
+
+        # the index is rebuilt from the datafile when missing
+        store.index_path.unlink()
+        self.assertEqual(len(RealtyStore(self.datafile_path)), 2)
+
+    def test_new_columns_and_compact(self):
+        store = RealtyStore(self.datafile_path)
+        store.store_page(self.page(1))
+        page = self.page(2)
+        page['images'] = 'https://example.com/2.jpg'
+        store.store_page(page)
+        df = pd.read_csv(self.datafile_path)
+        self.assertEqual(df.columns.tolist(), ['link', 'price', 'images'])
+
+        pd.concat([df, df.tail(1)]).to_csv(self.datafile_path, index=False)
+        store.compact()
+        self.assertEqual(len(pd.read_csv(self.datafile_path)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
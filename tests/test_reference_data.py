@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+import tempfile
+import pandas as pd
+from pathlib import Path
+sys.path.append('src/report')
+from reference_data import ReferenceDataCache
+
+class TestReferenceDataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.indicadores_path = Path(self.tmp_dir.name) / 'gen_indicadores.csv'
+        self.precios_path = Path(self.tmp_dir.name) / 'gen_precios.csv'
+        pd.DataFrame([
+            {'id': 80000, 'nombre': 'barcelona', 'tipo': 'municipi', 'precio_venta_1y': 4000.0, 'precio_alquiler_1y': 15.0},
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'districte', 'precio_venta_1y': 3000.0, 'precio_alquiler_1y': 14.0},
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'barri', 'precio_venta_1y': 2600.0, 'precio_alquiler_1y': None},
+        ]).to_csv(self.indicadores_path, index=False)
+        pd.DataFrame([
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'barri', 'mes': '2024-01-01', 'precio_venta': 2500, 'precio_alquiler': 14},
+            {'id': 80000, 'nombre': 'barcelona', 'tipo': 'municipi', 'mes': '2024-01-01', 'precio_venta': 4000, 'precio_alquiler': 15},
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'barri', 'mes': '2024-02-01', 'precio_venta': 2600, 'precio_alquiler': 15},
+        ]).to_csv(self.precios_path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_loaded_once(self):
+        cache = ReferenceDataCache(self.indicadores_path, self.precios_path)
+        df = cache.precios_of(80738)
+        self.assertEqual(df['precio_venta'].tolist(), [2500, 2600])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['mes']))
+        self.assertIs(cache.precios_of(80738.0), df)
+        self.assertTrue(cache.precios_of(1).empty)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_indicadores_lookup(self):
+        cache = ReferenceDataCache(self.indicadores_path, self.precios_path)
+        lookup = cache.indicadores_lookup()
+        # barri goes before districte, its missing values are taken from the next tipo
+        self.assertEqual(lookup['la teixonera']['precio_venta_1y'], 2600.0)
+        self.assertEqual(lookup['la teixonera']['tipo'], 'barri')
+        self.assertEqual(cache.place_index().match('teixonera')[0], 'la teixonera')
+
+    def test_reload_on_change(self):
+        cache = ReferenceDataCache(self.indicadores_path, self.precios_path)
+        index = cache.place_index()
+        self.assertIs(cache.place_index(), index)
+        with open(self.indicadores_path, 'a') as f:
+            f.write('80101,el raval,barri,3500.0,18.0\n')
+        stat = os.stat(self.indicadores_path)
+        os.utime(self.indicadores_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        self.assertIsNot(cache.place_index(), index)
+        self.assertIn('el raval', cache.place_index().places)
+
+    def test_shared(self):
+        self.assertIs(ReferenceDataCache.shared(self.indicadores_path, self.precios_path), ReferenceDataCache.shared(str(self.indicadores_path), self.precios_path))
+
+if __name__ == '__main__':
+    unittest.main()
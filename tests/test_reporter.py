@@ -0,0 +1,89 @@
+import unittest
+import sys
+import types
+import tempfile
+import pandas as pd
+from pathlib import Path
+try:
+    import matplotlib.pyplot
+    import seaborn
+except ImportError:
+    # the plotting libraries only draw the report files, the scoring does not need them
+    for name in ('matplotlib', 'matplotlib.pyplot', 'seaborn'):
+        sys.modules.setdefault(name, types.ModuleType(name))
+sys.path.append('src')
+sys.path.append('src/report')
+from reporter import Reporter
+from realty import Realty
+from realty_report import RealtyReport
+
+class TestReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        tmp_path = Path(self.tmp_dir.name)
+        pd.DataFrame([
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'districte', 'precio_venta_1y': 3000.0, 'precio_alquiler_1y': 14.0},
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'barri', 'precio_venta_1y': 2600.0, 'precio_alquiler_1y': None},
+            {'id': 80000, 'nombre': 'barcelona', 'tipo': 'municipi', 'precio_venta_1y': 4000.0, 'precio_alquiler_1y': 15.0},
+        ]).to_csv(tmp_path / 'gen_indicadores.csv', index=False)
+        pd.DataFrame([
+            {'id': 80738, 'nombre': 'la teixonera', 'tipo': 'barri', 'mes': '2024-01-01', 'precio_venta': 2500, 'precio_alquiler': 14},
+        ]).to_csv(tmp_path / 'gen_precios.csv', index=False)
+        pd.DataFrame(columns=['link']).to_csv(tmp_path / 'gen_informe.csv', index=False)
+        self.reporter = Reporter(Path('src/report/report_template3.html'), tmp_path, tmp_path / 'gen_precios.csv', tmp_path / 'gen_indicadores.csv',
+            tmp_path / 'gen_informe.csv', tmp_path / 'cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def realty(self, **kwargs):
+        fields = {'link': 'https://example.com/inmueble/1/', 'type_v': 'Piso', 'address': 'Calle de la Teixonera', 'town': 'La Teixonera, Barcelona',
+            'price': 130000, 'rooms': 2, 'surface': 50, 'info': None, 'description': 'Piso con terraza', 'created': '2025-01-01 10:00:00'}
+        return Realty(**{**fields, **kwargs})
+
+    def test_indicadores_of_place(self):
+        realty = self.realty()
+        report = self.reporter.compute_reports(realty)[0]
+        self.assertEqual(report.barrio, 'la teixonera')
+        # the barri row goes first, as when set_indicadores is called with each row of the place in tipo order
+        self.assertEqual(report.tipo, 'barri')
+        self.assertEqual(report.precio_venta_1y, 2600.0)
+        self.assertEqual(report.precio_m2, 2600)
+
+        expected = RealtyReport(**realty.to_dict())
+        indicadores = pd.read_csv(self.reporter.indicadores_path)
+        expected.match_place(indicadores['nombre'].unique().tolist())
+        for index, row in indicadores[indicadores['nombre'] == expected.barrio].sort_values(by='tipo').iterrows():
+            expected.set_indicadores(**row.to_dict())
+        for column in ['precio_venta_1y', 'precio_alquiler_1y'] + RealtyReport.SCORE_COLUMNS:
+            value = getattr(expected, column)
+            self.assertEqual(getattr(report, column), None if pd.isna(value) else value, column)
+
+    def test_missing_description(self):
+        realties = [self.realty(description=None), self.realty(link='https://example.com/inmueble/2/', description='Piso ocupado')]
+        reports = self.reporter.compute_reports(realties)
+        self.assertIsNone(reports[0].disponibilidad)
+        self.assertIsNone(reports[0].tags)
+        self.assertEqual(reports[1].disponibilidad, 'ocupada')
+
+        # the empty descriptions of the csv are read as NaN
+        listings = pd.DataFrame([realty.to_dict() for realty in realties])
+        listings.loc[0, 'description'] = float('nan')
+        reports_df = self.reporter.compute_report_frame(listings)
+        self.assertEqual(reports_df['disponibilidad'].tolist()[1], 'ocupada')
+        self.assertTrue(pd.isna(reports_df['disponibilidad'].tolist()[0]))
+
+    def test_missing_town(self):
+        realties = [self.realty(town=None), self.realty(link='https://example.com/inmueble/2/', address=None)]
+        reports = self.reporter.compute_reports(realties)
+        self.assertEqual([report.barrio for report in reports], ['la teixonera', 'la teixonera'])
+
+        realties = [self.realty(address=None, town=None), self.realty(link='https://example.com/inmueble/2/')]
+        reports = self.reporter.compute_reports(realties)
+        self.assertEqual([report.barrio for report in reports], [None, 'la teixonera'])
+        for column in RealtyReport.SCORE_COLUMNS:
+            self.assertIsNone(getattr(reports[0], column), column)
+
+if __name__ == '__main__':
+    unittest.main()
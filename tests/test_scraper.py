@@ -2,9 +2,69 @@ import unittest
 import sys
 import re
 import datetime
+import requests
+import io
+import mmap
+import tempfile
 from pathlib import Path
 sys.path.append('src/crawler')
 from scraper import Scraper
+from page_cache import PageCache
+from json_path import JsonPath
+
+class FileScraper(Scraper):
+    ''' Scraper that serves every url from a local file '''
+
+    def __init__(self, file_path, **kwargs):
+        super().__init__(**kwargs)
+        self.file_path = file_path
+        self.requested_urls = []
+
+    def get_response(self, url=None, use_cache=True, driver='default'):
+        self.requested_urls.append(self.url)
+        response = requests.Response()
+        response.status_code = 200
+        with open(self.file_path, 'rb') as f:
+            response._content = f.read()
+        return response
+
+class ConditionalPool:
+    ''' Session pool that answers 304 when the request has the current ETag '''
+
+    def __init__(self, body, etag):
+        self.body, self.etag = body, etag
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        response = requests.Response()
+        response.headers['ETag'] = self.etag
+        if headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = self.body
+        return response
+
+class StreamPool:
+    ''' Session pool that streams the body from memory and counts the bytes read '''
+
+    def __init__(self, body):
+        self.body = body
+        self.read_bytes = 0
+
+    def get(self, url, headers=None, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(self.body)
+        read = response.raw.read
+        def counted_read(size=-1):
+            data = read(size)
+            self.read_bytes += len(data)
+            return data
+        response.raw.read = counted_read
+        self.read_bytes = 0
+        return response
 
 class TestScraper(unittest.TestCase):
 
@@ -114,6 +174,134 @@ class TestScraper(unittest.TestCase):
             # self.assertEqual(anitem['agent'], 'https://www.fotocasa.es/es/inmobiliaria-gc-inmobiliaria/comprar/inmuebles/espana/todas-las-zonas/l?clientId=9202752587558')
             # self.assertEqual(len(anitem['images']), 16)
 
+    def test_parse_jsonpath_fotocasa(self):
+        list_items = {'list_items': JsonPath('initialSearch.result.realEstates', fallback=self.foto_list_items['list_items'])}
+        list_fields = {**self.foto_list_fields, 'link': JsonPath('detail.es-ES', fallback=self.foto_list_fields['link'])}
+        scraper = Scraper(list_items=list_items, list_items_fields=list_fields)
+        with open('tests/fotocasa_lista.html', 'r') as file:
+            content = scraper.get_page_content(file.read())
+        self.assertIsNotNone(scraper.page_state)
+        alist = scraper.parse_list(content, list_items, list_fields, self.foto_list_lambda, self.foto_detail_lambda)
+        self.assertEqual(len(alist), 30)
+        self.assertEqual(alist[0]['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/aire-acondicionado-no-amueblado/185311924/d')
+
+        detail_fields = {**self.foto_detail_fields, 'link': JsonPath('realEstate.detail.es-ES', fallback=self.foto_detail_fields['link'])}
+        scraper = Scraper(detail_fields=detail_fields)
+        with open('tests/fotocasa_detalle.html', 'r') as file:
+            content = scraper.get_page_content(file.read())
+        anitem = scraper.parse_item(content, detail_fields, self.foto_detail_lambda)
+        self.assertEqual(anitem['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d')
+
+        # pages without state use the regex of the field
+        scraper.page_state = None
+        anitem = scraper.parse_item(content, detail_fields, self.foto_detail_lambda)
+        self.assertEqual(anitem['link'], 'https://www.fotocasa.es/es/comprar/vivienda/barcelona-capital/no-amueblado/185497469/d')
+        self.assertIsNone(JsonPath('realEstate.missing.0').find(scraper.page_state))
+
+    def test_zero_copy_same_as_decoded(self):
+        cases = [('tests/idealista_lista.html', self.ideal_list_items, self.ideal_list_fields, self.ideal_lambda),
+            ('tests/fotocasa_lista.html', self.foto_list_items, self.foto_list_fields, {'link': self.foto_list_lambda['link']})]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for file_path, list_items, list_fields, fields_lambda in cases:
+                scraper = FileScraper(file_path, url='https://www.fotocasa.es/es/comprar/viviendas/l/1', list_items=list_items, list_items_fields=list_fields,
+                    page_cache=PageCache(cache_dir, compression='none'), zero_copy=True)
+                response = scraper.get_response()
+                response.cache_hash = scraper.page_cache.put(scraper.url, response.content)['hash']
+                buffer = scraper.get_content(response)
+                self.assertIsInstance(buffer, mmap.mmap)
+                # a body that was not just cached for the url is decoded
+                self.assertIsInstance(scraper.get_content(scraper.get_response()), str)
+                content = scraper.get_page_content(response.content.decode('utf-8'))
+                self.assertEqual(scraper.parse_list(buffer, list_items, list_fields, fields_lambda, fields_lambda),
+                    scraper.parse_list(content, list_items, list_fields, fields_lambda, fields_lambda))
+
+        # the state of the page is read from the raw bytes
+        self.assertEqual(JsonPath.load_state(b'window.__INITIAL_PROPS__ = JSON.parse("{\\"a\\":1}")'), {'a': 1})
+
+    def test_iter_pages_budget(self):
+        scraper = FileScraper('tests/fotocasa_lista.html', url='https://www.fotocasa.es/es/comprar/viviendas/l/1', list_items=self.foto_list_items,
+            list_items_fields=self.foto_list_fields, list_next=self.foto_list_next, list_fields_lambda=self.foto_list_lambda, detail_fields_lambda=self.foto_detail_lambda)
+        pages = list(scraper.iter_pages(max_pages=2))
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len(pages[0]), 30)
+        self.assertEqual(len(scraper.requested_urls), 2)
+        self.assertNotEqual(scraper.requested_urls[0], scraper.requested_urls[1])
+
+        scraper.set_url('https://www.fotocasa.es/es/comprar/viviendas/l/1')
+        items = sum(len(page) for page in scraper.iter_pages(max_items=45))
+        self.assertEqual(items, 45)
+
+    def test_conditional_revalidation(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pool = ConditionalPool(b'<html>page</html>', '"v1"')
+            scraper = Scraper(url='https://www.fotocasa.es/es/comprar/viviendas/l/1', cache_dir=cache_dir, cache_expires=0, delay_seconds=0, session_pool=pool)
+            response = scraper.get_response()
+            self.assertFalse(Scraper.is_unchanged(response))
+            self.assertNotIn('If-None-Match', pool.requests[0])
+
+            # the expired page is revalidated and its cached body is returned
+            response = scraper.get_response()
+            self.assertEqual(pool.requests[1]['If-None-Match'], '"v1"')
+            self.assertTrue(Scraper.is_unchanged(response))
+            self.assertEqual(response.content, b'<html>page</html>')
+            self.assertEqual(scraper.page_cache.stats()['revalidated'], 1)
+
+            # a new ETag with the same body is also unchanged
+            pool.etag = '"v2"'
+            self.assertTrue(Scraper.is_unchanged(scraper.get_response()))
+            pool.etag, pool.body = '"v3"', b'<html>new page</html>'
+            self.assertFalse(Scraper.is_unchanged(scraper.get_response()))
+
+    def test_before_fetch(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pool = ConditionalPool(b'<html>page</html>', '"v1"')
+            scraper = Scraper(url='https://www.fotocasa.es/es/comprar/viviendas/l/1', cache_dir=cache_dir, cache_expires=60, delay_seconds=0, session_pool=pool)
+            # the crawl renews the lease of the url after the delay, right before the request
+            calls = []
+            scraper.before_fetch = lambda url: calls.append((url, len(pool.requests)))
+            scraper.get_response()
+            scraper.get_response()
+            self.assertEqual(calls, [('https://www.fotocasa.es/es/comprar/viviendas/l/1', 0)])
+
+    def test_revalidated_page_evicted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pool = ConditionalPool(b'<html>page</html>', '"v1"')
+            scraper = Scraper(url='https://www.fotocasa.es/es/comprar/viviendas/l/1', cache_dir=cache_dir, cache_expires=0, delay_seconds=0, session_pool=pool)
+            scraper.get_response()
+
+            # the cached body is evicted while the conditional request is sent
+            get = pool.get
+            def evicting_get(url, headers=None, **kwargs):
+                for path in scraper.page_cache.pages_dir.iterdir(): path.unlink()
+                return get(url, headers, **kwargs)
+            pool.get = evicting_get
+            response = scraper.get_response()
+            self.assertEqual(pool.requests[1]['If-None-Match'], '"v1"')
+            self.assertNotIn('If-None-Match', pool.requests[2])
+            self.assertEqual(response.content, b'<html>page</html>')
+            self.assertFalse(Scraper.is_unchanged(response))
+
+    def test_streaming_abort(self):
+        with open('tests/fotocasa_lista.html', 'rb') as f:
+            body = f.read()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pool = StreamPool(body)
+            scraper = Scraper(url='https://www.fotocasa.es/es/comprar/viviendas/l/1', cache_dir=cache_dir, cache_expires=60, delay_seconds=0, session_pool=pool,
+                abort={'captcha': re.compile(r'captcha-delivery\.com')}, max_bytes=len(body))
+            self.assertEqual(scraper.get_response().content, body)
+
+            # the block page is detected in the first chunk, the rest is not downloaded nor cached
+            scraper.set_url('https://www.fotocasa.es/es/comprar/viviendas/l/2')
+            pool.body = b'<script src="https://ct.captcha-delivery.com/c.js"></script>' + body
+            self.assertIsNone(scraper.get_response())
+            self.assertLessEqual(pool.read_bytes, Scraper.CHUNK_SIZE)
+            self.assertIsNone(scraper.page_cache.get_entry(scraper.url))
+
+            pool.body = body + b' '
+            self.assertIsNone(scraper.get_response())
+            self.assertIsNone(scraper.page_cache.get_entry(scraper.url))
+            self.assertEqual(scraper.aborted_downloads, 2)
+
     def test_error_empty_list(self):
         content = '<html><body>ERROR LOADING</body></html>'
         alist = Scraper().parse_list(content, self.foto_list_items, self.foto_list_fields, self.foto_list_lambda, self.foto_detail_lambda)
@@ -0,0 +1,28 @@
+import unittest
+import sys
+import time
+sys.path.append('src/crawler')
+from session_pool import SessionPool
+
+class TestSessionPool(unittest.TestCase):
+
+    def test_session_reused_per_host(self):
+        pool = SessionPool(pool_size=2, idle_timeout=60)
+        session = pool.get_session('www.fotocasa.es')
+        self.assertIs(pool.get_session('www.fotocasa.es'), session)
+        self.assertIsNot(pool.get_session('www.idealista.com'), session)
+        stats = pool.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['sessions_created'], 2)
+        pool.close()
+
+    def test_idle_session_renewed(self):
+        pool = SessionPool(pool_size=2, idle_timeout=0.01)
+        session = pool.get_session('www.fotocasa.es')
+        time.sleep(0.02)
+        self.assertIsNot(pool.get_session('www.fotocasa.es'), session)
+        self.assertEqual(pool.stats()['sessions_expired'], 1)
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import dataclasses
+from pathlib import Path
+sys.path.append('src/crawler')
+from spec_registry import SpecRegistry
+from crawler import Crawler
+
+class TestSpecRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.specs_path = Path(self.tmp_dir.name) / 'webs_specs.csv'
+        shutil.copy('tests/webs_specs.example.csv', self.specs_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_compiled_once(self):
+        registry = SpecRegistry(self.specs_path)
+        spec = registry.get('fotocasa')
+        self.assertIs(registry.get('fotocasa'), spec)
+        self.assertEqual(spec.max_bytes, 5000000)
+        self.assertEqual([scope for scope, rx in spec.block_rules], ['resource', 'url'])
+        self.assertRaises(dataclasses.FrozenInstanceError, setattr, spec, 'url', None)
+        with self.assertRaises(TypeError):
+            spec.list_fields['link'] = None
+
+    def test_reload_on_change(self):
+        registry = SpecRegistry(self.specs_path)
+        spec = registry.get('fotocasa')
+        with open(self.specs_path, 'a') as f:
+            f.write('fotocasa,regex,detail_field,title,<h1>(.+?)</h1>,\n')
+        stat = os.stat(self.specs_path)
+        os.utime(self.specs_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        reloaded = registry.get('fotocasa')
+        self.assertIsNot(reloaded, spec)
+        self.assertIn('title', reloaded.detail_fields)
+        self.assertEqual(registry.reloads, 2)
+
+    def test_scrapers_share_plans(self):
+        crawler = Crawler(webs_specs_datafile_path = self.specs_path, realty_datafile_path = None, cache_dir = None, cache_expires=None)
+        first = crawler._new_scraper('fotocasa', 'https://www.fotocasa.es/es/1')
+        second = crawler._new_scraper('fotocasa', 'https://www.fotocasa.es/es/2')
+        self.assertIs(first.get_plan(first.detail_fields), second.get_plan(second.detail_fields))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+import pandas as pd
+sys.path.append('src')
+from sqlite_store import SqliteStore
+
+class TestSqliteStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SqliteStore(Path(self.tmp_dir.name) / 'realadvisor.db')
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def page(self, *ids):
+        return pd.DataFrame([{'link': f'https://example.com/inmueble/{i}/', 'price': i * 1000, 'tags': ['a', 'b']} for i in ids])
+
+    def test_store_page(self):
+        added, hay_repetidos = self.store.store_page(self.page(1, 2))
+        self.assertEqual(len(added), 2)
+        self.assertFalse(hay_repetidos)
+        added, hay_repetidos = self.store.store_page(self.page(2, 3))
+        self.assertEqual(len(added), 1)
+        self.assertTrue(hay_repetidos)
+        self.assertEqual(len(self.store), 3)
+        self.assertTrue(self.store.contains('https://example.com/inmueble/3/'))
+        self.assertEqual(self.store.read_all()['tags'][0], "['a', 'b']")
+
+    def test_pending_realties(self):
+        self.store.store_page(self.page(1, 2, 3))
+        self.store.upsert_reports(pd.DataFrame([{'link': 'https://example.com/inmueble/2/', 'global_score_stars': 3.5}]))
+        pending = self.store.pending_realties()
+        self.assertEqual(sorted(pending['link'].tolist()), ['https://example.com/inmueble/1/', 'https://example.com/inmueble/3/'])
+
+        # upserts update the existing report
+        self.store.upsert_reports(pd.DataFrame([{'link': 'https://example.com/inmueble/2/', 'global_score_stars': 4.0}]))
+        self.assertEqual(self.store.read_reports()['global_score_stars'].tolist(), [4.0])
+
+    def test_enriched_links(self):
+        self.store.store_page(self.page(1, 2))
+        self.assertEqual(self.store.enriched_links(['https://example.com/inmueble/1/']), set())
+        self.store.upsert_realties(pd.DataFrame([{'link': 'https://example.com/inmueble/2/', 'enriched_at': '2025-01-01'}]))
+        self.assertEqual(self.store.enriched_links(['https://example.com/inmueble/1/', 'https://example.com/inmueble/2/']), {'https://example.com/inmueble/2/'})
+
+    def test_migrate_from_csv(self):
+        self.store.migrate_from_csv(webs_specs_datafile_path=Path('tests/webs_specs.example.csv'))
+        web_specs = self.store.read_web_specs()
+        self.assertEqual(len(web_specs), len(pd.read_csv('tests/webs_specs.example.csv')))
+        self.assertEqual(web_specs['provider'].unique().tolist(), ['fotocasa'])
+
+if __name__ == '__main__':
+    unittest.main()